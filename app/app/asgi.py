@@ -2,6 +2,8 @@
 ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the recipe change feed (recipe.feed) are served here
+directly; everything else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -13,4 +15,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from recipe import feed  # noqa: E402
+
+recipe_feed = feed.RecipeFeed()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == feed.PATH:
+        await recipe_feed(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,66 @@
+"""
+Gunicorn configuration for production.
+
+    python manage.py serve
+    # or: gunicorn -c python:app.gunicorn_conf
+
+The application is loaded once in the master process, warmed up and
+frozen out of the garbage collector's reach (core.prefork) before the
+workers are forked, so they share its memory instead of each building
+their own copy. Workers are threaded (gthread) for the WSGI app, or
+uvicorn workers for the ASGI app when SERVER_ASGI is set.
+
+Only the ASGI app serves the recipe change feed. Its events reach
+subscribers in other processes through core.events.CacheBroker, which
+needs a shared cache (CACHE_BACKEND). Without one, the ASGI app runs in
+a single worker so every subscriber sees the writes made through the
+API; writes from job workers and commands still don't reach them. An
+explicit SERVER_WORKERS (or `serve --workers`) is honoured anyway, with
+a warning, for deployments that don't need the feed.
+"""
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from core import prefork  # noqa: E402
+
+bind = os.environ.get('SERVER_BIND', '0.0.0.0:8000')
+
+if settings.SERVER_ASGI:
+    wsgi_app = 'app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = prefork.asgi_workers()  # Uvicorn workers don't use gunicorn's threads
+else:
+    wsgi_app = 'app.wsgi:application'
+    worker_class = 'gthread'
+    workers, threads = prefork.sizing()
+
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then, so slow leaks or heap fragmentation
+# can't grow them forever; jitter keeps them from restarting together
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+def on_starting(server):
+    prefork.clear_metrics()
+
+
+def when_ready(server):
+    # The app is loaded by now (preload_app); warm and freeze it before
+    # the first fork
+    prefork.warm_up()
+    prefork.freeze()
+    if settings.SERVER_ASGI:
+        server.log.info('Serving with %d uvicorn workers', workers)
+    else:
+        server.log.info('Serving with %d workers, %d threads each', workers, threads)
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',  # First, so its timing covers the rest
+    'core.middleware.ConcurrencyLimitMiddleware',  # Sheds load before any view runs
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +55,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
+    'core.middleware.ActivityMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -89,6 +93,46 @@ DATABASES = {
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2. They share the
+# primary's name and credentials; safe reads are spread across them.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+# Extra databases holding users' recipe data, e.g. DB_SHARD_HOSTS=shard1,shard2.
+# Each has the full schema; core.sharding places every user's recipes on
+# one of RECIPE_SHARDS. Only ever append hosts: a shard's position decides
+# its id range. To drain a shard, drop it from RECIPE_SHARDS only, then
+# run `rebalance_recipes`.
+DATABASE_SHARDS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_SHARD_HOSTS', '').split(','))):
+    alias = f'shard_{index + 1}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host}
+    DATABASE_SHARDS.append(alias)
+
+RECIPE_SHARDS = ['default', *DATABASE_SHARDS]
+
+DATABASE_ROUTERS = ['core.routers.ShardRouter', 'core.routers.PrimaryReplicaRouter']
+
+# Seconds a client's reads stay on the primary after it writes
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# The default cache holds state every process must see (replica pins, user
+# and stats versions), so deployments with more than one process need a
+# shared backend, e.g. CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -137,4 +181,87 @@ AUTH_USER_MODEL = 'core.User' #Setting auth_user_model configuration, out of all
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema', #generates schema using openapi
-}
\ No newline at end of file
+}
+
+# Prebuilt OpenAPI schema written by `manage.py build_schema`, served from memory
+OPENAPI_SCHEMA_FILE = os.environ.get('OPENAPI_SCHEMA_FILE', BASE_DIR / 'openapi.yml')
+OPENAPI_SCHEMA_MAX_AGE = int(os.environ.get('OPENAPI_SCHEMA_MAX_AGE', 60 * 60 * 24))
+
+# Background jobs (core.jobs)
+JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 4))
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 60 * 10))  # Seconds before a claimed job is retried
+JOB_RETRY_BASE_DELAY = 5  # Seconds before the first retry, doubled on each failure
+JOB_RETRY_MAX_DELAY = 60 * 60
+
+# Buffered last_login updates (core.activity)
+ACTIVITY_FLUSH_INTERVAL = int(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 30))  # Seconds; 0 writes through
+ACTIVITY_BUFFER_MAX_SIZE = int(os.environ.get('ACTIVITY_BUFFER_MAX_SIZE', 1000))
+
+# Two-tier cache of authenticated users and their /me profile (user.cache)
+PROFILE_CACHE_L1_SIZE = int(os.environ.get('PROFILE_CACHE_L1_SIZE', 1024))  # Users per process
+PROFILE_CACHE_L1_TTL = float(os.environ.get('PROFILE_CACHE_L1_TTL', 5))  # Seconds; bounds cross-process staleness
+PROFILE_CACHE_TIMEOUT = int(os.environ.get('PROFILE_CACHE_TIMEOUT', 300))  # Seconds in the default cache, if it is shared
+
+# Bulk user provisioning (user.provisioning)
+PROVISION_WORKERS = int(os.environ.get('PROVISION_WORKERS', 0))  # Hashing processes; 0 uses every core
+PROVISION_BATCH_SIZE = 1000  # Users inserted per transaction
+PROVISION_MAX_UPLOAD_USERS = 5000  # Records per API request; one job hashes them well within JOB_LOCK_TIMEOUT
+
+# Request metrics (core.metrics); one memory-mapped file per process
+METRICS_DIR = os.environ.get('METRICS_DIR', BASE_DIR / 'var' / 'metrics')
+# Bearer token Prometheus must send to read /metrics; the endpoint is off without one
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Memory-mapped similar-recipe indexes (recipe.similarity)
+RECIPE_VECTOR_DIR = os.environ.get('RECIPE_VECTOR_DIR', BASE_DIR / 'var' / 'vectors')
+
+# Server-Sent Events feed of recipe changes (core.events, recipe.feed)
+# Empty uses CacheBroker when the default cache is shared, LocalBroker otherwise
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', '')
+EVENTS_REPLAY_SIZE = 100  # Events kept per user for clients that reconnect
+EVENTS_REPLAY_CHANNELS = 10000  # Users with a replay buffer (LocalBroker); the least recently changed are dropped
+EVENTS_REPLAY_TIMEOUT = 60 * 60  # Seconds CacheBroker keeps each event
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', 0.5))  # Seconds between CacheBroker polls
+EVENTS_QUEUE_SIZE = 100  # Events queued for one client before it is disconnected
+EVENTS_HEARTBEAT = int(os.environ.get('EVENTS_HEARTBEAT', 15))  # Seconds between keep-alive comments
+EVENTS_RETRY = 3000  # Milliseconds clients wait before reconnecting
+
+# Signed access and refresh tokens (user.tokens)
+ACCESS_TOKEN_LIFETIME = int(os.environ.get('ACCESS_TOKEN_LIFETIME', 5 * 60))  # Seconds
+REFRESH_TOKEN_LIFETIME = int(os.environ.get('REFRESH_TOKEN_LIFETIME', 14 * 24 * 60 * 60))
+
+# Adaptive per-process concurrency limits for threaded workers (core.concurrency).
+# Routes are URL names matched as glob patterns, optionally after a method
+# ("GET name"); the first group listing a route wins and "default" takes the
+# rest. `limit` is the starting point for AIMD
+CONCURRENCY_LIMITS = {
+    # Shed first: no queue and a tight latency target
+    'expensive': {
+        'routes': [
+            'GET recipe:recipe-list', 'recipe:recipe-stats', 'recipe:recipe-meal-plan',
+            'recipe:recipe-duplicates', 'user:token', 'user:token-signed', 'user:provision',
+            'admin:*_changelist',  # CSV exports run as changelist actions
+        ],
+        'limit': 4,
+        'min_limit': 1,
+        'max_limit': 16,
+        'queue_size': 0,
+        'latency_target': 0.5,  # Seconds
+        'retry_after': 5,  # Seconds
+    },
+    'default': {
+        'limit': 16,
+        'min_limit': 2,
+        'max_limit': 64,
+        'queue_size': 32,
+        'max_wait': 1.0,
+        'latency_target': 1.0,
+        'retry_after': 1,
+    },
+}
+
+# Production server (app/gunicorn_conf.py, core.prefork); 0 sizes from the CPUs and memory available
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 0))
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 0))
+SERVER_WORKER_MEMORY = int(os.environ.get('SERVER_WORKER_MEMORY', 128 * 1024 * 1024))  # Bytes budgeted per worker
+SERVER_ASGI = bool(os.environ.get('SERVER_ASGI'))  # Serve app.asgi with uvicorn workers, needed for the SSE feed
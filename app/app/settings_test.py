@@ -0,0 +1,62 @@
+"""
+Django settings for running the test suite.
+
+    python manage.py test --settings=app.settings_test --parallel
+
+`--parallel` gives each worker process its own clone of the test
+database. Set TEST_SQLITE=1 to run against in-memory SQLite instead of
+Postgres for a quick local run.
+
+Separate, initially empty `replica` and `shard_1` databases are
+available for tests that exercise replica routing and sharding; they are
+only created for tests that ask for them.
+"""
+import os
+import tempfile
+
+from app.settings import *  # noqa: F401,F403
+
+# PBKDF2 is deliberately slow and every test creates users; MD5 is
+# plenty for tests and never used outside them
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+# Keep request metrics out of the source tree
+METRICS_DIR = tempfile.mkdtemp(prefix='recipe-app-metrics-')
+
+# Write last_login through on each request instead of from a background thread
+ACTIVITY_FLUSH_INTERVAL = 0
+
+if os.environ.get('TEST_SQLITE'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
+        'shard_1': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
+    }
+else:
+    DATABASES = {
+        **DATABASES,
+        'replica': {
+            **DATABASES['default'],
+            'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_replica"},
+        },
+        'shard_1': {
+            **DATABASES['default'],
+            'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_shard_1"},
+        },
+    }
+
+# A second recipe shard for the sharding tests. Recipes stay on the
+# primary unless a test adds it with override_settings(RECIPE_SHARDS=...)
+DATABASE_SHARDS = ['shard_1']
+RECIPE_SHARDS = ['default']
@@ -13,22 +13,25 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path,include
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+
+from core.metrics import metrics_view
+from core.schema import schema_view, swagger_view
 
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'), #Generates the schema
-    path(
-        'api/docs/',
-        SpectacularSwaggerView.as_view(url_name='api-schema'),
-        name='api-docs',
-    ),
+    path('api/schema/', schema_view, name='api-schema'), #Serves the prebuilt schema
     path('api/user/', include('user.urls')),  # Include the user app's URLs
     path('api/recipe/', include('recipe.urls')),
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape target
 ]
+
+# The API-only settings profile (app.settings_api) leaves these apps out
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
+
+if apps.is_installed('drf_spectacular'):
+    urlpatterns.append(path('api/docs/', swagger_view, name='api-docs'))
@@ -0,0 +1,108 @@
+'''
+Buffered "last seen" tracking for users.
+
+Authenticated requests record the time they were made in an in-process
+buffer, and a background thread writes the buffer back with a single
+UPDATE every ACTIVITY_FLUSH_INTERVAL seconds, as soon as it holds
+ACTIVITY_BUFFER_MAX_SIZE users, and when the process exits. Requests
+never wait for the write. An interval of 0 writes through on every
+request.
+'''
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Case, DateTimeField, F, Q, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def write_last_login(pending):
+    '''Store {user_id: timestamp} as last_login in one UPDATE.'''
+    User = get_user_model()
+    # Never move a timestamp backwards when several workers flush at once
+    whens = [
+        When(
+            Q(pk=user_id) & (Q(last_login__isnull=True) | Q(last_login__lt=when)),
+            then=Value(when),
+        )
+        for user_id, when in pending.items()
+    ]
+    User._base_manager.filter(pk__in=list(pending)).update(last_login=Case(
+        *whens, default=F('last_login'), output_field=DateTimeField(),
+    ))
+
+
+class ActivityBuffer:
+    '''Collect the latest activity time per user and flush it in bulk.'''
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._wake = threading.Event()  # Set when the buffer is full
+        self._stop = threading.Event()
+
+    def record(self, user_id, when=None):
+        '''Note that the user was active at `when` (default: now).'''
+        when = when or timezone.now()
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is None or when > previous:
+                self._pending[user_id] = when
+            full = len(self._pending) >= settings.ACTIVITY_BUFFER_MAX_SIZE
+        if not settings.ACTIVITY_FLUSH_INTERVAL:
+            self.flush()
+            return
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        '''Write everything buffered so far; return the number of users.'''
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            write_last_login(pending)
+        except Exception:
+            logger.exception('Failed to write activity for %d users', len(pending))
+            with self._lock:
+                # Keep the entries for the next flush unless newer ones arrived
+                for user_id, when in pending.items():
+                    self._pending.setdefault(user_id, when)
+            return 0
+        return len(pending)
+
+    def _ensure_flusher(self):
+        '''Start the periodic flush thread once per process.'''
+        # Compared by pid so a worker forked from a preloaded parent starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, name='activity-flush', daemon=True)
+            thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(settings.ACTIVITY_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                connections.close_all()  # Only this thread's connections
+
+
+buffer = ActivityBuffer()
+
+# Flush on worker shutdown so the last interval isn't lost
+atexit.register(buffer.flush)
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
+
+
+def reserve_shard_id_range(sender, using, **kwargs):
+    '''Move a freshly migrated shard's id sequences into its own range.'''
+    from core import sharding
+
+    if using in settings.DATABASE_SHARDS:
+        sharding.reserve_id_range(using)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(reserve_shard_id_range, sender=self)
+        from core import signals  # noqa: F401 - connects the shard cascade handlers
@@ -0,0 +1,15 @@
+'''
+Helpers for state kept in Django's default cache.
+'''
+from django.conf import settings
+
+# Backends whose entries are only seen by the process that wrote them
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared(alias='default'):
+    '''Return whether every process sees the same entries in the cache.'''
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
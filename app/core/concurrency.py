@@ -0,0 +1,125 @@
+'''
+Adaptive concurrency limits for groups of routes.
+
+Requests are sorted into the groups of CONCURRENCY_LIMITS by URL name
+and, where a route is written as e.g. `GET recipe:recipe-list`, method.
+Each group lets at most `limit` requests run at once in a process; the
+next `queue_size` wait up to `max_wait` seconds for a slot, and the rest
+are turned away at once with a 503 and a Retry-After header.
+
+The limit adapts to latency (AIMD): every request finishing within the
+group's `latency_target` raises it by 1/limit while the group is using
+all its slots, and a slow request cuts it by DECREASE, at most once per
+target interval, so a single burst doesn't drop it to the floor. When
+the database slows down the limits shrink and the excess load is shed
+quickly instead of queueing until everything times out.
+
+Expensive routes go in a group with no queue and a tight latency target,
+so they are the first to be refused, and cheap routes like /me keep
+their slots. Limits are per process and only matter for threaded
+(gthread) workers. A streamed response keeps its slot until the last
+chunk has been sent.
+
+ASGI requests are not limited: Django runs a uvicorn worker's sync
+middleware and views one at a time on a single thread, so a request
+waiting for a slot would block the thread the holder needs to finish.
+'''
+import fnmatch
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_GROUP = 'default'
+DECREASE = 0.9
+
+_limiters = None
+_limiters_lock = threading.Lock()
+
+
+class Limiter:
+    '''Concurrency limit with a bounded wait queue and an AIMD-adjusted size.'''
+
+    def __init__(self, name, limit, min_limit=1, max_limit=None, queue_size=0, max_wait=0,
+                 latency_target=1.0, retry_after=1, routes=()):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.latency_target = latency_target
+        self.retry_after = retry_after
+        # `METHOD name` patterns; a bare URL name matches any method
+        self.routes = [route if ' ' in route else f'* {route}' for route in routes]
+        self.in_flight = 0
+        self.waiting = 0
+        self._last_decrease = float('-inf')
+        self._condition = threading.Condition()
+
+    def _has_slot(self):
+        return self.in_flight < int(self.limit)
+
+    def acquire(self):
+        '''Take a slot, waiting in the queue if there is room; return success.'''
+        with self._condition:
+            if self._has_slot() and not self.waiting:
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            try:
+                if not self._condition.wait_for(self._has_slot, self.max_wait):
+                    return False
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            return True
+
+    def release(self, latency):
+        '''Free a slot and adjust the limit for a request that took `latency` seconds.'''
+        with self._condition:
+            saturated = self.waiting or self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if latency > self.latency_target:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(self.min_limit, self.limit * DECREASE)
+                    self._last_decrease = now
+            elif saturated:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify()
+
+    def matches(self, route, method):
+        request = f'{method} {route}'
+        return any(fnmatch.fnmatchcase(request, pattern) for pattern in self.routes)
+
+
+def get_limiters():
+    '''Return the process's limiters, built from CONCURRENCY_LIMITS.'''
+    global _limiters
+    if _limiters is None:
+        with _limiters_lock:
+            if _limiters is None:
+                _limiters = {
+                    name: Limiter(name, **options)
+                    for name, options in settings.CONCURRENCY_LIMITS.items()
+                }
+    return _limiters
+
+
+def reset():
+    '''Drop the limiters so they are rebuilt from the settings.'''
+    global _limiters
+    with _limiters_lock:
+        _limiters = None
+
+
+def limiter_for(route, method):
+    '''Return the limiter of the first group listing `route`, else the default group's.'''
+    limiters = get_limiters()
+    for limiter in limiters.values():
+        if limiter.matches(route, method):
+            return limiter
+    return limiters.get(DEFAULT_GROUP)
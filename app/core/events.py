@@ -0,0 +1,325 @@
+'''
+Publish/subscribe for change events.
+
+Publishers call `publish(channel, type, data)` from any thread, usually
+from a view once its transaction has committed. Subscribers are asyncio
+coroutines (the SSE feed) that read events from a `Subscription`.
+
+LocalBroker only delivers events to subscribers in the process that
+published them. CacheBroker passes them through the default cache, so
+events published by any server worker, job worker or management command
+reach every subscriber. EVENTS_BROKER picks the class; by default
+CacheBroker is used when the cache is shared between processes and
+LocalBroker otherwise (see app.gunicorn_conf for what that means for
+the number of workers).
+
+Each channel keeps its last EVENTS_REPLAY_SIZE events, so a client that
+reconnects with the id of the last event it saw gets what it missed.
+When the events it needs are gone (they fell out of the buffer, or the
+process restarted) the subscription starts with a `reset` event telling
+the client to reload instead.
+
+Subscriber queues hold at most EVENTS_QUEUE_SIZE events. A subscriber
+that falls that far behind is closed rather than buffered without limit;
+it reconnects and catches up from the replay buffer.
+'''
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from core import caching
+
+logger = logging.getLogger(__name__)
+
+RESET = 'reset'
+
+Event = namedtuple('Event', ['id', 'type', 'data'])  # data is JSON text
+
+
+class Subscription:
+    '''Bounded queue of events for one subscriber, read from its event loop.'''
+
+    def __init__(self, broker, channel, loop, max_size):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.max_size = max_size
+        self.overflowed = False
+        self.position = 0  # Newest event handed over, for brokers that poll
+        self._events = deque()
+        self._ready = asyncio.Event()
+
+    def deliver(self, event):
+        '''Queue an event; called on the subscriber's event loop.'''
+        if self.overflowed:
+            return
+        if len(self._events) >= self.max_size:
+            self.overflowed = True
+            self.broker.unsubscribe(self)
+        else:
+            self._events.append(event)
+        self._ready.set()
+
+    async def get(self, timeout=None):
+        '''Return the next event, or None after `timeout` seconds or on overflow.'''
+        if not self._events and not self.overflowed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self._events:
+            return self._events.popleft()
+        return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    '''Broker delivering events to subscribers in the same process.'''
+
+    shared = False
+
+    def __init__(self):
+        # Event ids are `epoch-sequence`; the epoch tells ids from an
+        # earlier process apart, so a restart is detected and not replayed
+        self.epoch = str(time.time_ns())
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> set of subscriptions
+        # channel -> [sequence of the newest event no longer replayable, events]
+        self._buffers = OrderedDict()
+        # Newest sequence that may be missing from the buffers of evicted channels
+        self._evicted = 0
+
+    def publish(self, channel, type, data):
+        '''Send an event to the channel's subscribers; return its id.'''
+        payload = json.dumps(data, cls=DjangoJSONEncoder)
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            event = Event(f'{self.epoch}-{sequence}', type, payload)
+            self._buffer(channel).append((sequence, event))
+            closed = []
+            # Scheduled under the lock so every subscriber sees events in order
+            for subscription in self._subscribers.get(channel, ()):
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+                except RuntimeError:  # The subscriber's loop has closed
+                    closed.append(subscription)
+        for subscription in closed:
+            self.unsubscribe(subscription)
+        return event.id
+
+    def _buffer(self, channel):
+        entry = self._buffers.get(channel)
+        if entry is None:
+            # The channel may have had events before it was evicted
+            entry = self._buffers[channel] = [self._evicted, deque()]
+        self._buffers.move_to_end(channel)
+        while len(self._buffers) > settings.EVENTS_REPLAY_CHANNELS:
+            _channel, (_floor, evicted) = self._buffers.popitem(last=False)
+            if evicted:
+                self._evicted = max(self._evicted, evicted[-1][0])
+        events = entry[1]
+        while len(events) >= settings.EVENTS_REPLAY_SIZE:
+            entry[0] = events.popleft()[0]
+        return events
+
+    def subscribe(self, channel, last_event_id=None):
+        '''Subscribe the running event loop, replaying events after `last_event_id`.'''
+        subscription = Subscription(
+            self, channel, asyncio.get_running_loop(), settings.EVENTS_QUEUE_SIZE,
+        )
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+            if last_event_id:
+                # At most EVENTS_REPLAY_SIZE events, so not counted against the queue
+                subscription._events.extend(self._replay(channel, last_event_id))
+        return subscription
+
+    def _replay(self, channel, last_event_id):
+        epoch, _, sequence = last_event_id.partition('-')
+        floor, events = self._buffers.get(channel, (self._evicted, ()))
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) < floor:
+            # The reset's id marks the client as up to date from here on
+            return [Event(f'{self.epoch}-{self._sequence}', RESET, '{}')]
+        return [event for number, event in events if number > int(sequence)]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+
+class CacheBroker:
+    '''Broker passing events between processes through the default cache.
+
+    Each channel has a counter in the cache, and every event is stored
+    for EVENTS_REPLAY_TIMEOUT seconds under the counter value it was
+    given, which is also its id. Subscribers are served by a thread in
+    their process that polls the counters of their channels every
+    EVENTS_POLL_INTERVAL seconds and fetches the events past them.
+    '''
+
+    shared = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> set of subscriptions
+        self._missing = {}  # channel -> sequence of an event not stored yet on the last poll
+        self._poller = None
+
+    @staticmethod
+    def _counter_key(channel):
+        return f'events:{channel}'
+
+    @staticmethod
+    def _event_key(channel, sequence):
+        return f'events:{channel}:{sequence}'
+
+    def publish(self, channel, type, data):
+        '''Store an event for the channel's subscribers; return its id.'''
+        payload = json.dumps(data, cls=DjangoJSONEncoder)
+        counter = self._counter_key(channel)
+        while True:
+            # Counters start from the clock, so one that was evicted comes back
+            # past every id handed out before and reconnecting clients are reset
+            cache.add(counter, time.time_ns(), None)
+            try:
+                sequence = cache.incr(counter)
+                break
+            except ValueError:  # Evicted between the two calls
+                continue
+        cache.set(self._event_key(channel, sequence), (type, payload), settings.EVENTS_REPLAY_TIMEOUT)
+        return str(sequence)
+
+    def subscribe(self, channel, last_event_id=None):
+        '''Subscribe the running event loop, replaying events after `last_event_id`.'''
+        subscription = Subscription(
+            self, channel, asyncio.get_running_loop(), settings.EVENTS_QUEUE_SIZE,
+        )
+        # Events published from here on are fetched by the poller; the counter
+        # is started here so the first event isn't mistaken for a gap
+        counter = self._counter_key(channel)
+        cache.add(counter, time.time_ns(), None)
+        subscription.position = cache.get(counter, 0)
+        if last_event_id:
+            subscription._events.extend(self._replay(channel, last_event_id, subscription.position))
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='events-poller', daemon=True)
+                self._poller.start()
+        return subscription
+
+    def _replay(self, channel, last_event_id, current):
+        reset = [Event(str(current), RESET, '{}')]
+        if not last_event_id.isdigit() or not 0 <= current - int(last_event_id) <= settings.EVENTS_REPLAY_SIZE:
+            return reset
+        sequences = range(int(last_event_id) + 1, current + 1)
+        stored = cache.get_many([self._event_key(channel, sequence) for sequence in sequences])
+        if len(stored) < len(sequences):  # Expired or evicted
+            return reset
+        return [Event(str(sequence), *stored[self._event_key(channel, sequence)]) for sequence in sequences]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+                    self._missing.pop(subscription.channel, None)
+
+    def _poll(self):
+        while True:
+            time.sleep(settings.EVENTS_POLL_INTERVAL)
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = None  # The next subscriber starts a new one
+                    return
+                subscribers = {channel: list(subs) for channel, subs in self._subscribers.items()}
+            try:
+                self.poll_once(subscribers)
+            except Exception:
+                logger.exception('Could not read events from the cache')
+
+    def poll_once(self, subscribers):
+        '''Hand each subscription in {channel: subscriptions} the events past its position.'''
+        counters = cache.get_many([self._counter_key(channel) for channel in subscribers])
+        for channel, subscriptions in subscribers.items():
+            current = counters.get(self._counter_key(channel))
+            behind = [s for s in subscriptions if current is not None and s.position < current]
+            # Too far behind to catch up from what the cache keeps
+            for subscription in [s for s in behind if current - s.position > settings.EVENTS_REPLAY_SIZE]:
+                self._deliver(subscription, Event(str(current), RESET, '{}'), current)
+                behind.remove(subscription)
+            if not behind:
+                continue
+            sequences = range(min(s.position for s in behind) + 1, current + 1)
+            stored = cache.get_many([self._event_key(channel, sequence) for sequence in sequences])
+            for sequence in sequences:
+                entry = stored.get(self._event_key(channel, sequence))
+                if entry is None:
+                    if self._missing.get(channel) != sequence:
+                        # Its publisher may not have stored it yet
+                        self._missing[channel] = sequence
+                        break
+                    # Still gone a poll later, so expired or evicted
+                    for subscription in behind:
+                        if subscription.position < sequence:
+                            self._deliver(subscription, Event(str(current), RESET, '{}'), current)
+                    self._missing.pop(channel, None)
+                    break
+                event = Event(str(sequence), *entry)
+                for subscription in behind:
+                    if subscription.position < sequence:
+                        self._deliver(subscription, event, sequence)
+            else:
+                self._missing.pop(channel, None)
+
+    def _deliver(self, subscription, event, position):
+        subscription.position = position
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+        except RuntimeError:  # The subscriber's loop has closed
+            self.unsubscribe(subscription)
+
+
+def broker_class():
+    '''Return the broker class set by EVENTS_BROKER, or the default for the cache.'''
+    if settings.EVENTS_BROKER:
+        return import_string(settings.EVENTS_BROKER)
+    # A cache each process keeps to itself can't carry events between them
+    return CacheBroker if caching.is_shared() else LocalBroker
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    '''Return the process's broker.'''
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = broker_class()()
+    return _broker
+
+
+def publish(channel, type, data):
+    return get_broker().publish(channel, type, data)
@@ -0,0 +1,126 @@
+'''
+Database-backed background job queue.
+
+Tasks are plain functions registered under a name in an app's `tasks`
+module:
+
+    @jobs.task('recipe.index')
+    def index_recipe(recipe_id):
+        ...
+
+and queued from request code with `jobs.enqueue('recipe.index',
+recipe_id=recipe.id)`. The job row is written in the caller's
+transaction, so it only becomes visible to workers once the request's
+own writes have committed. `manage.py run_jobs` executes them.
+'''
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from core.models import Job
+from core.routers import pinned_to_primary
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name):
+    '''Register the decorated function as the task called `name`.'''
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def autodiscover():
+    '''Import every installed app's tasks module so tasks get registered.'''
+    autodiscover_modules('tasks')
+
+
+def enqueue(name, *, delay=None, max_attempts=None, **payload):
+    '''Queue the task `name` to run with the given keyword arguments.'''
+    job = Job(name=name, payload=payload)
+    if delay is not None:
+        job.run_at = timezone.now() + timedelta(seconds=delay)
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    job.save()
+    return job
+
+
+def dequeue(batch_size):
+    '''Claim up to `batch_size` due jobs for this worker.'''
+    now = timezone.now()
+    # Running jobs whose worker hasn't finished them in time are up for grabs
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    with transaction.atomic():
+        # SKIP LOCKED lets concurrent workers claim disjoint batches without
+        # waiting on each other's row locks
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                Q(status=Job.STATUS_QUEUED, run_at__lte=now) |
+                Q(status=Job.STATUS_RUNNING, locked_at__lt=stale)
+            ).order_by('run_at', 'id')[:batch_size]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.STATUS_RUNNING,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.status = Job.STATUS_RUNNING
+        job.locked_at = now
+        job.attempts += 1
+    return jobs
+
+
+def retry_delay(attempts):
+    '''Return seconds to wait before the next attempt, with jitter.'''
+    delay = min(
+        settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+        settings.JOB_RETRY_MAX_DELAY,
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def run_job(job):
+    '''Execute a claimed job, then delete it or schedule its retry.'''
+    # Jobs are queued right after a write, which the replicas may not have yet
+    token = pinned_to_primary.set(True)
+    try:
+        func = _registry[job.name]
+        func(**job.payload)
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed', job.pk, job.name)
+        job.last_error = repr(exc)
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = Job.STATUS_FAILED
+        else:
+            job.status = Job.STATUS_QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        job.save(update_fields=['status', 'run_at', 'locked_at', 'last_error'])
+        return False
+    finally:
+        pinned_to_primary.reset(token)
+    job.delete()
+    return True
+
+
+def run_pending(batch_size=10):
+    '''Run due jobs until none are left; return how many were run.'''
+    count = 0
+    while True:
+        jobs = dequeue(batch_size)
+        if not jobs:
+            return count
+        for job in jobs:
+            run_job(job)
+        count += len(jobs)
@@ -0,0 +1,160 @@
+'''
+Django command comparing worker memory for naive and pre-forked startup
+'''
+import gc
+import io
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import prefork
+
+# Runs in a fresh interpreter per worker, like a server without preloading
+NAIVE_WORKER = '''
+import sys
+import django
+django.setup()
+from core.management.commands.benchmark_workers import run_worker
+run_worker(int(sys.argv[1]))
+sys.stdout.write('ready\\n')
+sys.stdout.flush()
+sys.stdin.read()
+'''
+
+
+def run_worker(requests):
+    '''Do what a worker does after starting: load the app and serve requests.'''
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    prefork.warm_up()  # Already done in the master when preloading
+    for _ in range(requests):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': '/api/user/me/',  # Unauthenticated, so no database needed
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': 'localhost',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+        }
+        b''.join(application(environ, lambda status, headers: None))
+    gc.collect()  # A full collection, as happens sooner or later in every worker
+
+
+def memory(pid):
+    '''Return {'rss', 'pss', 'uss'} of a process in bytes, from /proc.'''
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'uss': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+def naive_workers(count, requests):
+    '''Start workers as separate interpreters; return their memory.'''
+    workers = [
+        subprocess.Popen(
+            [sys.executable, '-c', NAIVE_WORKER, str(requests)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        for _ in range(count)
+    ]
+    try:
+        for worker in workers:
+            if worker.stdout.readline().strip() != 'ready':
+                raise CommandError('A naive worker failed to start')
+        return [memory(worker.pid) for worker in workers]
+    finally:
+        for worker in workers:
+            worker.stdin.close()
+            worker.wait()
+
+
+def forked_workers(count, requests, freeze):
+    '''Warm up this process, fork workers from it and return their memory.'''
+    from django.core.wsgi import get_wsgi_application
+
+    get_wsgi_application()
+    prefork.warm_up()
+    if freeze:
+        prefork.freeze()
+    children = []
+    try:
+        for _ in range(count):
+            ready_read, ready_write = os.pipe()
+            stop_read, stop_write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    os.close(ready_read)
+                    os.close(stop_write)
+                    run_worker(requests)
+                    os.write(ready_write, b'1')
+                    os.read(stop_read, 1)
+                finally:
+                    os._exit(0)
+            os.close(ready_write)
+            os.close(stop_read)
+            children.append((pid, ready_read, stop_write))
+        for _pid, ready_read, _stop_write in children:
+            if os.read(ready_read, 1) != b'1':
+                raise CommandError('A forked worker failed to start')
+        return [memory(pid) for pid, _ready_read, _stop_write in children]
+    finally:
+        for pid, ready_read, stop_write in children:
+            # A byte rather than EOF: later children hold copies of this pipe
+            os.write(stop_write, b'1')
+            os.close(stop_write)
+            os.close(ready_read)
+            os.waitpid(pid, 0)
+        if freeze:
+            gc.unfreeze()
+
+
+class Command(BaseCommand):
+    '''Django command to benchmark memory per worker'''
+
+    help = 'Compare per-worker memory of naive startup with preload and gc.freeze.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=20, help='Requests each worker serves.')
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command'''
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            raise CommandError('Needs Linux 4.14+ (/proc/<pid>/smaps_rollup)')
+
+        count, requests = options['workers'], options['requests']
+        results = {
+            'naive': naive_workers(count, requests),
+            'preload': forked_workers(count, requests, freeze=False),
+            'preload+freeze': forked_workers(count, requests, freeze=True),
+        }
+
+        self.stdout.write(f'{count} workers, {requests} requests each; MiB per worker (median)')
+        self.stdout.write(f"{'startup':<16}{'RSS':>8}{'PSS':>8}{'private':>9}")
+        for name, samples in results.items():
+            self.stdout.write(
+                f'{name:<16}' + ''.join(
+                    f'{statistics.median(sample[field] for sample in samples) / 2 ** 20:{width}.1f}'
+                    for field, width in (('rss', 8), ('pss', 8), ('uss', 9))
+                )
+            )
+        naive = statistics.median(sample['uss'] for sample in results['naive'])
+        frozen = statistics.median(sample['uss'] for sample in results['preload+freeze'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Private memory per worker: {naive / 2 ** 20:.1f} MiB naive, '
+            f'{frozen / 2 ** 20:.1f} MiB with preload and gc.freeze'
+        ))
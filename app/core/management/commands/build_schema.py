@@ -0,0 +1,32 @@
+'''
+Django command to prebuild the OpenAPI schema served at /api/schema/
+'''
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.schema import generate_schema
+
+
+class Command(BaseCommand):
+    '''Django command to write the OpenAPI schema to a file'''
+
+    help = 'Generate the OpenAPI schema so it is not built on each request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=settings.OPENAPI_SCHEMA_FILE,
+            help='Output path (defaults to settings.OPENAPI_SCHEMA_FILE).',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command'''
+        path = Path(options['file'])
+        content = generate_schema()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote OpenAPI schema to {path} ({len(content)} bytes)'
+        ))
@@ -0,0 +1,125 @@
+'''
+Django command to profile process startup and time to first request
+'''
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing is already imported or cached
+PROBE = '''
+import io, json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+loaded = time.perf_counter()
+statuses = []
+environ = {
+    'REQUEST_METHOD': 'GET',
+    'PATH_INFO': sys.argv[1],
+    'SERVER_NAME': sys.argv[2],
+    'SERVER_PORT': '80',
+    'HTTP_HOST': sys.argv[2],
+    'wsgi.input': io.BytesIO(),
+    'wsgi.errors': sys.stderr,
+    'wsgi.url_scheme': 'http',
+}
+body = application(environ, lambda status, headers: statuses.append(status))
+b''.join(body)
+done = time.perf_counter()
+print(json.dumps({
+    'setup': setup - start,
+    'load_handler': loaded - setup,
+    'first_request': done - loaded,
+    'status': statuses[0] if statuses else None,
+}))
+'''
+
+
+def parse_importtime(lines):
+    '''Sum `-X importtime` self times (in seconds) per top-level package.'''
+    totals = defaultdict(float)
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, _cumulative, name = line[len('import time:'):].split('|')
+            microseconds = int(self_us)
+        except ValueError:
+            continue  # The header row
+        totals[name.strip().split('.')[0]] += microseconds / 1e6
+    return dict(totals)
+
+
+class Command(BaseCommand):
+    '''Django command to report import time and time to first request'''
+
+    help = (
+        'Start a fresh interpreter, serve one request and report where '
+        'the startup time went.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module',
+            default=os.environ.get('DJANGO_SETTINGS_MODULE'),
+            help='Settings to profile, e.g. app.settings_api.',
+        )
+        parser.add_argument('--path', default='/api/user/me/')
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--json', action='store_true', dest='as_json')
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command'''
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': options['settings_module'],
+        }
+        result = subprocess.run(
+            [
+                sys.executable, '-X', 'importtime', '-c', PROBE,
+                options['path'], options['host'],
+            ],
+            capture_output=True, text=True, env=env,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Startup probe failed:\n{result.stderr}')
+
+        phases = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = parse_importtime(result.stderr.splitlines())
+        report = {
+            'settings': options['settings_module'],
+            'import_total': sum(imports.values()),
+            'phases': phases,
+            'time_to_first_request': sum(
+                phases[name]
+                for name in ('setup', 'load_handler', 'first_request')
+            ),
+            'imports': dict(sorted(
+                imports.items(), key=lambda item: item[1], reverse=True,
+            )[:options['top']]),
+        }
+        if options['as_json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Settings: {report['settings']}")
+        for name in ('setup', 'load_handler', 'first_request'):
+            self.stdout.write(f'  {name:<16}{phases[name] * 1000:9.1f} ms')
+        self.stdout.write(
+            f"Time to first request: "
+            f"{report['time_to_first_request'] * 1000:.1f} ms "
+            f"({phases['status']})"
+        )
+        self.stdout.write(
+            f"Import time: {report['import_total'] * 1000:.1f} ms, by package:"
+        )
+        for package, seconds in report['imports'].items():
+            self.stdout.write(f'  {package:<24}{seconds * 1000:9.1f} ms')
@@ -0,0 +1,77 @@
+'''
+Django command to permanently remove soft-deleted users and recipes
+'''
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import sharding
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    '''Django command to hard-delete soft-deleted rows in small batches'''
+
+    help = (
+        'Delete soft-deleted recipes and users in small batches so no '
+        'single transaction locks many rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows deleted per transaction.',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.1,
+            help='Seconds to sleep between batches.',
+        )
+        parser.add_argument(
+            '--older-than',
+            type=float,
+            default=0,
+            help='Only purge rows deleted at least this many hours ago.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command'''
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        cutoff = timezone.now() - timedelta(hours=options['older_than'])
+
+        recipes = 0
+        for alias in settings.RECIPE_SHARDS:
+            recipes += self.purge(Recipe.all_objects.using(alias).filter(deleted_at__lte=cutoff))
+
+        User = get_user_model()
+        users = 0
+        deleted_users = User.all_objects.filter(deleted_at__lte=cutoff)
+        for user_id in deleted_users.values_list('pk', flat=True).iterator():
+            # Remove the recipes first so the user's own delete cascades over little
+            shard = sharding.shard_for_user(user_id)
+            recipes += self.purge(Recipe.all_objects.using(shard).filter(user_id=user_id))
+            User.all_objects.filter(pk=user_id).delete()
+            users += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {recipes} recipes and {users} users'
+        ))
+
+    def purge(self, queryset):
+        '''Delete the rows of a queryset batch by batch; return the count.'''
+        total = 0
+        while True:
+            ids = list(queryset.values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return total
+            queryset.model.all_objects.using(queryset.db).filter(pk__in=ids).delete()
+            total += len(ids)
+            time.sleep(self.pause)  # Give other writers a turn at the locks
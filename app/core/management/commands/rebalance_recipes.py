@@ -0,0 +1,101 @@
+'''
+Django command to move users' recipe data onto the shards they hash to
+'''
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import sharding
+from core.models import Recipe, RecipeRevision, RecipeSignature, RecipeVector
+
+# Copied parents first so rows referencing a recipe find it on the target
+MOVED_MODELS = [
+    (Recipe, 'pk'),
+    (RecipeVector, 'recipe_id'),
+    (RecipeSignature, 'recipe_id'),
+    (RecipeRevision, 'recipe_id'),
+]
+
+
+class Command(BaseCommand):
+    '''Django command to move recipes between shards in batches'''
+
+    help = (
+        'Move every user\'s recipes, with their vectors, signatures and '
+        'history, to the shard RECIPE_SHARDS places them on. Run after '
+        'adding or draining a shard. A moving user may briefly see only '
+        'part of their recipes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email of a single user to move (default: every misplaced user).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Recipes copied and deleted per transaction.',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.1,
+            help='Seconds to sleep between batches.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report which users would move.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command'''
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        only_user = None
+        if options['user']:
+            try:
+                only_user = get_user_model().all_objects.get(email=options['user']).pk
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+
+        users = recipes = 0
+        for source in sharding.all_databases():
+            owners = Recipe.all_objects.using(source).order_by().values_list('user_id', flat=True)
+            if only_user is not None:
+                owners = owners.filter(user_id=only_user)
+            for user_id in list(owners.distinct()):
+                target = sharding.shard_for_user(user_id)
+                if target == source:
+                    continue
+                self.stdout.write(f'user {user_id}: {source} -> {target}')
+                if not options['dry_run']:
+                    recipes += self.move(user_id, source, target)
+                users += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Moved {recipes} recipes of {users} users'))
+
+    def move(self, user_id, source, target):
+        '''Copy a user's rows to the target in batches, deleting each from the source.'''
+        total = 0
+        while True:
+            ids = list(
+                Recipe.all_objects.using(source).filter(user_id=user_id)
+                .order_by('pk').values_list('pk', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return total
+            # Copy before deleting: a crash in between leaves duplicates that
+            # the next run skips (ids are kept), never lost rows
+            with transaction.atomic(using=target):
+                for model, field in MOVED_MODELS:
+                    rows = list(model._base_manager.using(source).filter(**{f'{field}__in': ids}))
+                    model._base_manager.using(target).bulk_create(rows, ignore_conflicts=True)
+            with transaction.atomic(using=source):
+                Recipe.all_objects.using(source).filter(pk__in=ids).delete()  # Cascades to the rest
+            total += len(ids)
+            time.sleep(self.pause)
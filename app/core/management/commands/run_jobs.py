@@ -0,0 +1,92 @@
+'''
+Django command to run queued background jobs
+'''
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    '''Django command to process the job queue'''
+
+    help = 'Run background jobs queued with core.jobs.enqueue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.JOB_WORKER_THREADS,
+            help='Number of concurrent worker threads.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Jobs claimed per round trip.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the queue is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling.',
+        )
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command'''
+        jobs.autodiscover()
+        self.stop = threading.Event()
+        self.processed = 0
+        self.lock = threading.Lock()
+
+        # Finish the jobs in hand and exit cleanly on SIGTERM/SIGINT
+        previous = {
+            signum: signal.signal(signum, lambda *args: self.stop.set())
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            if options['threads'] == 1:
+                self.work(options)
+            else:
+                threads = [
+                    threading.Thread(target=self.work_in_thread, args=(options,))
+                    for _ in range(options['threads'])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {self.processed} jobs'))
+
+    def work(self, options):
+        '''Claim and run batches until stopped or, with --once, drained.'''
+        while not self.stop.is_set():
+            batch = jobs.dequeue(options['batch_size'])
+            if not batch:
+                if options['once']:
+                    return
+                self.stop.wait(options['poll_interval'])
+                continue
+            for job in batch:
+                jobs.run_job(job)
+            with self.lock:
+                self.processed += len(batch)
+
+    def work_in_thread(self, options):
+        try:
+            self.work(options)
+        finally:
+            connections.close_all()  # Connections are per thread
@@ -0,0 +1,51 @@
+'''
+Django command to run the production server
+'''
+import importlib.util
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import prefork
+
+
+class Command(BaseCommand):
+    '''Django command to start gunicorn with app/gunicorn_conf.py'''
+
+    help = 'Serve the project with pre-forked gunicorn workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', help='Address to listen on (default 0.0.0.0:8000).')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: sized from CPUs and memory).')
+        parser.add_argument('--threads', type=int, help='Threads per worker (not with --asgi).')
+        parser.add_argument('--asgi', action='store_true', help='Serve app.asgi with uvicorn workers.')
+        parser.add_argument('--check', action='store_true', help='Print the sizing and exit.')
+
+    def handle(self, *args, **options):
+        '''Entrypoint for command'''
+        if options['asgi'] and options['threads']:
+            raise CommandError('--threads does not apply to uvicorn workers')
+        # The config module reads these after gunicorn replaces this process
+        overrides = {
+            'SERVER_BIND': options['bind'],
+            'SERVER_WORKERS': options['workers'],
+            'SERVER_THREADS': options['threads'],
+            'SERVER_ASGI': '1' if options['asgi'] else None,
+        }
+        env = {**os.environ, **{name: str(value) for name, value in overrides.items() if value}}
+
+        if options['check']:
+            self.stdout.write(
+                f'CPUs: {prefork.cpu_count()}, memory: {prefork.memory_available() / 2 ** 30:.1f} GiB'
+            )
+            if options['asgi']:
+                self.stdout.write(f"Uvicorn workers: {prefork.asgi_workers(workers=options['workers'])}")
+            else:
+                workers, threads = prefork.sizing(workers=options['workers'], threads=options['threads'])
+                self.stdout.write(f'Workers: {workers}, threads per worker: {threads}')
+            return
+
+        if importlib.util.find_spec('gunicorn') is None:
+            raise CommandError('gunicorn is not installed; see requirements.txt')
+        os.execve(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'python:app.gunicorn_conf'], env)
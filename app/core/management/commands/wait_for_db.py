@@ -2,24 +2,110 @@
 Django command to wait for databse to be available
 '''
 
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 from psycopg2 import OperationalError as Psycopg2OpError
+from django.core.cache import caches
+from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
 
 class Command(BaseCommand):
     '''Django command to wait for database'''
-    
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Database alias to wait for; repeat for several '
+                 '(default: default).',
+        )
+        parser.add_argument(
+            '--cache',
+            action='append',
+            dest='caches',
+            default=[],
+            help='Cache alias to wait for as well; repeat for several.',
+        )
+        parser.add_argument(
+            '--initial-delay',
+            type=float,
+            default=0.1,
+            help='Seconds to wait after the first failed check.',
+        )
+        parser.add_argument(
+            '--max-delay',
+            type=float,
+            default=5.0,
+            help='Upper bound in seconds for a single wait.',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60.0,
+            help='Give up after this many seconds.',
+        )
+
     def handle(self, *args, **options):
         '''Entrypooint for command'''
         self.stdout.write('Waiting for database...')
-        db_up = False
-        while db_up is False:
+        pending = [('database', alias) for alias in options['databases'] or ['default']]
+        pending += [('cache', alias) for alias in options['caches']]
+
+        start = time.monotonic()
+        delay = options['initial_delay']
+        while True:
+            pending = self.check_targets(pending)
+            if not pending:
+                break
+
+            elapsed = time.monotonic() - start
+            remaining = options['timeout'] - elapsed
+            names = ', '.join(alias for _kind, alias in pending)
+            if remaining <= 0:
+                raise CommandError(
+                    f'Timed out after {elapsed:.1f} seconds waiting for: {names}'
+                )
+            # Exponential backoff with jitter so replicas don't retry in lockstep
+            wait = min(delay, options['max_delay'], remaining)
+            wait = wait / 2 + random.uniform(0, wait / 2)
+            self.stdout.write(f'Unavailable ({names}), waiting {wait:.2f} seconds ...')
+            time.sleep(wait)
+            delay *= 2
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(f'Database available (took {elapsed:.2f} seconds)'))
+
+    def check_targets(self, targets):
+        '''Check targets concurrently and return those still unavailable.'''
+        if len(targets) == 1:
+            results = [self.is_available(*targets[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+                results = list(executor.map(self.check_in_thread, targets))
+        return [target for target, ok in zip(targets, results) if not ok]
+
+    def check_in_thread(self, target):
+        '''Check a target from a pool thread and release its connections.'''
+        try:
+            return self.is_available(*target)
+        finally:
+            connections.close_all()  # Connections are per thread
+
+    def is_available(self, kind, alias):
+        '''Return whether a database or cache alias answers.'''
+        if kind == 'cache':
             try:
-                self.check(databases=['default'])
-                db_up = True
-            except(Psycopg2OpError, OperationalError):
-                self.stdout.write('Database unavailable, waiting 1 second ...')
-                time.sleep(1)
+                caches[alias].get('wait_for_db')
+            except Exception:  # Each cache backend raises its own errors
+                return False
+            return True
 
-        self.stdout.write(self.style.SUCCESS('Database available'))
\ No newline at end of file
+        try:
+            self.check(databases=[alias])
+        except (Psycopg2OpError, OperationalError):
+            return False
+        return True
@@ -0,0 +1,281 @@
+'''
+Request metrics in the Prometheus text format.
+
+Every process appends its samples to its own memory-mapped file in
+METRICS_DIR, so recording is a dictionary lookup and a float write with
+no locks shared between processes and no network hop. The /metrics
+view reads every file in the directory and adds the samples up, which
+gives totals across all workers, including ones that have since exited.
+Empty the directory when the server starts so old deploys don't count.
+
+Histograms store one counter per bucket rather than cumulative counts,
+so an observation touches a single bucket; cumulative `le` buckets and
+`_count` are computed when the metrics are rendered.
+
+Metrics are best effort: if the file can't be created or grown, the
+error is logged once and requests are served without recording them.
+'''
+import bisect
+import functools
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds of the request latency buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by route, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by route and method.'),
+    'http_request_db_queries_total': ('counter', 'Database queries run by requests, by route and method.'),
+    'cache_requests_total': ('counter', 'Cache lookups by cache and result (hit or miss).'),
+    'http_requests_shed_total': ('counter', 'Requests refused with a 503 by the concurrency limits, by route group.'),
+}
+
+_HEADER = struct.Struct('<Q')  # Bytes in use, including the header
+_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+_INITIAL_SIZE = 64 * 1024
+
+
+class MmapStore:
+    '''Append-only key to float table in a memory-mapped file.
+
+    Each entry is the key's length, the UTF-8 key padded to 8 bytes and
+    a float64 value. An entry is written in full before the header is
+    moved past it, so readers never see a partial entry.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.unpack_from(self._map, 0)[0]
+        if self._used == 0:
+            self._used = _HEADER.size
+            _HEADER.pack_into(self._map, 0, self._used)
+        for key, _value, position in _entries(self._map, self._used):
+            self._positions[key] = position
+
+    def inc(self, key, amount=1.0):
+        '''Add `amount` to a key's value.'''
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._add(key)
+            value = _VALUE.unpack_from(self._map, position)[0]
+            _VALUE.pack_into(self._map, position, value + amount)
+
+    def _add(self, key):
+        encoded = key.encode()
+        padded = len(encoded) + (-(_LENGTH.size + len(encoded)) % 8)
+        size = _LENGTH.size + padded + _VALUE.size
+        if self._used + size > len(self._map):
+            self._grow(self._used + size)
+
+        start = self._used
+        _LENGTH.pack_into(self._map, start, len(encoded))
+        self._map[start + _LENGTH.size:start + _LENGTH.size + len(encoded)] = encoded
+        position = start + _LENGTH.size + padded
+        _VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def _grow(self, needed):
+        capacity = len(self._map)
+        while capacity < needed:
+            capacity *= 2
+        # Extend the file first so the old map is still usable if that fails
+        self._file.truncate(capacity)
+        self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _entries(buffer, used):
+    '''Yield (key, value, value position) for the entries of a store.'''
+    position = _HEADER.size
+    while position < used:
+        length = _LENGTH.unpack_from(buffer, position)[0]
+        key_start = position + _LENGTH.size
+        key = bytes(buffer[key_start:key_start + length]).decode()
+        value_position = key_start + length + (-(_LENGTH.size + length) % 8)
+        if value_position + _VALUE.size > len(buffer):
+            return  # Read while the file was growing
+        yield key, _VALUE.unpack_from(buffer, value_position)[0], value_position
+        position = value_position + _VALUE.size
+
+
+def read_file(path):
+    '''Yield the (key, value) pairs stored in one process's file.'''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        return
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    for key, value, _position in _entries(data, used):
+        yield key, value
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    '''Return this process's store, opening a new one after a fork.'''
+    global _store
+    path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.db')
+    store = _store
+    if store is not None and store.path == path:
+        return store
+    with _store_lock:
+        if _store is None or _store.path != path:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            _store = MmapStore(path)
+        return _store
+
+
+_failure_logged = False
+
+
+def _best_effort(func):
+    '''Skip recording, logging the first failure, when the file can't be written.'''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _failure_logged
+        try:
+            func(*args, **kwargs)
+        except OSError:
+            if not _failure_logged:
+                _failure_logged = True
+                logger.exception('Cannot write metrics to %s; not recording them', settings.METRICS_DIR)
+    return wrapper
+
+
+@functools.lru_cache(maxsize=4096)
+def _key(name, labels):
+    return json.dumps([name, labels])
+
+
+@_best_effort
+def inc(name, labels, amount=1):
+    '''Add to a counter; `labels` is a tuple of (label, value) pairs.'''
+    get_store().inc(_key(name, labels), amount)
+
+
+@_best_effort
+def observe(name, labels, value):
+    '''Record one histogram observation.'''
+    store = get_store()
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, value)
+    le = LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else '+Inf'
+    store.inc(_key(f'{name}_bucket', labels + (('le', le),)))
+    store.inc(_key(f'{name}_sum', labels), value)
+
+
+def record_cache(cache_name, hit):
+    '''Count a lookup in one of the application's caches.'''
+    inc('cache_requests_total', (('cache', cache_name), ('result', 'hit' if hit else 'miss')))
+
+
+def collect():
+    '''Return {(name, labels): value} summed over every process's file.'''
+    totals = defaultdict(float)
+    try:
+        names = os.listdir(settings.METRICS_DIR)
+    except FileNotFoundError:
+        return totals
+    for filename in names:
+        if not filename.endswith('.db'):
+            continue
+        try:
+            samples = list(read_file(os.path.join(settings.METRICS_DIR, filename)))
+        except FileNotFoundError:  # Removed while we were reading the directory
+            continue
+        for key, value in samples:
+            name, labels = json.loads(key)
+            totals[name, tuple(tuple(pair) for pair in labels)] += value
+    return totals
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (label, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for label, value in labels
+    )
+    return '{' + ','.join(f'{label}="{value}"' for label, value in escaped) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def render():
+    '''Return every metric in the Prometheus text exposition format.'''
+    totals = collect()
+    by_name = defaultdict(dict)
+    for (name, labels), value in totals.items():
+        by_name[name][labels] = value
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            lines.extend(_render_histogram(name, by_name))
+        else:
+            for labels, value in sorted(by_name[name].items()):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(name, by_name):
+    buckets = defaultdict(dict)
+    for labels, value in by_name[f'{name}_bucket'].items():
+        le = labels[-1][1]
+        buckets[labels[:-1]][le] = value
+
+    for labels in sorted(buckets):
+        counts = buckets[labels]
+        cumulative = 0
+        for le in LATENCY_BUCKETS + ('+Inf',):
+            cumulative += counts.get(le, 0)
+            yield f'{name}_bucket{_format_labels(labels + (("le", le),))} {_format_value(cumulative)}'
+        yield f'{name}_sum{_format_labels(labels)} {repr(by_name[f"{name}_sum"].get(labels, 0.0))}'
+        yield f'{name}_count{_format_labels(labels)} {_format_value(cumulative)}'
+
+
+@require_safe
+def metrics_view(request):
+    '''Serve the metrics to a scraper holding METRICS_TOKEN.'''
+    if not settings.METRICS_TOKEN:
+        return HttpResponseNotFound()
+    expected = f'Bearer {settings.METRICS_TOKEN}'
+    if not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), expected):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
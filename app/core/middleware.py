@@ -0,0 +1,198 @@
+'''
+Middleware for the project.
+'''
+import functools
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import JsonResponse
+
+from core import activity, concurrency, metrics
+from core.routers import pinned_to_primary, wrote_to_primary
+from user.authentication import credential_user_id
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Methods given their own metrics label; clients can send any token as a
+# method, so the rest share one label rather than each adding new series
+METRIC_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class ReplicaPinningMiddleware:
+    '''Pin a user's reads to the primary for a short while after they write.
+
+    The pin is keyed on the user id, so it covers every device and token
+    of the user, and is kept in the default cache, which must be shared
+    (e.g. memcached) for the pin to reach other workers. The user is
+    told apart by their credential before the view runs; that lookup
+    never touches a replica (see user.authentication.credential_user_id).
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user_id = credential_user_id(request)
+        pinned = request.method not in SAFE_METHODS or (
+            user_id is not None and cache.get(self.pin_key(user_id), False)
+        )
+        pinned_token = pinned_to_primary.set(bool(pinned))
+        wrote_token = wrote_to_primary.set(False)
+        try:
+            response = self.get_response(request)
+            if wrote_to_primary.get():
+                # DRF copies the user it authenticated onto the underlying request
+                user = getattr(request, 'user', None)
+                if user is not None and user.is_authenticated:
+                    user_id = user.pk
+                if user_id is not None:
+                    cache.set(self.pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+        finally:
+            pinned_to_primary.reset(pinned_token)
+            wrote_to_primary.reset(wrote_token)
+        return response
+
+    def pin_key(self, user_id):
+        return f'replica-pin:{user_id}'
+
+
+class ActivityMiddleware:
+    '''Record when authenticated users were last seen.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF copies the user it authenticated onto the underlying request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            activity.buffer.record(user.pk)
+        return response
+
+
+class QueryCounter:
+    '''Database execute wrapper counting the queries it lets through.'''
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    '''Record request counts, latency and query counts by route.
+
+    Routes are labelled with the URL name (e.g. `recipe:recipe-detail`)
+    rather than the path, so ids in URLs don't create new series.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unmatched'
+        method = request.method if request.method in METRIC_METHODS else 'other'
+        labels = (('route', route), ('method', method))
+        metrics.inc('http_requests_total', labels + (('status', str(response.status_code)),))
+        metrics.observe('http_request_duration_seconds', labels, duration)
+        if counter.count:
+            metrics.inc('http_request_db_queries_total', labels, counter.count)
+        return response
+
+
+class ReleasingIterator:
+    '''Iterate over a streamed body and call `release` when it is closed.
+
+    Servers close a streaming response's content (through its resource
+    closers) whether or not it was read to the end; a generator's own
+    `finally` would not run if it was never started.
+    '''
+
+    def __init__(self, iterable, release):
+        self._iterator = iter(iterable)
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def close(self):
+        try:
+            close = getattr(self._iterator, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._release()
+
+
+class ConcurrencyLimitMiddleware:
+    '''Limit concurrent requests per route group and shed the excess.
+
+    See core.concurrency. Requests refused a slot get a 503 with
+    Retry-After straight away, before any view code or query runs.
+    ASGI requests are let through: their worker serves sync views one
+    at a time anyway, and a queued request would block it.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            # Released here rather than in process_response so a view
+            # raising an exception still frees its slot
+            self.release(request)
+            raise
+        if response.streaming and '_concurrency_slot' in request.__dict__:
+            # The body is still being produced, so the slot is held until the
+            # server closes it after the last chunk or a disconnect. Latency is
+            # timed to the response, so a long download doesn't count as slow
+            response.streaming_content = ReleasingIterator(
+                response.streaming_content,
+                functools.partial(self.release, request, time.perf_counter()),
+            )
+        else:
+            self.release(request)
+        return response
+
+    @staticmethod
+    def release(request, end=None):
+        '''Free the request's slot, if it took one, timing the request up to `end`.'''
+        slot = request.__dict__.pop('_concurrency_slot', None)
+        if slot is not None:
+            limiter, start = slot
+            limiter.release((end or time.perf_counter()) - start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if isinstance(request, ASGIRequest):
+            return None
+        limiter = concurrency.limiter_for(request.resolver_match.view_name, request.method)
+        if limiter is None:
+            return None
+        if not limiter.acquire():
+            metrics.inc('http_requests_shed_total', (('group', limiter.name),))
+            response = JsonResponse({'detail': 'Server is busy, try again later.'}, status=503)
+            response['Retry-After'] = str(limiter.retry_after)
+            return response
+        request._concurrency_slot = (limiter, time.perf_counter())
+        return None
@@ -0,0 +1,42 @@
+# Trigram indexes backing the admin's icontains search on users.
+
+from django.db import migrations
+
+
+# Django renders `email__icontains` as `UPPER("email"::text) LIKE UPPER(%s)`
+# on PostgreSQL, so the indexes are built on the same expression.
+SEARCH_INDEXES = [
+    ('core_user_email_trgm', 'email'),
+    ('core_user_name_trgm', 'name'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    '''Create pg_trgm GIN indexes for user search (PostgreSQL only).'''
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index_name, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name} ON core_user '
+            f'USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    '''Drop the user search indexes.'''
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name, _column in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_recipe'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
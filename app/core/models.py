@@ -8,11 +8,16 @@ from django.contrib.auth.models import (
     PermissionsMixin,  # Adds fields and methods to support Django's permission framework
 )
 from django.conf import settings # Importing Django's settings module
+from django.utils import timezone # Importing timezone for timezone-aware timestamps
 
 # Custom manager for handling user creation and management
 class UserManager(BaseUserManager):
     '''Manager for users'''
 
+    def get_queryset(self):
+        '''Hide soft-deleted users.'''
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
     def create_user(self, email, password=None, **extra_fields):
         '''Create, save and return a new user.'''
         if not email:
@@ -42,11 +47,48 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)  # Boolean field to track if the user is active
     is_staff = models.BooleanField(default=False)  # Boolean field to track if the user has admin access
 
+    # Set when the user is soft-deleted; `purge_deleted` removes the row and its data later
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    # Embedded in signed access and refresh tokens; bumping it revokes them all (see user.tokens)
+    token_version = models.PositiveIntegerField(default=0)
+
     objects = UserManager()  # Assign the custom manager to handle user operations
+    all_objects = models.Manager()  # Includes soft-deleted users
 
     USERNAME_FIELD = 'email'  # Set email as the unique identifier for authentication
 
-    # Additional fields and methods can be added here if needed
+    class Meta:
+        # Lets the purge command find deleted users without scanning the table
+        indexes = [
+            models.Index(
+                fields=['deleted_at'],
+                name='core_user_deleted_idx',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
+        ]
+
+    def soft_delete(self):
+        '''Hide the user and block their logins without touching their recipes.'''
+        self.deleted_at = timezone.now()
+        self.is_active = False  # Token authentication rejects inactive users
+        self.save(update_fields=['deleted_at', 'is_active'])
+
+    def revoke_tokens(self):
+        '''Invalidate every signed token issued to the user so far.'''
+        self.token_version = models.F('token_version') + 1
+        self.save(update_fields=['token_version'])
+        self.refresh_from_db(fields=['token_version'])
+
+
+# Manager hiding soft-deleted recipes
+class RecipeManager(models.Manager):
+    """Manager for recipes."""
+
+    def get_queryset(self):
+        """Hide soft-deleted recipes."""
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 #Recipe based on models.model of django, different from our user as the user class mei we were extending the base user model
 class Recipe(models.Model):
@@ -56,9 +98,12 @@ class Recipe(models.Model):
     # This links each recipe to a specific user, ensuring that each recipe is owned by a user.
     # settings.AUTH_USER_MODEL refers to the custom user model defined in the project settings.
     # on_delete=models.CASCADE ensures that if a user is deleted, all their associated recipes are also deleted.
+    # Recipes may live on a different database (shard) from their user, so no database constraint is created;
+    # core.signals deletes the recipes on the other shards when the user is deleted.
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
     )
 
     # CharField for the title of the recipe with a maximum length of 255 characters
@@ -80,7 +125,184 @@ class Recipe(models.Model):
     # blank=True allows this field to be optional
     link = models.CharField(max_length=255, blank=True)
 
+    # Set when the recipe is soft-deleted; `purge_deleted` removes the row later
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = RecipeManager()
+    all_objects = models.Manager()  # Includes soft-deleted recipes
+
+    class Meta:
+        # Lets the purge command find deleted recipes without scanning the table
+        indexes = [
+            models.Index(
+                fields=['deleted_at'],
+                name='core_recipe_deleted_idx',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
+        ]
+
     # The __str__ method returns the title of the recipe as its string representation
     # This is useful for displaying the recipe in admin interfaces or when printing the object.
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    def soft_delete(self):
+        """Hide the recipe; the row is removed later by `purge_deleted`."""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+
+
+# Hashed text embedding of a recipe, maintained on write and used for similar-recipe search
+class RecipeVector(models.Model):
+    """Recipe embedding."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='vector',
+    )
+
+    # Copied from the recipe so a user's vectors can be read without a join
+    # (no database constraint: the user may be on another shard)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False)
+
+    # float32 array of recipe.similarity.DIMENSIONS values, L2-normalised
+    vector = models.BinaryField()
+
+
+# MinHash signature of a recipe's text, maintained on write and used to find near-duplicates
+class RecipeSignature(models.Model):
+    """Recipe MinHash signature."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+    )
+
+    # Copied from the recipe so a user's signatures can be read without a join
+    # (no database constraint: the user may be on another shard)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False)
+
+    # uint32 array of recipe.dedupe.NUM_PERM minimum hashes
+    signature = models.BinaryField()
+
+
+# Append-only change history of a recipe; see recipe.history
+class RecipeRevision(models.Model):
+    """Recipe revision."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='revisions',
+    )
+
+    # 1 for the first recorded state, incremented on each change
+    number = models.PositiveIntegerField()
+
+    # Only the fields changed by this revision, or every field for a checkpoint
+    changes = models.JSONField()
+
+    # A checkpoint holds the full state, so rebuilding never folds past it
+    is_checkpoint = models.BooleanField(default=False)
+
+    # Who made the change; kept when the account is removed
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,  # Users stay on the primary when the recipe is on a shard
+    )
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'number'], name='core_reciperevision_number_uniq'),
+        ]
+        ordering = ['recipe', 'number']
+
+    def __str__(self):
+        return f'{self.recipe_id} #{self.number}'
+
+
+# Queued unit of background work, executed by the `run_jobs` management command
+class Job(models.Model):
+    """Background job."""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # Name the task was registered under with core.jobs.task
+    name = models.CharField(max_length=255)
+
+    # Keyword arguments passed to the task
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+
+    # Number of times a worker has picked the job up
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+
+    # The job is not picked up before this time; pushed back after each failure
+    run_at = models.DateTimeField(default=timezone.now)
+
+    # When a worker claimed the job, used to recover jobs from crashed workers
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Workers look for ready jobs by status and due time
+        indexes = [models.Index(fields=['status', 'run_at'], name='core_job_ready_idx')]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+# Users uploaded through the provisioning API, created by a background job
+class ProvisioningBatch(models.Model):
+    """Bulk user provisioning request."""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_DONE = 'done'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_DONE, 'Done'),
+    ]
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+    )
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+
+    # (line number, record) pairs; emptied once the users are created so
+    # uploaded passwords don't stay in the database
+    records = models.JSONField(default=list)
+
+    # Issue an auth token for each created user
+    tokens = models.BooleanField(default=False)
+
+    # What user.provisioning.Provisioner reported
+    result = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Provisioning batch {self.pk} ({self.status})'
@@ -0,0 +1,163 @@
+'''
+Helpers for pre-forking production servers (see app/gunicorn_conf.py).
+
+The master process imports and warms up everything a worker would
+otherwise build on its first requests, then forks. Workers start with
+those pages shared copy-on-write. CPython writes to an object's header
+whenever the garbage collector scans it, which copies the page into the
+worker, so `freeze` moves everything loaded so far into the permanent
+generation that the collector never scans.
+
+Worker and thread counts are sized from the CPUs and memory available
+to the container, unless SERVER_WORKERS and SERVER_THREADS are set.
+ASGI (uvicorn) workers have no thread count: Django runs a worker's
+sync views one at a time on a single thread, so they are sized by
+workers alone.
+'''
+import gc
+import logging
+import math
+import os
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+
+from core import events
+
+logger = logging.getLogger(__name__)
+
+# Workers = 2 * CPUs + 1, the usual starting point for I/O-bound apps
+WORKERS_PER_CPU = 2
+# Threads per worker when memory doesn't limit the number of workers
+DEFAULT_THREADS = 4
+MAX_THREADS = 32
+
+
+def cpu_count():
+    '''Return the CPUs this process may use, honouring a cgroup CPU quota.'''
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def memory_available():
+    '''Return the bytes of memory available to the container.'''
+    limits = [os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')]
+    # cgroup v2, then v1; an unlimited v1 group reports a huge number
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            limits.append(int(value))
+        break
+    return min(limits)
+
+
+def worker_count(cpus=None, memory=None, workers=None):
+    '''Return the number of worker processes for the machine.'''
+    workers = workers or settings.SERVER_WORKERS
+    if workers:
+        return workers
+    cpus = cpus or cpu_count()
+    memory = memory or memory_available()
+    by_memory = memory // settings.SERVER_WORKER_MEMORY
+    return max(1, min(WORKERS_PER_CPU * cpus + 1, by_memory))
+
+
+def asgi_workers(cpus=None, memory=None, workers=None):
+    '''Return the number of uvicorn workers for the machine.'''
+    if events.broker_class().shared:
+        return worker_count(cpus, memory, workers)
+    # Without a shared broker the change feed only sees events published in
+    # its own process (see core.events), so everything is served from one
+    # unless more workers are asked for
+    workers = workers or settings.SERVER_WORKERS
+    if workers > 1:
+        logger.warning(
+            'Serving with %d uvicorn workers without a shared events broker; '
+            'feed subscribers will miss changes made through other workers', workers,
+        )
+    return workers or 1
+
+
+def sizing(cpus=None, memory=None, workers=None, threads=None):
+    '''Return (workers, threads) for threaded (gthread) workers.
+
+    `workers` and `threads` default to SERVER_WORKERS and SERVER_THREADS;
+    whichever is unset is sized for the machine.
+    '''
+    cpus = cpus or cpu_count()
+    workers = worker_count(cpus, memory, workers)
+    threads = threads or settings.SERVER_THREADS
+    if not threads:
+        # Make up with threads for workers that memory didn't allow
+        wanted = (WORKERS_PER_CPU * cpus + 1) * DEFAULT_THREADS
+        threads = min(MAX_THREADS, max(DEFAULT_THREADS, math.ceil(wanted / workers)))
+    return workers, threads
+
+
+def _url_patterns(patterns):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from _url_patterns(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+def warm_up():
+    '''Build the caches a worker would otherwise fill on its first requests.'''
+    resolver = get_resolver()
+    resolver.reverse_dict  # Compiles every URL pattern
+    serializer_classes = set()
+    for pattern in _url_patterns(resolver.url_patterns):
+        view_class = getattr(pattern.callback, 'cls', None)
+        if view_class is None or not hasattr(view_class, 'get_serializer_class'):
+            continue
+        for action in (getattr(pattern.callback, 'actions', None) or {None: None}).values():
+            view = view_class(**getattr(pattern.callback, 'initkwargs', {}))
+            view.action = action
+            try:
+                serializer_classes.add(view.get_serializer_class())
+            except Exception:  # Views that need a request to choose
+                continue
+    for serializer_class in serializer_classes:
+        try:
+            # Builds the fields and fills the model _meta caches they use
+            serializer_class().fields
+        except Exception:
+            logger.warning('Could not warm up %s', serializer_class.__name__, exc_info=True)
+    # Connections must not be shared with the forked workers
+    connections.close_all()
+
+
+def freeze():
+    '''Keep everything loaded so far out of the garbage collector's scans.'''
+    gc.collect()  # Don't carry garbage into the permanent generation
+    gc.freeze()
+
+
+def clear_metrics():
+    '''Empty METRICS_DIR so samples from an earlier deploy aren't counted.'''
+    # Only the files are removed; the directory may be a volume or belong
+    # to another user than its parent
+    try:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        for entry in os.scandir(settings.METRICS_DIR):
+            if entry.name.endswith('.db'):
+                os.remove(entry.path)
+    except OSError:
+        # Workers skip recording too (see core.metrics), so serve without them
+        logger.exception('Could not clear metrics in %s', settings.METRICS_DIR)
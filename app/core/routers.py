@@ -0,0 +1,104 @@
+'''
+Database routers for the project.
+'''
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY_DATABASE = 'default'
+
+# Set by ReplicaPinningMiddleware for requests whose reads must see the primary
+pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+# Database holding the recipes being worked on; set through core.sharding
+current_shard = ContextVar('current_shard', default=None)
+
+# Set as soon as anything is written, so later reads in the same request
+# (or management command) see that write
+wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+
+class ShardRouter:
+    '''Send queries on recipe data to the owning user's shard.
+
+    Returns None for the primary, so PrimaryReplicaRouter still spreads
+    reads of recipes on the primary over its replicas.
+    '''
+
+    def db_for_read(self, model, **hints):
+        return self.shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.shard(model, hints)
+
+    def shard(self, model, hints):
+        from core import sharding
+
+        if not sharding.is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in settings.DATABASE_SHARDS:
+            return instance._state.db  # Stay on the shard the row came from
+        alias = current_shard.get()
+        if alias is None and instance is not None:
+            owner = self.owner_id(instance)
+            if owner is not None:
+                alias = sharding.shard_for_user(owner)
+        return None if alias == PRIMARY_DATABASE else alias
+
+    def owner_id(self, instance):
+        '''Return the id of the user whose shard holds a related instance.'''
+        if instance._meta.label == settings.AUTH_USER_MODEL:
+            return instance.pk  # e.g. user.recipe_set
+        if instance._meta.model_name == 'recipe':
+            return instance.user_id
+        recipe = instance._state.fields_cache.get('recipe')
+        return recipe.user_id if recipe is not None else getattr(instance, 'user_id', None)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        '''Recipe data may point at users on the primary.'''
+        from core import sharding
+
+        sharded = [sharding.is_sharded(obj) for obj in (obj1, obj2)]
+        if all(sharded):
+            # Replicas count as the primary they copy
+            home = [PRIMARY_DATABASE if obj._state.db in settings.DATABASE_REPLICAS else obj._state.db
+                    for obj in (obj1, obj2)]
+            return home[0] == home[1]
+        if any(sharded):
+            return True
+        return None
+
+
+class PrimaryReplicaRouter:
+    '''Send writes to the primary and spread safe reads over the replicas.'''
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or pinned_to_primary.get() or wrote_to_primary.get():
+            return PRIMARY_DATABASE
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, *self.pool()):
+            return None  # Bound to a database outside the primary/replica pool
+        wrote_to_primary.set(True)
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        '''Replicas hold the same rows as the primary.'''
+        pool = self.pool()
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def pool(self):
+        return {PRIMARY_DATABASE, *settings.DATABASE_REPLICAS}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        '''Replicas get their schema through replication.'''
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,115 @@
+'''
+OpenAPI schema served from memory with caching headers.
+'''
+import hashlib
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+
+# Media types used by drf_spectacular for YAML and JSON schemas
+SCHEMA_CONTENT_TYPE = 'application/vnd.oai.openapi'
+JSON_SCHEMA_CONTENT_TYPE = 'application/vnd.oai.openapi+json'
+
+YAML = 'yaml'
+JSON = 'json'
+
+_documents = {}
+_document_lock = threading.Lock()
+_swagger_view = None
+
+
+class SchemaDocument:
+    '''Rendered schema bytes together with their ETag.'''
+
+    def __init__(self, content):
+        self.content = content
+        self.etag = hashlib.sha256(content).hexdigest()
+
+
+def generate_schema():
+    '''Walk the API and render the OpenAPI schema as YAML bytes.'''
+    # drf_spectacular is only imported when a schema actually has to be built
+    from drf_spectacular.renderers import OpenApiYamlRenderer
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    return OpenApiYamlRenderer().render(schema, renderer_context={})
+
+
+def render_json(content):
+    '''Render a YAML schema as JSON bytes.'''
+    import yaml
+    from drf_spectacular.renderers import OpenApiJsonRenderer
+
+    return OpenApiJsonRenderer().render(yaml.safe_load(content), renderer_context={})
+
+
+def get_schema_document(format=YAML):
+    '''Return the schema in `format`, loading or generating it once per process.'''
+    if format not in _documents:
+        with _document_lock:
+            if YAML not in _documents:
+                path = Path(settings.OPENAPI_SCHEMA_FILE)
+                if path.is_file():
+                    content = path.read_bytes()  # Prebuilt by build_schema
+                else:
+                    content = generate_schema()
+                _documents[YAML] = SchemaDocument(content)
+            if format == JSON and JSON not in _documents:
+                _documents[JSON] = SchemaDocument(render_json(_documents[YAML].content))
+    return _documents[format]
+
+
+def reset_schema_document():
+    '''Drop the memoized schema so the next request reloads it.'''
+    with _document_lock:
+        _documents.clear()
+
+
+def schema_format(request):
+    '''Pick YAML or JSON from ?format= or the Accept header, as SpectacularAPIView did.'''
+    requested = request.GET.get('format')
+    if requested:
+        return JSON if requested in ('json', 'openapi-json') else YAML
+    for media_type in request.headers.get('Accept', '').split(','):
+        media_type = media_type.split(';')[0].strip()
+        if media_type.endswith('json'):
+            return JSON
+        if media_type.endswith(('yaml', 'openapi')):
+            return YAML
+    return YAML
+
+
+def schema_etag(request, *args, **kwargs):
+    return get_schema_document(schema_format(request)).etag
+
+
+@require_safe
+@cache_control(public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+@condition(etag_func=schema_etag)
+def schema_view(request):
+    '''Serve the OpenAPI schema, answering revalidations with 304.'''
+    format = schema_format(request)
+    document = get_schema_document(format)
+    response = HttpResponse(
+        document.content,
+        content_type=JSON_SCHEMA_CONTENT_TYPE if format == JSON else SCHEMA_CONTENT_TYPE,
+    )
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def swagger_view(request, *args, **kwargs):
+    '''Serve Swagger UI, importing drf_spectacular on first use.'''
+    global _swagger_view
+    if _swagger_view is None:
+        from drf_spectacular.views import SpectacularSwaggerView
+
+        _swagger_view = SpectacularSwaggerView.as_view(url_name='api-schema')
+    return _swagger_view(request, *args, **kwargs)
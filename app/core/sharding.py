@@ -0,0 +1,108 @@
+'''
+Placement of users' recipe data across database shards.
+
+Each user's recipes, and the vectors, signatures and revisions that hang
+off them, live together on one database from RECIPE_SHARDS. The shard
+is chosen by rendezvous hashing of the user id, so the choice is stable
+across processes and adding a shard only moves about 1/N of the users;
+`rebalance_recipes` moves their rows afterwards.
+
+Code that works on one user's recipes runs inside `for_user`, which
+points ShardRouter at that user's shard for every query on a sharded
+model, the way ReplicaPinningMiddleware pins reads to the primary.
+Queries outside any shard context go to the primary database.
+
+Auto-increment ids are allocated from a separate range on each shard,
+so a recipe keeps its id when it is moved.
+'''
+import hashlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from core.routers import PRIMARY_DATABASE, current_shard
+
+# Models stored on the owner's shard, as app_label.model_name
+SHARDED_MODELS = {'core.recipe', 'core.recipevector', 'core.recipesignature', 'core.reciperevision'}
+
+# Models with their own auto-increment ids; the others are keyed by recipe
+ID_RANGE_TABLES = ('core_recipe', 'core_reciperevision')
+
+# Ids per shard: shard n allocates from n * ID_RANGE_SIZE. 2**40 keeps ids
+# of the first 8192 shards below 2**53, the largest integer JSON clients
+# such as JavaScript represent exactly
+ID_RANGE_SIZE = 2 ** 40
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def all_databases():
+    '''Every database that may hold recipe data, including ones being drained.'''
+    return [PRIMARY_DATABASE, *settings.DATABASE_SHARDS]
+
+
+def shard_for_user(user_id):
+    '''Return the database alias holding a user's recipes.'''
+    shards = settings.RECIPE_SHARDS
+    if len(shards) == 1:
+        return shards[0]
+    # Rendezvous hashing: the shard with the highest score for this user wins
+    return max(
+        shards,
+        key=lambda alias: hashlib.blake2b(f'{alias}:{user_id}'.encode(), digest_size=8).digest(),
+    )
+
+
+@contextmanager
+def using(alias):
+    '''Route queries on sharded models to `alias` within the block.'''
+    token = current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        current_shard.reset(token)
+
+
+def for_user(user_id):
+    '''Route queries on sharded models to the user's shard within the block.'''
+    return using(shard_for_user(user_id))
+
+
+def atomic():
+    '''Return a transaction on the shard the current block is routed to.'''
+    return transaction.atomic(using=current_shard.get() or PRIMARY_DATABASE)
+
+
+def shard_index(alias):
+    '''Return the position of a shard; the primary is 0.'''
+    if alias == PRIMARY_DATABASE:
+        return 0
+    return settings.DATABASE_SHARDS.index(alias) + 1
+
+
+def reserve_id_range(alias):
+    '''Start the id sequences of a shard at the beginning of its range.'''
+    start = shard_index(alias) * ID_RANGE_SIZE
+    if start == 0:
+        return
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for table in ID_RANGE_TABLES:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT setval(pg_get_serial_sequence(%s, %s), %s, false) '
+                    'WHERE NOT EXISTS (SELECT 1 FROM {} WHERE id >= %s)'.format(
+                        connection.ops.quote_name(table),
+                    ),
+                    [table, 'id', start + 1, start],
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+                elif row[0] < start:
+                    cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [start, table])
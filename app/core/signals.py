@@ -0,0 +1,21 @@
+'''
+Signal handlers keeping sharded recipe data in step with its users.
+'''
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from core.models import Recipe, RecipeRevision
+
+
+# Deleting a user only cascades on the user's own database, and the foreign
+# keys to users have no constraints to catch rows left on the shards
+@receiver(pre_delete, sender=get_user_model())
+def delete_sharded_recipes(sender, instance, using, **kwargs):
+    for alias in settings.RECIPE_SHARDS:
+        if alias == using:
+            continue
+        # Cascades to the recipes' vectors, signatures and revisions
+        Recipe.all_objects.using(alias).filter(user_id=instance.pk).delete()
+        RecipeRevision.objects.using(alias).filter(user_id=instance.pk).update(user=None)
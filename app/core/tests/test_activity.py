@@ -0,0 +1,94 @@
+'''
+Tests for buffered activity tracking.
+'''
+import os
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.activity import ActivityBuffer
+
+ME_URL = reverse('user:me')
+
+
+@override_settings(ACTIVITY_FLUSH_INTERVAL=3600, ACTIVITY_BUFFER_MAX_SIZE=100)
+class ActivityBufferTests(TestCase):
+    '''Test collecting and flushing activity.'''
+
+    def setUp(self):
+        self.buffer = ActivityBuffer()
+        self.buffer._pid = os.getpid()  # Pretend the flush thread is running
+        self.users = [
+            get_user_model().objects.create_user(f'user{i}@example.com', 'pass1234')
+            for i in range(3)
+        ]
+
+    def test_flush_writes_latest_time_per_user(self):
+        '''Test one flush stores the newest timestamp for each user.'''
+        now = timezone.now()
+        self.buffer.record(self.users[0].pk, now - timedelta(minutes=5))
+        self.buffer.record(self.users[0].pk, now)
+        self.buffer.record(self.users[1].pk, now - timedelta(minutes=1))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 2)
+
+        for user in self.users:
+            user.refresh_from_db()
+        self.assertEqual(self.users[0].last_login, now)
+        self.assertEqual(self.users[1].last_login, now - timedelta(minutes=1))
+        self.assertIsNone(self.users[2].last_login)
+
+    def test_nothing_written_until_due(self):
+        '''Test recording alone doesn't touch the database.'''
+        with self.assertNumQueries(0):
+            self.buffer.record(self.users[0].pk)
+
+    @override_settings(ACTIVITY_BUFFER_MAX_SIZE=2)
+    def test_flush_thread_woken_when_full(self):
+        '''Test a full buffer wakes the flush thread instead of writing on the request.'''
+        self.buffer.record(self.users[0].pk)
+        self.assertFalse(self.buffer._wake.is_set())
+
+        with self.assertNumQueries(0):
+            self.buffer.record(self.users[1].pk)
+
+        self.assertTrue(self.buffer._wake.is_set())
+
+    @override_settings(ACTIVITY_FLUSH_INTERVAL=0)
+    def test_zero_interval_writes_through(self):
+        '''Test an interval of 0 writes on every record.'''
+        self.buffer.record(self.users[0].pk)
+
+        self.users[0].refresh_from_db()
+        self.assertIsNotNone(self.users[0].last_login)
+
+    def test_older_time_does_not_overwrite(self):
+        '''Test a stale flush never moves last_login backwards.'''
+        now = timezone.now()
+        get_user_model().objects.filter(pk=self.users[0].pk).update(last_login=now)
+
+        self.buffer.record(self.users[0].pk, now - timedelta(hours=1))
+        self.buffer.flush()
+
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].last_login, now)
+
+
+class ActivityMiddlewareTests(TestCase):
+    '''Test authenticated requests are recorded.'''
+
+    def test_request_updates_last_login(self):
+        '''Test an API call marks the user as seen.'''
+        user = get_user_model().objects.create_user('user@example.com', 'pass1234')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        client.get(ME_URL)
+
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
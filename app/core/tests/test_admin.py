@@ -5,23 +5,29 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client
+from decimal import Decimal
+
+from core import models
 
 class AdminSiteTests(TestCase):
     '''Tests for Django admin.'''
-    def setUp(self):
-        '''Create user and client.'''
-        self.client = Client()
-        self.admin_user=get_user_model().objects.create_superuser(
+    @classmethod
+    def setUpTestData(cls):
+        '''Create users once for the whole class.'''
+        cls.admin_user=get_user_model().objects.create_superuser(
             email='admin@example.com',
             password='testpass123',
         )
-
-        self.client.force_login(self.admin_user) #every request is through this user
-        self.user=get_user_model().objects.create_user(
+        cls.user=get_user_model().objects.create_user(
             email='user@example.com',
             password='testpass123',
             name='Test User',
         )
+
+    def setUp(self):
+        '''Create client.'''
+        self.client = Client()
+        self.client.force_login(self.admin_user) #every request is through this user
     def test_users_list(self):
         '''Test that users are listed on page'''
         url = reverse('admin:core_user_changelist')
@@ -43,4 +49,81 @@ class AdminSiteTests(TestCase):
 
         self.assertEqual(res.status_code,200)
 
+    def test_users_list_shows_recipe_count(self):
+        '''Test the changelist annotates users with recipe counts.'''
+        for title in ['First', 'Second']:
+            models.Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=5,
+                price=Decimal('1.00'),
+            )
+        url = reverse('admin:core_user_changelist')
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        counts = {
+            user.email: user.recipe_count
+            for user in res.context['cl'].result_list
+        }
+        self.assertEqual(counts[self.user.email], 2)
+        self.assertEqual(counts[self.admin_user.email], 0)
+
+    def test_users_search(self):
+        '''Test searching users by name.'''
+        url = reverse('admin:core_user_changelist')
+        res = self.client.get(url, {'q': 'test user'})
+
+        self.assertEqual(list(res.context['cl'].result_list), [self.user])
+
+    def test_recipe_user_autocomplete(self):
+        '''Test the recipe admin selects users through autocomplete.'''
+        url = reverse('admin:autocomplete')
+        res = self.client.get(url, {
+            'term': 'user@',
+            'app_label': 'core',
+            'model_name': 'recipe',
+            'field_name': 'user',
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, self.user.email)
 
+    def test_export_users_csv(self):
+        '''Test exporting all filtered users streams a CSV.'''
+        url = reverse('admin:core_user_changelist')
+        res = self.client.post(url, {
+            'action': 'export_csv',
+            'select_across': '1',
+            '_selected_action': [self.user.id],
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,email,name,is_active,is_staff,last_login')
+        self.assertEqual(len(lines), 3)
+        self.assertIn(self.user.email, lines[2])
+
+    def test_export_selected_recipes_csv(self):
+        '''Test exporting only the selected recipes.'''
+        recipes = [
+            models.Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=5,
+                price=Decimal('1.50'),
+            )
+            for title in ['Kept', 'Skipped']
+        ]
+        url = reverse('admin:core_recipe_changelist')
+        res = self.client.post(url, {
+            'action': 'export_csv',
+            '_selected_action': [recipes[0].id],
+        })
+
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(
+            lines[1], f'{recipes[0].id},{self.user.email},Kept,5,1.50,',
+        )
@@ -3,12 +3,20 @@ test custom django management commands.
 '''
 
 
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+
+from django.contrib.auth import get_user_model
+
+from core.management.commands.profile_startup import parse_importtime
+from core.models import Recipe
 
 @patch('core.management.commands.wait_for_db.Command.check')
 class CommandTests(SimpleTestCase):
@@ -29,4 +37,116 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
 
         self.assertEqual(patched_check.call_count,6)
-        patched_check.assert_called_with(databases=['default'])
\ No newline at end of file
+        patched_check.assert_called_with(databases=['default'])
+
+    @patch('time.sleep')
+    def test_wait_for_db_backoff_capped(self, patched_sleep, patched_check):
+        '''Test waits grow exponentially but never exceed the max delay'''
+        patched_check.side_effect = [OperationalError] * 6 + [True]
+
+        call_command('wait_for_db', initial_delay=0.5, max_delay=2)
+
+        waits = [call.args[0] for call in patched_sleep.call_args_list]
+        self.assertEqual(len(waits), 6)
+        # Jitter keeps each wait within the upper half of the backoff step
+        for wait, step in zip(waits, [0.5, 1, 2, 2, 2, 2]):
+            self.assertGreaterEqual(wait, step / 2)
+            self.assertLessEqual(wait, step)
+
+    @patch('time.sleep')
+    def test_wait_for_db_timeout(self, patched_sleep, patched_check):
+        '''Test the command gives up once the timeout has passed'''
+        patched_check.side_effect = OperationalError
+
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', timeout=0)
+
+        patched_sleep.assert_not_called()
+
+    def test_wait_for_multiple_databases(self, patched_check):
+        '''Test every requested alias is checked'''
+        patched_check.return_value = True
+
+        call_command('wait_for_db', databases=['default', 'replica'])
+
+        self.assertEqual(patched_check.call_count, 2)
+        patched_check.assert_any_call(databases=['default'])
+        patched_check.assert_any_call(databases=['replica'])
+
+    @patch('time.sleep')
+    def test_wait_for_db_retries_only_unavailable(self, patched_sleep, patched_check):
+        '''Test aliases that are up are not checked again'''
+        def check(databases):
+            if databases == ['replica'] and patched_check.call_count < 4:
+                raise OperationalError
+            return True
+        patched_check.side_effect = check
+
+        call_command('wait_for_db', databases=['default', 'replica'])
+
+        checked = [call.kwargs['databases'] for call in patched_check.call_args_list]
+        self.assertEqual(checked.count(['default']), 1)
+        self.assertEqual(checked.count(['replica']), 3)
+
+    def test_wait_for_cache(self, patched_check):
+        '''Test a cache alias can be waited on alongside the database'''
+        patched_check.return_value = True
+
+        call_command('wait_for_db', caches=['default'])
+
+        patched_check.assert_called_once_with(databases=['default'])
+
+
+class ProfileStartupTests(SimpleTestCase):
+    '''Test the startup profiling helpers.'''
+
+    def test_parse_importtime(self):
+        '''Test import self times are summed per top-level package.'''
+        lines = [
+            'import time: self [us] | cumulative | imported package',
+            'import time:       500 |        500 |   django.utils',
+            'import time:      1500 |       2000 | django',
+            'import time:       250 |        250 | yaml',
+            'not an import line',
+        ]
+
+        totals = parse_importtime(lines)
+
+        self.assertAlmostEqual(totals['django'], 0.002)
+        self.assertAlmostEqual(totals['yaml'], 0.00025)
+
+
+@patch('time.sleep')
+class PurgeDeletedTests(TestCase):
+    '''Test purging soft-deleted rows.'''
+
+    def create_recipe(self, user):
+        return Recipe.objects.create(
+            user=user, title='Recipe', time_minutes=5, price=Decimal('1.00'),
+        )
+
+    def test_purge_deleted(self, patched_sleep):
+        '''Test soft-deleted users and recipes are removed in batches'''
+        keep = get_user_model().objects.create_user('keep@example.com', 'pass1234')
+        gone = get_user_model().objects.create_user('gone@example.com', 'pass1234')
+        kept_recipe = self.create_recipe(keep)
+        self.create_recipe(keep).soft_delete()
+        for _ in range(3):
+            self.create_recipe(gone)
+        gone.soft_delete()
+
+        out = StringIO()
+        call_command('purge_deleted', batch_size=2, stdout=out)
+
+        self.assertEqual(list(Recipe.all_objects.all()), [kept_recipe])
+        self.assertFalse(get_user_model().all_objects.filter(pk=gone.pk).exists())
+        self.assertIn('Purged 4 recipes and 1 users', out.getvalue())
+
+    def test_purge_respects_grace_period(self, patched_sleep):
+        '''Test recently deleted rows are kept with --older-than'''
+        user = get_user_model().objects.create_user('user@example.com', 'pass1234')
+        self.create_recipe(user).soft_delete()
+
+        call_command('purge_deleted', older_than=1, stdout=StringIO())
+
+        self.assertEqual(Recipe.all_objects.count(), 1)
@@ -0,0 +1,186 @@
+'''
+Tests for adaptive concurrency limits.
+'''
+import threading
+from unittest.mock import patch
+
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import resolve, reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import concurrency
+from core.concurrency import Limiter
+from core.middleware import ConcurrencyLimitMiddleware
+
+RECIPES_URL = reverse('recipe:recipe-list')
+ME_URL = reverse('user:me')
+
+
+class LimiterTests(SimpleTestCase):
+    '''Test slots, the wait queue and limit adjustment.'''
+
+    def test_rejects_when_full_without_queue(self):
+        '''Test requests beyond the limit are refused at once.'''
+        limiter = Limiter('test', limit=2)
+
+        self.assertTrue(limiter.acquire())
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+
+        limiter.release(0)
+        self.assertTrue(limiter.acquire())
+
+    def test_queued_request_gets_freed_slot(self):
+        '''Test a waiting request runs once a slot is released.'''
+        limiter = Limiter('test', limit=1, queue_size=1, max_wait=5)
+        limiter.acquire()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(limiter.acquire()))
+        waiter.start()
+        while not limiter.waiting:
+            pass
+
+        self.assertFalse(limiter.acquire())  # The queue is full
+        limiter.release(0)
+        waiter.join(5)
+
+        self.assertEqual(results, [True])
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_queue_wait_times_out(self):
+        '''Test a queued request gives up after max_wait.'''
+        limiter = Limiter('test', limit=1, queue_size=1, max_wait=0.01)
+        limiter.acquire()
+
+        self.assertFalse(limiter.acquire())
+        self.assertEqual(limiter.waiting, 0)
+
+    def test_slow_requests_decrease_limit(self):
+        '''Test a slow request cuts the limit once per target interval.'''
+        limiter = Limiter('test', limit=10, min_limit=2, latency_target=60)
+        for _ in range(3):
+            limiter.acquire()
+
+        limiter.release(61)
+        limiter.release(61)  # Same interval, no further cut
+
+        self.assertAlmostEqual(limiter.limit, 9)
+
+    def test_limit_floor(self):
+        '''Test the limit never drops below min_limit.'''
+        limiter = Limiter('test', limit=2, min_limit=2, latency_target=0)
+        limiter.acquire()
+        limiter.release(1)
+
+        self.assertEqual(limiter.limit, 2)
+
+    def test_fast_requests_increase_limit_when_saturated(self):
+        '''Test the limit grows only while every slot is in use.'''
+        limiter = Limiter('test', limit=2, max_limit=4, latency_target=1)
+        limiter.acquire()
+        limiter.release(0)
+        self.assertEqual(limiter.limit, 2)  # Had a spare slot
+
+        limiter.acquire()
+        limiter.acquire()
+        limiter.release(0)
+
+        self.assertAlmostEqual(limiter.limit, 2.5)
+
+    def test_route_groups(self):
+        '''Test routes map to the first matching group or the default.'''
+        with patch.object(concurrency, '_limiters', {
+            'expensive': Limiter('expensive', 1, routes=['GET recipe:recipe-list', 'admin:*_changelist']),
+            'default': Limiter('default', 1),
+        }):
+            self.assertEqual(concurrency.limiter_for('recipe:recipe-list', 'GET').name, 'expensive')
+            self.assertEqual(concurrency.limiter_for('recipe:recipe-list', 'POST').name, 'default')
+            self.assertEqual(concurrency.limiter_for('admin:core_recipe_changelist', 'POST').name, 'expensive')
+            self.assertEqual(concurrency.limiter_for('user:me', 'GET').name, 'default')
+
+
+class ConcurrencyLimitMiddlewareTests(TestCase):
+    '''Test requests are shed by route group.'''
+
+    def setUp(self):
+        concurrency.reset()
+        self.addCleanup(concurrency.reset)
+        user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def test_expensive_route_shed_first(self):
+        '''Test a full expensive group gets a 503 while /me still works.'''
+        limiter = concurrency.get_limiters()['expensive']
+        while limiter.acquire():
+            pass
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], str(limiter.retry_after))
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+    def test_create_not_shed_with_list(self):
+        '''Test creating a recipe isn't limited like listing them.'''
+        limiter = concurrency.get_limiters()['expensive']
+        while limiter.acquire():
+            pass
+
+        res = self.client.post(RECIPES_URL, {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_slot_released(self):
+        '''Test a finished request gives its slot back.'''
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(concurrency.get_limiters()['expensive'].in_flight, 0)
+
+    def test_streaming_response_holds_slot(self):
+        '''Test a streamed response keeps its slot until the server closes it.'''
+        request = RequestFactory().get(RECIPES_URL)
+        request.resolver_match = resolve(RECIPES_URL)
+
+        def view(request):
+            middleware.process_view(request, view, (), {})
+            return StreamingHttpResponse(iter([b'a', b'b']))
+
+        middleware = ConcurrencyLimitMiddleware(view)
+        limiter = concurrency.get_limiters()['expensive']
+
+        response = middleware(request)
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+        self.assertEqual(limiter.in_flight, 1)
+        response.close()
+
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_asgi_requests_not_limited(self):
+        '''Test ASGI requests skip the limiter rather than wait on the worker's only sync thread.'''
+        limiter = concurrency.get_limiters()['expensive']
+        while limiter.acquire():
+            pass
+        # As the test client does, so the test database stays open
+        request_started.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        communicator = ApplicationCommunicator(get_asgi_application(), {
+            'type': 'http',
+            'method': 'GET',
+            'path': RECIPES_URL,
+            'query_string': b'',
+            'headers': [(b'host', b'testserver')],
+        })
+
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(5)
+
+        self.assertEqual(start['status'], status.HTTP_401_UNAUTHORIZED)  # Reached the view
+        self.assertEqual(limiter.in_flight, int(limiter.limit))
@@ -0,0 +1,111 @@
+'''
+Tests for the background job queue.
+'''
+import os
+import signal
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+calls = []
+
+
+@jobs.task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.task('tests.terminate')
+def terminate():
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+@jobs.task('tests.fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    '''Test queueing and running jobs.'''
+
+    def setUp(self):
+        calls.clear()
+
+    def test_run_pending(self):
+        '''Test due jobs run and are removed.'''
+        jobs.enqueue('tests.record', value=1)
+        jobs.enqueue('tests.record', value=2)
+
+        count = jobs.run_pending(batch_size=1)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertFalse(Job.objects.exists())
+
+    def test_delayed_job_not_run(self):
+        '''Test a job is not run before its time.'''
+        jobs.enqueue('tests.record', delay=60, value=1)
+
+        self.assertEqual(jobs.run_pending(), 0)
+        self.assertEqual(calls, [])
+
+    def test_failed_job_retried_later(self):
+        '''Test a failing job is rescheduled with backoff.'''
+        job = jobs.enqueue('tests.fail')
+
+        jobs.run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+    def test_job_fails_after_max_attempts(self):
+        '''Test a job stops retrying after its last attempt.'''
+        job = jobs.enqueue('tests.fail', max_attempts=1)
+
+        jobs.run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+
+    def test_stale_running_job_reclaimed(self):
+        '''Test jobs claimed by a crashed worker are picked up again.'''
+        job = jobs.enqueue('tests.record', value=1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.STATUS_RUNNING,
+            locked_at=timezone.now() - timedelta(days=1),
+        )
+
+        jobs.run_pending()
+
+        self.assertEqual(calls, [1])
+
+    def test_run_jobs_command(self):
+        '''Test the worker command drains the queue with --once.'''
+        jobs.enqueue('tests.record', value='a')
+        out = StringIO()
+
+        call_command('run_jobs', threads=1, once=True, stdout=out)
+
+        self.assertEqual(calls, ['a'])
+        self.assertIn('Processed 1 jobs', out.getvalue())
+
+    def test_run_jobs_stops_on_sigterm(self):
+        '''Test a single-threaded worker finishes its batch and exits on SIGTERM.'''
+        jobs.enqueue('tests.terminate')
+        jobs.enqueue('tests.record', value='b')
+        handler = signal.getsignal(signal.SIGTERM)
+
+        call_command('run_jobs', threads=1, batch_size=10, stdout=StringIO())
+
+        self.assertEqual(calls, ['b'])
+        self.assertFalse(Job.objects.exists())
+        self.assertIs(signal.getsignal(signal.SIGTERM), handler)  # Restored on exit
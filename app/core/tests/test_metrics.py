@@ -0,0 +1,161 @@
+'''
+Tests for request metrics.
+'''
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.metrics import MmapStore, read_file
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+class MetricsDirMixin:
+    '''Give each test an empty metrics directory.'''
+
+    def setUp(self):
+        super().setUp()
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        settings_override = override_settings(METRICS_DIR=self.metrics_dir, METRICS_TOKEN='secret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+def increment_in_child():
+    metrics.inc('http_requests_total', (('route', 'r'), ('method', 'GET'), ('status', '200')), 2)
+
+
+class MmapStoreTests(MetricsDirMixin, SimpleTestCase):
+    '''Test the per-process memory-mapped store.'''
+
+    def test_values_survive_reopen(self):
+        '''Test a store reopened from its file keeps its values.'''
+        path = os.path.join(self.metrics_dir, '1.db')
+        store = MmapStore(path)
+        store.inc('a', 2)
+        store.inc('b', 0.5)
+        store.inc('a', 1)
+        store.close()
+
+        store = MmapStore(path)
+        store.inc('b', 1)
+        store.close()
+
+        self.assertEqual(dict(read_file(path)), {'a': 3.0, 'b': 1.5})
+
+    def test_grows_past_initial_size(self):
+        '''Test the file grows when the keys outgrow it.'''
+        path = os.path.join(self.metrics_dir, '1.db')
+        store = MmapStore(path)
+        for i in range(5000):
+            store.inc(f'key-{i:05d}')
+        store.close()
+
+        samples = dict(read_file(path))
+        self.assertEqual(len(samples), 5000)
+        self.assertEqual(samples['key-04999'], 1.0)
+
+    def test_processes_are_summed(self):
+        '''Test samples written by another process are aggregated.'''
+        increment_in_child()
+        child = multiprocessing.get_context('fork').Process(target=increment_in_child)
+        child.start()
+        child.join()
+
+        self.assertEqual(len(os.listdir(self.metrics_dir)), 2)
+        totals = metrics.collect()
+        key = ('http_requests_total', (('route', 'r'), ('method', 'GET'), ('status', '200')))
+        self.assertEqual(totals[key], 4)
+
+    def test_histogram_rendered_cumulative(self):
+        '''Test buckets are rendered cumulatively with sum and count.'''
+        labels = (('route', 'r'), ('method', 'GET'))
+        for value in (0.003, 0.02, 0.02, 30):
+            metrics.observe('http_request_duration_seconds', labels, value)
+
+        text = metrics.render()
+
+        self.assertIn('http_request_duration_seconds_bucket{route="r",method="GET",le="0.005"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",method="GET",le="0.025"} 3', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",method="GET",le="10.0"} 3', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",method="GET",le="+Inf"} 4', text)
+        self.assertIn('http_request_duration_seconds_count{route="r",method="GET"} 4', text)
+
+
+class MetricsApiTests(MetricsDirMixin, TestCase):
+    '''Test requests are measured and the endpoint is protected.'''
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user('user@example.com', 'pass1234')
+        self.client = APIClient()
+
+    def test_requests_recorded_by_route(self):
+        '''Test counts, latency and queries are labelled by URL name.'''
+        self.client.force_authenticate(self.user)
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+        self.client.force_authenticate(None)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        text = res.content.decode()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(
+            'http_requests_total{route="recipe:recipe-list",method="GET",status="200"} 2', text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{route="recipe:recipe-list",method="GET"} 2', text,
+        )
+        self.assertIn('http_request_db_queries_total{route="recipe:recipe-list",method="GET"}', text)
+
+    def test_unknown_methods_share_a_label(self):
+        '''Test arbitrary methods don't each add new series.'''
+        self.client.generic('FOO1', RECIPES_URL)
+        self.client.generic('FOO2', RECIPES_URL)
+
+        text = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+        self.assertIn('http_requests_total{route="recipe:recipe-list",method="other",status="401"} 2', text)
+        self.assertNotIn('FOO', text)
+
+    def test_unwritable_metrics_dir(self):
+        '''Test requests are served, and the failure logged once, when metrics can't be written.'''
+        blocker = os.path.join(self.metrics_dir, 'file')
+        open(blocker, 'w').close()
+        self.client.force_authenticate(self.user)
+
+        with override_settings(METRICS_DIR=os.path.join(blocker, 'metrics')), \
+                patch.object(metrics, '_failure_logged', False), \
+                self.assertLogs('core.metrics', 'ERROR') as logs:
+            first = self.client.get(RECIPES_URL)
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(logs.records), 1)
+
+    def test_token_required(self):
+        '''Test the endpoint rejects missing or wrong tokens.'''
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(res.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_disabled_without_token(self):
+        '''Test the endpoint does not exist until a token is configured.'''
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer ')
+
+        self.assertEqual(res.status_code, 404)
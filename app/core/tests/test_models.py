@@ -59,4 +59,35 @@ class ModelTests(TestCase):
             description='Sample receipe description.',
         )
 
-        self.assertEqual(str(recipe), recipe.title)
\ No newline at end of file
+        self.assertEqual(str(recipe), recipe.title)
+
+    def test_soft_delete_recipe(self):
+        """Test soft-deleted recipes are hidden but kept."""
+        user = get_user_model().objects.create_user(
+            'test@example.com',
+            'testpass123',
+        )
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Sample recipe name',
+            time_minutes=5,
+            price=Decimal('5.50'),
+        )
+
+        recipe.soft_delete()
+
+        self.assertFalse(models.Recipe.objects.filter(pk=recipe.pk).exists())
+        self.assertTrue(models.Recipe.all_objects.filter(pk=recipe.pk).exists())
+
+    def test_soft_delete_user(self):
+        """Test soft-deleted users are hidden and deactivated."""
+        user = get_user_model().objects.create_user(
+            'test@example.com',
+            'testpass123',
+        )
+
+        user.soft_delete()
+
+        self.assertFalse(get_user_model().objects.filter(pk=user.pk).exists())
+        user = get_user_model().all_objects.get(pk=user.pk)
+        self.assertFalse(user.is_active)
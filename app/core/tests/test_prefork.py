@@ -0,0 +1,95 @@
+'''
+Tests for the pre-forking server helpers.
+'''
+import gc
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core import prefork
+
+
+class SizingTests(SimpleTestCase):
+    '''Test workers and threads are sized from CPUs and memory.'''
+
+    @override_settings(SERVER_WORKERS=0, SERVER_THREADS=0, SERVER_WORKER_MEMORY=100)
+    def test_sized_by_cpu(self):
+        '''Test plenty of memory gives 2 * CPUs + 1 workers.'''
+        self.assertEqual(prefork.sizing(cpus=4, memory=10_000), (9, prefork.DEFAULT_THREADS))
+
+    @override_settings(SERVER_WORKERS=0, SERVER_THREADS=0, SERVER_WORKER_MEMORY=100)
+    def test_memory_limits_workers(self):
+        '''Test fewer workers fit in less memory and get more threads each.'''
+        workers, threads = prefork.sizing(cpus=4, memory=300)
+
+        self.assertEqual(workers, 3)
+        self.assertEqual(threads, 12)
+
+    @override_settings(SERVER_WORKERS=0, SERVER_THREADS=0, SERVER_WORKER_MEMORY=100)
+    def test_at_least_one_worker(self):
+        '''Test a tiny container still gets a worker.'''
+        self.assertEqual(prefork.sizing(cpus=1, memory=10)[0], 1)
+
+    @override_settings(SERVER_WORKERS=2, SERVER_THREADS=8)
+    def test_settings_override(self):
+        '''Test explicit settings win.'''
+        self.assertEqual(prefork.sizing(cpus=16, memory=2 ** 40), (2, 8))
+
+    @override_settings(SERVER_WORKERS=0, SERVER_THREADS=0, SERVER_WORKER_MEMORY=100)
+    def test_asgi_workers(self):
+        '''Test uvicorn workers are sized by CPUs and memory alone.'''
+        with patch('core.caching.is_shared', return_value=True):
+            self.assertEqual(prefork.asgi_workers(cpus=4, memory=10_000), 9)
+            self.assertEqual(prefork.asgi_workers(cpus=4, memory=300), 3)
+
+    @override_settings(SERVER_WORKERS=0, EVENTS_BROKER='core.events.LocalBroker')
+    def test_one_asgi_worker_without_shared_broker(self):
+        '''Test the feed's process-local broker keeps ASGI to one worker by default.'''
+        self.assertEqual(prefork.asgi_workers(cpus=4, memory=10_000), 1)
+
+    @override_settings(SERVER_WORKERS=4, EVENTS_BROKER='core.events.LocalBroker')
+    def test_explicit_asgi_workers_without_shared_broker(self):
+        '''Test an explicit worker count is honoured, with a warning about the feed.'''
+        with self.assertLogs('core.prefork', 'WARNING'):
+            self.assertEqual(prefork.asgi_workers(cpus=4, memory=10_000), 4)
+        out = StringIO()
+        with self.assertLogs('core.prefork', 'WARNING'):
+            call_command('serve', asgi=True, workers=8, check=True, stdout=out)
+        self.assertIn('Uvicorn workers: 8', out.getvalue())
+
+
+class PreloadTests(SimpleTestCase):
+    '''Test warming up and freezing the master process.'''
+
+    def test_warm_up_and_freeze(self):
+        '''Test the app warms up and its objects leave the collector's reach.'''
+        prefork.warm_up()
+        prefork.freeze()
+        try:
+            self.assertGreater(gc.get_freeze_count(), 0)
+        finally:
+            gc.unfreeze()
+
+    def test_clear_metrics(self):
+        '''Test old metrics files are removed on start.'''
+        directory = os.path.join(tempfile.mkdtemp(), 'metrics')
+        os.makedirs(directory)
+        open(os.path.join(directory, '123.db'), 'wb').close()
+
+        with override_settings(METRICS_DIR=directory):
+            prefork.clear_metrics()
+
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_clear_metrics_unwritable(self):
+        '''Test the server still starts when the metrics directory can't be made.'''
+        blocker = os.path.join(tempfile.mkdtemp(), 'file')
+        open(blocker, 'w').close()
+
+        with override_settings(METRICS_DIR=os.path.join(blocker, 'metrics')), \
+                self.assertLogs('core.prefork', 'ERROR'):
+            prefork.clear_metrics()
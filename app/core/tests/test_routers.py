@@ -0,0 +1,168 @@
+'''
+Tests for database routing.
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.middleware import ReplicaPinningMiddleware
+from core.models import Recipe
+from core.routers import PrimaryReplicaRouter, pinned_to_primary, wrote_to_primary
+from user import cache as user_cache
+from user import tokens
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    '''Test routing reads and writes.'''
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.tokens = [pinned_to_primary.set(False), wrote_to_primary.set(False)]
+
+    def tearDown(self):
+        pinned_to_primary.reset(self.tokens[0])
+        wrote_to_primary.reset(self.tokens[1])
+
+    def test_reads_go_to_replica(self):
+        '''Test safe reads are sent to a replica.'''
+        self.assertEqual(self.router.db_for_read(Recipe), 'replica')
+
+    def test_writes_go_to_primary(self):
+        '''Test writes go to the primary and pin later reads there.'''
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_pinned_reads_go_to_primary(self):
+        '''Test pinned reads go to the primary.'''
+        pinned_to_primary.set(True)
+
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        '''Test everything goes to the primary without replicas.'''
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_no_migrations_on_replicas(self):
+        '''Test replicas are not migrated.'''
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaPinningMiddlewareTests(SimpleTestCase):
+    '''Test read-your-writes pinning per user.'''
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+        self.reads = []
+        self.tokens = [pinned_to_primary.set(False), wrote_to_primary.set(False)]
+        cache.clear()
+
+    def tearDown(self):
+        pinned_to_primary.reset(self.tokens[0])
+        wrote_to_primary.reset(self.tokens[1])
+
+    def write_view(self, request):
+        self.router.db_for_write(Recipe)
+        return HttpResponse()
+
+    def read_view(self, request):
+        self.reads.append(self.router.db_for_read(Recipe))
+        return HttpResponse()
+
+    def bearer(self, user_id):
+        user = get_user_model()(pk=user_id, token_version=0)
+        return f'Bearer {tokens.issue(user, tokens.ACCESS)}'
+
+    def get(self, user_id):
+        middleware = ReplicaPinningMiddleware(self.read_view)
+        middleware(self.factory.get('/', HTTP_AUTHORIZATION=self.bearer(user_id)))
+        return self.reads[-1]
+
+    def test_unsafe_requests_read_primary(self):
+        '''Test reads during a POST go to the primary.'''
+        middleware = ReplicaPinningMiddleware(self.read_view)
+
+        middleware(self.factory.post('/'))
+
+        self.assertEqual(self.reads, ['default'])
+
+    def test_reads_pinned_after_write(self):
+        '''Test a user who wrote reads from the primary with any of their tokens.'''
+        middleware = ReplicaPinningMiddleware(self.write_view)
+        middleware(self.factory.post('/', HTTP_AUTHORIZATION=self.bearer(1)))
+
+        self.assertEqual(self.get(1), 'default')  # A freshly issued token of the same user
+        self.assertEqual(self.get(2), 'replica')
+
+    def test_state_reset_after_request(self):
+        '''Test pinning does not leak out of the request.'''
+        middleware = ReplicaPinningMiddleware(self.write_view)
+        middleware(self.factory.post('/'))
+
+        self.assertFalse(pinned_to_primary.get())
+        self.assertFalse(wrote_to_primary.get())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReadYourWritesTests(TestCase):
+    '''Test against a separate replica database that never catches up.'''
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        user_cache.local.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+
+    def signed_client(self):
+        '''Return a client with a newly issued signed token, like another device.'''
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens.issue(self.user, tokens.ACCESS)}')
+        return client
+
+    def test_created_recipe_visible_to_writer(self):
+        '''Test a new recipe is listed on every device of the user who created it.'''
+        writer = APIClient()
+        writer.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        writer.post(RECIPES_URL, {
+            'title': 'Fresh recipe',
+            'time_minutes': 10,
+            'price': Decimal('2.50'),
+        })
+
+        for client in (writer, self.signed_client()):
+            res = client.get(RECIPES_URL)
+            self.assertEqual([recipe['title'] for recipe in res.data], ['Fresh recipe'])
+        # Once the pin expires, reads go to the (lagging) replica
+        cache.clear()
+        res = writer.get(RECIPES_URL)
+        self.assertEqual(res.data, [])
+
+    def test_new_token_authenticates(self):
+        '''Test a token created on the primary works while the replica lags.'''
+        res = APIClient().post(reverse('user:token'), {
+            'email': 'user@example.com',
+            'password': 'testpass123',
+        })
+        cache.clear()  # No pin either: the token view has no authenticated user
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {res.data['token']}")
+        res = client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, 200)
@@ -0,0 +1,77 @@
+'''
+Tests for the cached OpenAPI schema.
+'''
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class SchemaTests(SimpleTestCase):
+    '''Test serving and building the schema.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.schema_file = Path(self.tmpdir.name) / 'openapi.yml'
+        self.settings_override = override_settings(
+            OPENAPI_SCHEMA_FILE=self.schema_file,
+        )
+        self.settings_override.enable()
+        schema.reset_schema_document()
+
+    def tearDown(self):
+        schema.reset_schema_document()
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def test_schema_generated_without_file(self):
+        '''Test the schema is generated when no prebuilt file exists.'''
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], schema.SCHEMA_CONTENT_TYPE)
+        self.assertIn(b'openapi:', res.content)
+        self.assertIn('max-age', res['Cache-Control'])
+
+    def test_schema_served_from_file(self):
+        '''Test a prebuilt schema file is served as is.'''
+        self.schema_file.write_bytes(b'openapi: 3.0.3\n')
+
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.content, b'openapi: 3.0.3\n')
+
+    def test_schema_not_modified(self):
+        '''Test a matching If-None-Match returns 304.'''
+        etag = self.client.get(SCHEMA_URL)['ETag']
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_schema_as_json(self):
+        '''Test JSON is served for ?format=json and a JSON Accept header, with its own ETag.'''
+        yaml_etag = self.client.get(SCHEMA_URL)['ETag']
+
+        for res in (
+            self.client.get(SCHEMA_URL, {'format': 'json'}),
+            self.client.get(SCHEMA_URL, HTTP_ACCEPT='application/json'),
+        ):
+            self.assertEqual(res['Content-Type'], schema.JSON_SCHEMA_CONTENT_TYPE)
+            self.assertIn('openapi', json.loads(res.content))
+            self.assertNotEqual(res['ETag'], yaml_etag)
+            self.assertIn('Accept', res['Vary'])
+
+    def test_build_schema_command(self):
+        '''Test the command writes the schema file.'''
+        call_command('build_schema', stdout=StringIO())
+
+        self.assertIn(b'/api/recipe/recipes/', self.schema_file.read_bytes())
@@ -0,0 +1,166 @@
+'''
+Tests for sharding recipe data by user.
+'''
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import jobs, sharding
+from core.models import Recipe, RecipeRevision, RecipeSignature, RecipeVector
+from recipe import history
+
+RECIPES_URL = reverse('recipe:recipe-list')
+SHARDS = ['default', 'shard_1']
+
+
+def create_user_on(shard):
+    '''Create users until one hashes to `shard`.'''
+    index = 0
+    while True:
+        user = get_user_model().objects.create_user(f'{shard}-{index}@example.com', 'pass1234')
+        if sharding.shard_for_user(user.pk) == shard:
+            return user
+        index += 1
+
+
+@override_settings(RECIPE_SHARDS=SHARDS)
+class ShardPlacementTests(SimpleTestCase):
+    '''Test users are spread over the shards by a stable hash.'''
+
+    def test_users_spread_evenly(self):
+        '''Test both shards get a fair share of users.'''
+        on_shard = sum(sharding.shard_for_user(user_id) == 'shard_1' for user_id in range(2000))
+
+        self.assertGreater(on_shard, 850)
+        self.assertLess(on_shard, 1150)
+
+    def test_adding_shard_only_moves_users_to_it(self):
+        '''Test a new shard takes users without reshuffling the others.'''
+        before = {user_id: sharding.shard_for_user(user_id) for user_id in range(2000)}
+
+        with self.settings(RECIPE_SHARDS=[*SHARDS, 'shard_2']):
+            after = {user_id: sharding.shard_for_user(user_id) for user_id in range(2000)}
+
+        moved = [user_id for user_id in before if before[user_id] != after[user_id]]
+        self.assertTrue(moved)
+        self.assertTrue(all(after[user_id] == 'shard_2' for user_id in moved))
+
+
+@override_settings(RECIPE_SHARDS=SHARDS)
+class ShardedApiTests(TestCase):
+    '''Test the recipe API reads and writes the user's shard.'''
+
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        self.user = create_user_on('shard_1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_writes_to_user_shard(self):
+        '''Test a new recipe and its related rows land on the user's shard.'''
+        res = self.client.post(RECIPES_URL, {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'})
+        jobs.autodiscover()
+        jobs.run_pending()  # Indexes the recipe
+
+        recipe_id = res.data['id']
+        self.assertGreaterEqual(recipe_id, sharding.ID_RANGE_SIZE)  # Allocated from shard_1's range
+        self.assertFalse(Recipe.objects.using('default').filter(pk=recipe_id).exists())
+        self.assertTrue(Recipe.objects.using('shard_1').filter(pk=recipe_id).exists())
+        self.assertTrue(RecipeVector.objects.using('shard_1').filter(recipe_id=recipe_id).exists())
+        self.assertTrue(RecipeRevision.objects.using('shard_1').filter(recipe_id=recipe_id).exists())
+
+    def test_list_and_delete_on_user_shard(self):
+        '''Test listing and deleting find recipes on the user's shard.'''
+        with sharding.for_user(self.user.pk):
+            recipe = Recipe.objects.create(
+                user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+            )
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([item['id'] for item in res.data], [recipe.id])
+
+        self.client.delete(reverse('recipe:recipe-detail', args=[recipe.id]))
+        self.assertIsNotNone(Recipe.all_objects.using('shard_1').get(pk=recipe.id).deleted_at)
+
+    def test_catalog_stats_cover_every_shard(self):
+        '''Test staff catalog stats read recipes from all shards.'''
+        other = create_user_on('default')
+        with sharding.for_user(self.user.pk):
+            Recipe.objects.create(user=self.user, title='A', time_minutes=5, price=Decimal('1.00'))
+        with sharding.for_user(other.pk):
+            Recipe.objects.create(user=other, title='B', time_minutes=5, price=Decimal('1.00'))
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(reverse('recipe:recipe-stats'), {'scope': 'all'})
+
+        self.assertEqual(res.data['count'], 2)
+
+
+@override_settings(RECIPE_SHARDS=SHARDS)
+class UserDeleteTests(TestCase):
+    '''Test deleting a user removes their recipes from every shard.'''
+
+    databases = {'default', 'shard_1'}
+
+    def test_hard_delete_cascades_to_shard(self):
+        '''Test a user's rows on another shard are deleted with the user.'''
+        user = create_user_on('shard_1')
+        with sharding.for_user(user.pk):
+            recipe = Recipe.objects.create(user=user, title='Soup', time_minutes=5, price=Decimal('1.00'))
+            history.record_revision(recipe, user)
+            RecipeVector.objects.create(recipe=recipe, user=user, vector=b'')
+            RecipeSignature.objects.create(recipe=recipe, user=user, signature=b'')
+
+        get_user_model().all_objects.filter(pk=user.pk).delete()
+
+        for model in (Recipe.all_objects, RecipeRevision.objects, RecipeVector.objects, RecipeSignature.objects):
+            self.assertFalse(model.using('shard_1').exists())
+
+
+class RebalanceTests(TestCase):
+    '''Test moving recipes to the shard their user hashes to.'''
+
+    databases = {'default', 'shard_1'}
+
+    def test_rebalance_moves_recipes_and_history(self):
+        '''Test recipes created before a shard was added are moved to it.'''
+        with self.settings(RECIPE_SHARDS=SHARDS):
+            user = create_user_on('shard_1')
+            stays = create_user_on('default')
+        recipes = []
+        for owner in (user, user, user, stays):
+            recipe = Recipe.objects.create(user=owner, title='Soup', time_minutes=5, price=Decimal('1.00'))
+            history.record_revision(recipe, owner)
+            recipes.append(recipe)
+        out = StringIO()
+
+        with self.settings(RECIPE_SHARDS=SHARDS):
+            call_command('rebalance_recipes', batch_size=2, pause=0, stdout=out)
+
+        moved = [recipe.id for recipe in recipes[:3]]
+        self.assertEqual(
+            sorted(Recipe.objects.using('shard_1').values_list('pk', flat=True)), moved,
+        )
+        self.assertEqual(
+            list(Recipe.objects.using('default').values_list('pk', flat=True)), [recipes[3].id],
+        )
+        self.assertEqual(RecipeRevision.objects.using('shard_1').count(), 3)
+        self.assertIn('Moved 3 recipes of 1 users', out.getvalue())
+
+    def test_dry_run(self):
+        '''Test --dry-run reports without moving anything.'''
+        with self.settings(RECIPE_SHARDS=SHARDS):
+            user = create_user_on('shard_1')
+        Recipe.objects.create(user=user, title='Soup', time_minutes=5, price=Decimal('1.00'))
+
+        with self.settings(RECIPE_SHARDS=SHARDS):
+            call_command('rebalance_recipes', dry_run=True, stdout=StringIO())
+
+        self.assertEqual(Recipe.objects.using('default').count(), 1)
@@ -0,0 +1,105 @@
+"""
+Price and preparation time statistics for recipes, computed with NumPy.
+"""
+from itertools import islice
+
+import numpy as np
+from django.core.cache import cache
+
+from core import metrics
+from recipe import versions
+
+CHUNK_SIZE = 5000  # Rows fetched per round trip while loading the columns
+PERCENTILES = [5, 25, 50, 75, 95]
+DEFAULT_BINS = 10
+MAX_BINS = 100
+CACHE_TIMEOUT = 60 * 60
+
+# Scope covering every user's recipes, used for the staff-only catalog view
+CATALOG = versions.CATALOG
+
+
+def load_columns(*querysets, exclude_users=None, chunk_size=CHUNK_SIZE):
+    """Read the price and time_minutes columns into two float64 arrays.
+
+    Rows owned by the users in `exclude_users`, an array of ids, are
+    dropped as they are read rather than filtered in SQL, so a long list
+    of ids never becomes a query parameter.
+    """
+    fields = ['price', 'time_minutes']
+    if exclude_users is not None:
+        fields.append('user_id')
+    blocks = []
+    for queryset in querysets:  # One per shard for catalog-wide stats
+        # values_list avoids building model instances; the server-side cursor
+        # and fixed-size chunks keep the Python objects alive at any time bounded
+        rows = queryset.order_by().values_list(*fields).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            block = np.array(chunk, dtype=np.float64)
+            if exclude_users is not None:
+                block = block[~np.isin(block[:, 2].astype(np.int64), exclude_users), :2]
+            blocks.append(block)
+    if not blocks:
+        return np.empty(0), np.empty(0)
+    columns = np.concatenate(blocks)
+    return columns[:, 0], columns[:, 1]
+
+
+def deleted_user_ids(users):
+    """Return the ids of the soft-deleted users in `users` as an int64 array."""
+    # Read through the partial index on deleted_at, without model instances
+    ids = users.filter(deleted_at__isnull=False).values_list('pk', flat=True)
+    return np.fromiter(ids.iterator(chunk_size=CHUNK_SIZE), dtype=np.int64)
+
+
+def describe(values, bins):
+    """Summarise one column: range, mean, percentiles and a histogram."""
+    if values.size == 0:
+        return None
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'percentiles': dict(zip(
+            map(str, PERCENTILES), np.percentile(values, PERCENTILES).tolist(),
+        )),
+        'histogram': {'edges': edges.tolist(), 'counts': counts.tolist()},
+    }
+
+
+def correlation(prices, minutes):
+    """Pearson correlation of price and time, None when undefined."""
+    if prices.size < 2 or prices.std() == 0 or minutes.std() == 0:
+        return None
+    return float(np.corrcoef(prices, minutes)[0, 1])
+
+
+def compute_stats(prices, minutes, bins=DEFAULT_BINS):
+    """Return the statistics for the two columns."""
+    return {
+        'count': int(prices.size),
+        'price': describe(prices, bins),
+        'time_minutes': describe(minutes, bins),
+        'correlation': correlation(prices, minutes),
+    }
+
+
+def get_stats(querysets, scope, bins=DEFAULT_BINS, exclude_users=None):
+    """Return the stats over `querysets`, cached per scope data version.
+
+    `exclude_users` is called for the ids passed on to load_columns, and
+    only when the stats aren't cached.
+    """
+    key = f'recipe-stats:{scope}:{versions.data_version(scope)}:{bins}'
+    stats = cache.get(key)
+    metrics.record_cache('recipe-stats', stats is not None)
+    if stats is None:
+        excluded = exclude_users() if exclude_users is not None else None
+        stats = compute_stats(*load_columns(*querysets, exclude_users=excluded), bins=bins)
+        cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
@@ -0,0 +1,169 @@
+"""
+Near-duplicate recipe detection with MinHash and locality-sensitive hashing.
+
+A recipe's normalised title and description are cut into character
+shingles, and a MinHash signature of NUM_PERM values estimates the
+Jaccard similarity between any two recipes' shingle sets. Signatures
+are stored by the recipe.index job after a recipe is written. To find
+duplicates, each
+signature is split into BANDS bands of ROWS values, and only recipes
+that agree on a whole band are compared. This finds likely pairs
+without comparing every recipe with every other one.
+"""
+import re
+import zlib
+
+import numpy as np
+
+from core.models import Recipe, RecipeSignature
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # 8 rows: pairs at 0.8 similarity share a band ~95% of the time
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+
+# Universal hash family h(x) = (a * x + b) mod p with p prime above 2**32.
+# a and x are both below 2**32, so a * x fits in uint64 without overflow
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(20240819)
+_A = _rng.randint(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+# Multipliers folding a band's values into one bucket key
+_BAND_MIX = _rng.randint(1, 2 ** 63, size=ROWS, dtype=np.uint64) | np.uint64(1)
+
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(title, description=''):
+    """Lowercase the text and collapse everything but letters and digits."""
+    return _NON_WORD_RE.sub(' ', f'{title} {description}'.lower()).strip()
+
+
+def shingles(text):
+    """Return the set of character shingles of normalised text."""
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(title, description=''):
+    """Return the MinHash signature of a recipe's text as uint32 values."""
+    tokens = shingles(normalize(title, description))
+    if not tokens:
+        return np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+    hashes = np.fromiter(
+        (zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens),
+    )
+    # One row per hash function, one column per shingle; keep each row's minimum
+    permuted = (_A[:, None] * hashes[None, :] % _PRIME + _B[:, None]) % _PRIME
+    return (permuted.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def store_signature(recipe):
+    """Compute and save the signature for a recipe after it was written."""
+    RecipeSignature.objects.update_or_create(
+        recipe=recipe,
+        defaults={
+            'user_id': recipe.user_id,
+            'signature': signature(recipe.title, recipe.description).tobytes(),
+        },
+    )
+
+
+def backfill_signatures(user_id):
+    """Create signatures for any of the user's recipes that lack one."""
+    missing = Recipe.objects.filter(user_id=user_id, signature__isnull=True)
+    RecipeSignature.objects.bulk_create([
+        RecipeSignature(
+            recipe_id=recipe_id,
+            user_id=user_id,
+            signature=signature(title, description).tobytes(),
+        )
+        for recipe_id, title, description in missing.values_list('id', 'title', 'description')
+    ], batch_size=1000)
+
+
+def load_signatures(user_id):
+    """Return the user's recipe ids and an (n, NUM_PERM) signature matrix.
+
+    Recipes whose signature hasn't been stored yet (see recipe.tasks and
+    backfill_signatures) are signed in memory; nothing is written.
+    """
+    rows = RecipeSignature.objects.filter(
+        user_id=user_id,
+        recipe__deleted_at__isnull=True,
+    ).values_list('recipe_id', 'signature')
+    signed = {recipe_id: bytes(blob) for recipe_id, blob in rows.iterator()}
+    missing = Recipe.objects.filter(user_id=user_id, signature__isnull=True)
+    for recipe_id, title, description in missing.values_list('id', 'title', 'description').iterator():
+        signed[recipe_id] = signature(title, description).tobytes()
+    ids = sorted(signed)
+    matrix = np.frombuffer(b''.join(signed[recipe_id] for recipe_id in ids), dtype=np.uint32)
+    return np.array(ids, dtype=np.int64), matrix.reshape(-1, NUM_PERM)
+
+
+def candidate_pairs(signatures):
+    """Return (first, member) row pairs linking each band bucket to its first row.
+
+    A bucket of m equal band values gives m - 1 pairs rather than every
+    one of its m * (m - 1) / 2 pairs, so many exact copies, or short
+    recipes sharing a signature, stay linear. Rows of one bucket that
+    match the first row end up in one cluster anyway.
+    """
+    pairs = set()
+    for band in range(BANDS):
+        values = signatures[:, band * ROWS:(band + 1) * ROWS].astype(np.uint64)
+        keys = (values * _BAND_MIX).sum(axis=1)  # Wraps around; only equality matters
+        order = np.argsort(keys, kind='stable')  # Rows of a bucket stay in id order
+        sorted_keys = keys[order]
+        starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        # Position of each row's bucket start in `order`; singletons pair with themselves
+        first = order[np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))]
+        linked = first != order
+        pairs.update(zip(first[linked].tolist(), order[linked].tolist()))
+    return pairs
+
+
+def find_clusters(user_id, threshold=DEFAULT_THRESHOLD):
+    """Group the user's recipes whose estimated similarity is >= threshold.
+
+    Returns a list of clusters, each a dict with the recipe ids (oldest
+    first) and the lowest similarity among the pairs that linked them.
+    """
+    ids, signatures = load_signatures(user_id)
+    pairs = candidate_pairs(signatures)
+    if not pairs:
+        return []
+
+    # Verify all candidates at once: the share of equal values estimates Jaccard
+    first, second = (np.array(side, dtype=np.int64) for side in zip(*pairs))
+    similarity = (signatures[first] == signatures[second]).mean(axis=1)
+    keep = similarity >= threshold
+
+    # Union-find over the verified pairs
+    parent = list(range(len(ids)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    linked = list(zip(first[keep].tolist(), second[keep].tolist(), similarity[keep].tolist()))
+    for i, j, _score in linked:
+        a, b = root(i), root(j)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    members, weakest = {}, {}
+    for i, _j, score in linked:
+        key = root(i)
+        weakest[key] = min(score, weakest.get(key, 1.0))
+    for i in range(len(ids)):
+        if root(i) in weakest:
+            members.setdefault(root(i), []).append(int(ids[i]))
+    return [
+        {'recipes': recipes, 'similarity': round(weakest[key], 4)}
+        for key, recipes in members.items()
+    ]
@@ -0,0 +1,161 @@
+"""
+Server-Sent Events feed of changes to a user's recipes.
+
+    GET /api/recipe/events/
+    Authorization: Token <key>    (or Bearer <signed access token>)
+
+streams a `created`, `updated` or `deleted` event whenever one of the
+user's recipes changes, so clients no longer poll the recipe list. The
+feed is a plain ASGI application mounted in app.asgi next to Django and
+is only available when the project is served over ASGI (`manage.py
+serve --asgi`); over WSGI the path answers 501.
+
+Every event carries an id; browsers send the last one back in the
+Last-Event-ID header when they reconnect and get the events they missed
+from core.events' replay buffer, or a `reset` event asking them to
+reload the list. EventSource can't set headers, so browsers may pass
+the token and last id as ?token= and ?last_event_id= instead.
+
+A comment line is sent every EVENTS_HEARTBEAT seconds to keep proxies
+from closing an idle connection. A client that can't keep up is
+disconnected once EVENTS_QUEUE_SIZE events are waiting for it.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework import exceptions
+
+from core import events
+from recipe import serializers
+from user.authentication import CachedTokenAuthentication, SignedTokenAuthentication
+
+PATH = '/api/recipe/events/'
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+
+def channel(user_id):
+    return f'recipes:{user_id}'
+
+
+def publish_change(recipe, type):
+    """Tell the owner's connected clients about a committed change."""
+    if type == DELETED:
+        data = {'id': recipe.pk}
+    else:
+        data = serializers.RecipeDetailSerializer(recipe).data
+    events.publish(channel(recipe.user_id), type, data)
+
+
+def authenticate(keyword, key):
+    """Return the active user of an API token or signed access token, or None."""
+    backend = SignedTokenAuthentication() if keyword == 'bearer' else CachedTokenAuthentication()
+    close_old_connections()
+    try:
+        user, _key = backend.authenticate_credentials(key)
+    except exceptions.AuthenticationFailed:
+        return None
+    finally:
+        close_old_connections()
+    return user
+
+
+def unavailable(request):
+    """Answer for the feed's path when Django serves it over WSGI."""
+    return JsonResponse(
+        {'detail': 'The change feed is only served over ASGI.'}, status=501,
+    )
+
+
+def format_event(event):
+    return f'id: {event.id}\nevent: {event.type}\ndata: {event.data}\n\n'.encode()
+
+
+class RecipeFeed:
+    """ASGI application streaming the authenticated user's recipe changes."""
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] not in ('GET', 'HEAD'):
+            await self.error(send, 405, 'Method not allowed.', [(b'allow', b'GET, HEAD')])
+            return
+
+        headers = dict(scope['headers'])
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        keyword, _, key = headers.get(b'authorization', b'').decode('latin-1').partition(' ')
+        keyword = keyword.lower()
+        if keyword not in ('token', 'bearer'):
+            keyword, key = 'token', query.get('token', [''])[0]
+        user = key and await sync_to_async(authenticate)(keyword, key)
+        if not user:
+            await self.error(
+                send, 401, 'Authentication credentials were not provided or are invalid.',
+                [(b'www-authenticate', b'Token')],
+            )
+            return
+
+        last_event_id = (
+            headers.get(b'last-event-id', b'').decode('latin-1') or
+            query.get('last_event_id', [''])[0]
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),  # Stop nginx from buffering the stream
+            ],
+        })
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body'})
+            return
+
+        subscription = events.get_broker().subscribe(channel(user.pk), last_event_id)
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await send({
+                'type': 'http.response.body',
+                'body': f'retry: {settings.EVENTS_RETRY}\n\n'.encode(),
+                'more_body': True,
+            })
+            while True:
+                next_event = asyncio.ensure_future(subscription.get(settings.EVENTS_HEARTBEAT))
+                await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    next_event.cancel()
+                    return
+                event = next_event.result()
+                if event is not None:
+                    body = format_event(event)
+                elif subscription.overflowed:
+                    break  # The client reconnects and catches up from the replay buffer
+                else:
+                    body = b': heartbeat\n\n'
+                # Waits while the server's write buffer is full, so a slow
+                # client backs up into its bounded subscription queue
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            subscription.close()
+            disconnected.cancel()
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    async def error(send, status, detail, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), *headers],
+        })
+        await send({'type': 'http.response.body', 'body': json.dumps({'detail': detail}).encode()})
@@ -0,0 +1,110 @@
+"""
+Append-only recipe change history.
+
+Each write to a recipe appends a RecipeRevision holding only the fields
+that changed. The first revision, and any produced by compaction, is a
+checkpoint holding every field, so a past version is rebuilt by taking
+the closest checkpoint at or before it and folding the deltas after it
+in order. `compact_recipe_history` collapses old deltas into periodic
+checkpoints to bound both the row count and the length of a fold.
+"""
+from django.db.models import Max
+
+from core import sharding
+from core.models import Recipe, RecipeRevision
+
+FIELDS = ('title', 'description', 'time_minutes', 'price', 'link')
+
+
+def _state(values):
+    """Return JSON-safe field values; decimals are kept as exact strings."""
+    return {field: str(values[field]) if field == 'price' else values[field] for field in FIELDS}
+
+
+def snapshot(recipe):
+    """Return the tracked fields of a recipe instance."""
+    return _state({field: getattr(recipe, field) for field in FIELDS})
+
+
+def lock_state(recipe_id):
+    """Lock a recipe row for the current transaction and return its stored state."""
+    values = Recipe.all_objects.select_for_update().filter(pk=recipe_id).values(*FIELDS).get()
+    return _state(values)
+
+
+def record_revision(recipe, user, previous=None):
+    """
+    Append the changes from `previous` to the recipe's current state.
+
+    Pass `previous=None` for a new recipe. Updates must hold the lock
+    taken by `lock_state` so revision numbers are assigned in order.
+    Returns the new revision, or None when nothing changed.
+    """
+    current = snapshot(recipe)
+    revisions = RecipeRevision.objects.filter(recipe=recipe)
+    last = revisions.aggregate(last=Max('number'))['last']
+
+    if last is None:
+        if previous is None or previous == current:
+            return RecipeRevision.objects.create(
+                recipe=recipe, number=1, changes=current, is_checkpoint=True, user=user,
+            )
+        # Recipe written before history existed; keep its old state as the base
+        RecipeRevision.objects.create(recipe=recipe, number=1, changes=previous, is_checkpoint=True)
+        last = 1
+
+    changes = {field: value for field, value in current.items() if previous.get(field) != value}
+    if not changes:
+        return None
+    return RecipeRevision.objects.create(recipe=recipe, number=last + 1, changes=changes, user=user)
+
+
+def rebuild(recipe_id, number):
+    """Return the recipe's fields as of a revision, or None if it is not kept."""
+    revisions = RecipeRevision.objects.filter(recipe_id=recipe_id)
+    if not revisions.filter(number=number).exists():
+        return None
+    base = revisions.filter(number__lte=number, is_checkpoint=True).order_by('-number').first()
+    if base is None:
+        return None
+
+    state = dict(base.changes)
+    deltas = revisions.filter(number__gt=base.number, number__lte=number).order_by('number')
+    for changes in deltas.values_list('changes', flat=True):
+        state.update(changes)
+    return state
+
+
+def compact(recipe_id, cutoff, every):
+    """
+    Collapse a recipe's revisions created before `cutoff` into checkpoints.
+
+    Of the old revisions, only those numbered at a multiple of `every`
+    and the newest one are kept, each rewritten as a checkpoint of the
+    state at that point; the rest are deleted. Newer revisions fold on
+    top of the last checkpoint unchanged. Returns the number removed.
+    """
+    with sharding.atomic():
+        old = list(
+            RecipeRevision.objects.select_for_update()
+            .filter(recipe_id=recipe_id, created_at__lt=cutoff)
+            .order_by('number')
+        )
+        if not old or not old[0].is_checkpoint:
+            return 0  # Never fold without a full base to start from
+
+        state = {}
+        keep, remove = [], []
+        for i, revision in enumerate(old):
+            state.update(revision.changes)
+            if revision.number % every == 0 or i == len(old) - 1:
+                if not revision.is_checkpoint or revision.changes != state:
+                    revision.changes = dict(state)
+                    revision.is_checkpoint = True
+                    keep.append(revision)
+            else:
+                remove.append(revision.pk)
+
+        RecipeRevision.objects.bulk_update(keep, ['changes', 'is_checkpoint'])
+        RecipeRevision.objects.filter(pk__in=remove).delete()
+        return len(remove)
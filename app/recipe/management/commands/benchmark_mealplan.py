@@ -0,0 +1,69 @@
+"""
+Django command timing the meal-plan solver over synthetic recipe columns
+"""
+import itertools
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from recipe import mealplan
+
+
+def brute_force(cents, minutes, count, budget_cents, max_minutes, weight=0.5, alternatives=1):
+    """Return the (cost, positions) of the best plans by trying every combination."""
+    plans = []
+    for plan in itertools.combinations(range(len(cents)), count):
+        if sum(cents[i] for i in plan) <= budget_cents and sum(minutes[i] for i in plan) <= max_minutes:
+            cost = sum(
+                weight * cents[i] / max(budget_cents, 1) + (1 - weight) * minutes[i] / max(max_minutes, 1)
+                for i in plan
+            )
+            plans.append((cost, plan))
+    return sorted(plans)[:alternatives]
+
+
+def scenarios(n, rng):
+    """Yield (name, cents, minutes, budget_cents, max_minutes) test cases."""
+    cents = rng.integers(100, 3000, n)
+    minutes = rng.integers(5, 240, n)
+    yield 'loose', cents, minutes, 6000, 300
+    yield 'tight', cents, minutes, 1500, 60
+    # Cheap recipes are slow and quick ones expensive, the hardest case for the bounds
+    slow = (3200 - cents) // 15 + rng.integers(0, 20, n)
+    yield 'trade-off', cents, slow, 6000, 1100
+    yield 'infeasible', cents, slow, 2500, 700
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the meal-plan solver"""
+
+    help = 'Time the meal-plan solver over synthetic recipe columns.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--count', type=int, default=7)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        rng = np.random.default_rng(0)
+        ids = np.arange(options['recipes'], dtype=np.int64)
+        slowest = 0.0
+        for name, cents, minutes, budget_cents, max_minutes in scenarios(options['recipes'], rng):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                result = mealplan.plan_meals(ids, cents, minutes, options['count'], budget_cents, max_minutes)
+                timings.append(time.perf_counter() - start)
+            slowest = max(slowest, max(timings))
+            self.stdout.write(
+                f'{name:<12}median {statistics.median(timings) * 1000:7.1f} ms  '
+                f'max {max(timings) * 1000:7.1f} ms  '
+                f"plans {len(result['plans'])}  optimal {result['optimal']}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Slowest solve {slowest * 1000:.1f} ms over {options['recipes']} recipes"
+        ))
@@ -0,0 +1,105 @@
+"""
+Django command comparing NumPy recipe stats with a pure-Python version
+"""
+import math
+import random
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from recipe import analytics
+
+
+def percentile(ordered, q):
+    """Linearly interpolated percentile of a sorted list (NumPy's default)."""
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def describe(values, bins):
+    """Pure-Python equivalent of analytics.describe."""
+    if not values:
+        return None
+    low, high = min(values), max(values)
+    mean = sum(values) / len(values)
+    width = (high - low) / bins if high > low else 0
+    counts = [0] * bins
+    for value in values:
+        index = int((value - low) / width) if width else 0
+        counts[min(index, bins - 1)] += 1
+    ordered = sorted(values)
+    return {
+        'min': low,
+        'max': high,
+        'mean': mean,
+        'std': math.sqrt(sum((value - mean) ** 2 for value in values) / len(values)),
+        'percentiles': {
+            str(q): percentile(ordered, q) for q in analytics.PERCENTILES
+        },
+        'counts': counts,
+    }
+
+
+def python_stats(rows, bins=analytics.DEFAULT_BINS):
+    """Compute the stats from (price, time_minutes) rows without NumPy."""
+    prices = [float(price) for price, _minutes in rows]
+    minutes = [float(minutes) for _price, minutes in rows]
+    n = len(rows)
+    result = {
+        'count': n,
+        'price': describe(prices, bins),
+        'time_minutes': describe(minutes, bins),
+        'correlation': None,
+    }
+    if n >= 2:
+        mean_p, mean_m = sum(prices) / n, sum(minutes) / n
+        cov = sum((p - mean_p) * (m - mean_m) for p, m in zip(prices, minutes))
+        var_p = sum((p - mean_p) ** 2 for p in prices)
+        var_m = sum((m - mean_m) ** 2 for m in minutes)
+        if var_p and var_m:
+            result['correlation'] = cov / math.sqrt(var_p * var_m)
+    return result
+
+
+def numpy_stats(rows, bins=analytics.DEFAULT_BINS):
+    """Compute the stats from rows the way the endpoint does."""
+    columns = np.array(rows, dtype=np.float64).reshape(-1, 2)
+    return analytics.compute_stats(columns[:, 0], columns[:, 1], bins=bins)
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe stats computation"""
+
+    help = 'Time NumPy and pure-Python stats over synthetic recipe rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        rng = random.Random(0)
+        # Rows shaped like values_list('price', 'time_minutes') returns them
+        rows = [
+            (Decimal(rng.randint(100, 99999)) / 100, rng.randint(1, 600))
+            for _ in range(options['rows'])
+        ]
+
+        timings = {}
+        for name, func in (('python', python_stats), ('numpy', numpy_stats)):
+            best = math.inf
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                func(rows)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+            self.stdout.write(f'{name:<8}{best * 1000:10.1f} ms')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"NumPy is {timings['python'] / timings['numpy']:.1f}x faster "
+            f"over {options['rows']} rows"
+        ))
@@ -0,0 +1,57 @@
+"""
+Django command to collapse old recipe history into checkpoints
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import sharding
+from core.models import RecipeRevision
+from recipe import history
+
+
+class Command(BaseCommand):
+    """Django command to compact recipe revisions older than a cutoff"""
+
+    help = (
+        'Replace old recipe revision deltas with a checkpoint every N '
+        'revisions, keeping recent history intact.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=float,
+            default=90,
+            help='Only compact revisions created at least this many days ago.',
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=10,
+            help='Keep one checkpoint per this many old revisions.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if options['every'] < 1:
+            raise CommandError('--every must be at least 1')
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+
+        removed = recipes = 0
+        for alias in settings.RECIPE_SHARDS:
+            with sharding.using(alias):
+                recipe_ids = (
+                    RecipeRevision.objects.filter(created_at__lt=cutoff, is_checkpoint=False)
+                    .order_by().values_list('recipe_id', flat=True).distinct()
+                )
+                for recipe_id in list(recipe_ids):
+                    # One transaction per recipe keeps each lock short
+                    removed += history.compact(recipe_id, cutoff, options['every'])
+                    recipes += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {removed} revisions across {recipes} recipes'
+        ))
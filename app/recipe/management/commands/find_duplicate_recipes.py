@@ -0,0 +1,76 @@
+"""
+Django command to find (and optionally merge) near-duplicate recipes
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import sharding
+from core.models import Recipe
+from recipe import dedupe, feed
+
+
+class Command(BaseCommand):
+    """Django command to report near-duplicate recipe clusters"""
+
+    help = (
+        'Compute missing MinHash signatures and list clusters of '
+        'near-duplicate recipes per user.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email of the user to check (default: every user with recipes).',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=dedupe.DEFAULT_THRESHOLD,
+            help='Minimum estimated similarity for two recipes to be grouped.',
+        )
+        parser.add_argument(
+            '--merge',
+            action='store_true',
+            help='Keep the oldest recipe of each cluster and soft-delete the rest.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if options['user']:
+            try:
+                user_ids = [get_user_model().objects.get(email=options['user']).pk]
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+        else:
+            user_ids = set()
+            for alias in settings.RECIPE_SHARDS:
+                user_ids.update(
+                    Recipe.objects.using(alias).order_by().values_list('user_id', flat=True).distinct()
+                )
+            user_ids = sorted(user_ids)
+
+        total = 0
+        for user_id in user_ids:
+            with sharding.for_user(user_id):
+                total += self.check_user(user_id, options)
+
+        self.stdout.write(self.style.SUCCESS(f'Found {total} clusters'))
+
+    def check_user(self, user_id, options):
+        """Report (and merge) one user's clusters; return how many there were."""
+        dedupe.backfill_signatures(user_id)
+        clusters = dedupe.find_clusters(user_id, threshold=options['threshold'])
+        for cluster in clusters:
+            keep, *extras = cluster['recipes']
+            self.stdout.write(
+                f"user {user_id}: {cluster['recipes']} "
+                f"(similarity >= {cluster['similarity']})"
+            )
+            if options['merge']:
+                # Soft delete, so a bad merge can be undone until the next purge.
+                # One by one, so the signal handlers and the feed see each of them
+                for recipe in Recipe.objects.filter(pk__in=extras):
+                    recipe.soft_delete()
+                    feed.publish_change(recipe, feed.DELETED)
+        return len(clusters)
@@ -0,0 +1,184 @@
+"""
+Meal-plan optimizer: pick `count` recipes within a price and time budget.
+
+Each recipe costs `weight * price / budget + (1 - weight) * time / limit`,
+a mix of the share of each budget it uses, and the best plan is the one
+with the lowest total cost that stays within both budgets. Choosing a
+fixed number of items under two budgets is a multi-constraint knapsack,
+so the solver is a depth-first branch and bound:
+
+* recipes are sorted by cost, so the first plans found are already good
+  and the cost of the cheapest `r` remaining recipes (a prefix-sum
+  lookup) bounds every completion of a partial plan;
+* recipes that would leave too little budget for even the cheapest
+  remaining prices and times are masked out of each branch at once;
+* the last recipe of a plan is chosen for all candidates at once with a
+  NumPy mask instead of one branch each.
+
+The search stops at a time limit and returns the best plans found so
+far, flagged as not proven optimal.
+"""
+import heapq
+import sys
+import time
+
+import numpy as np
+from django.core.cache import cache
+
+from recipe import versions
+
+MAX_COUNT = 21
+DEFAULT_ALTERNATIVES = 5
+MAX_ALTERNATIVES = 20
+DEFAULT_TIME_LIMIT = 0.05  # Seconds
+CACHE_TIMEOUT = 60 * 60
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def _divisor(budget):
+    """Return a budget as a float of at least 1, however large it is."""
+    return float(min(max(budget, 1), sys.float_info.max))
+
+
+def load_columns(queryset):
+    """Read ids, prices in cents and times into int64 arrays."""
+    # float64 holds ids below 2**53 and two-decimal prices exactly enough to round
+    rows = np.array(
+        list(queryset.order_by().values_list('id', 'price', 'time_minutes')),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    ids = rows[:, 0].astype(np.int64)
+    cents = np.rint(rows[:, 1] * 100).astype(np.int64)  # Whole cents, so budget checks are exact
+    minutes = rows[:, 2].astype(np.int64)
+    return ids, cents, minutes
+
+
+def get_columns(queryset, user_id, refresh=False):
+    """Return the user's columns, cached per recipe data version.
+
+    `refresh` reloads them, for when a plan names a recipe that has
+    since been deleted.
+    """
+    key = f'mealplan-columns:{user_id}:{versions.data_version(user_id)}'
+    columns = None if refresh else cache.get(key)
+    if columns is None:
+        columns = load_columns(queryset)
+        cache.set(key, columns, CACHE_TIMEOUT)
+    return columns
+
+
+class Solver:
+    """Branch and bound over recipes sorted by cost."""
+
+    def __init__(self, ids, cents, minutes, count, budget_cents, max_minutes,
+                 weight=0.5, alternatives=DEFAULT_ALTERNATIVES, time_limit=DEFAULT_TIME_LIMIT):
+        # Costs are shares of the budgets as given
+        price_scale, time_scale = _divisor(budget_cents), _divisor(max_minutes)
+        # For the checks, budgets beyond what all the recipes add up to rule
+        # nothing out, and clamping them keeps every sum below within int64
+        budget_cents = min(budget_cents, int(cents.sum()))
+        max_minutes = min(max_minutes, int(minutes.sum()))
+        self.count = count
+        self.budget = budget_cents
+        self.max_minutes = max_minutes
+        self.alternatives = alternatives
+        self.deadline = time.perf_counter() + time_limit
+        self.nodes = 0
+
+        # Recipes that don't fit on their own can never be part of a plan
+        fits = (cents <= budget_cents) & (minutes <= max_minutes)
+        ids, cents, minutes = ids[fits], cents[fits], minutes[fits]
+        cost = weight * cents / price_scale + (1 - weight) * minutes / time_scale
+        order = np.argsort(cost, kind='stable')
+        self.ids, self.cents, self.minutes = ids[order], cents[order], minutes[order]
+        self.cost = cost[order]
+        self.n = len(self.ids)
+
+        # cost_prefix[i + r] - cost_prefix[i]: cheapest cost of r recipes from i on
+        self.cost_prefix = np.concatenate([[0.0], np.cumsum(self.cost)])
+        # Least total price, time and combined share of both budgets of any r
+        # recipes, for the budget checks. A plan uses at most 2 (100% of each
+        # budget) combined, which prunes where price and time trade off
+        self.min_cents = np.concatenate([[0], np.cumsum(np.sort(self.cents))])
+        self.min_minutes = np.concatenate([[0], np.cumsum(np.sort(self.minutes))])
+        self.usage = cents[order] / max(budget_cents, 1) + minutes[order] / max(max_minutes, 1)
+        self.min_usage = np.concatenate([[0.0], np.cumsum(np.sort(self.usage))])
+
+        self.best = []  # Max-heap by cost (negated) of the best plans so far
+
+    def worst_kept(self):
+        return -self.best[0][0] if len(self.best) == self.alternatives else np.inf
+
+    def keep(self, cost, plan):
+        entry = (-cost, plan)
+        if len(self.best) < self.alternatives:
+            heapq.heappush(self.best, entry)
+        else:
+            heapq.heappushpop(self.best, entry)
+
+    def solve(self):
+        """Return (plans, optimal); plans are lists of positions, best first."""
+        optimal = True
+        if 0 < self.count <= self.n:
+            try:
+                self.search(0, self.count, 0.0, 0, 0, 0.0, ())
+            except _OutOfTime:
+                optimal = False
+        plans = sorted(((-cost, plan) for cost, plan in self.best))
+        return plans, optimal
+
+    def search(self, start, remaining, cost, cents, minutes, usage, chosen):
+        self.nodes += 1
+        if self.nodes % 256 == 0 and time.perf_counter() > self.deadline:
+            raise _OutOfTime
+
+        if remaining == 1:
+            # Every recipe that still fits completes a plan; costs are sorted,
+            # so the first few that fit are the best completions
+            fits = np.flatnonzero(
+                (self.cents[start:] <= self.budget - cents)
+                & (self.minutes[start:] <= self.max_minutes - minutes)
+            )[:self.alternatives]
+            for position in fits + start:
+                total = cost + self.cost[position]
+                if total >= self.worst_kept():
+                    break
+                self.keep(total, chosen + (int(position),))
+            return
+
+        # Recipes that leave room for the cheapest possible rest of the plan
+        end = self.n - remaining + 1
+        candidates = start + np.flatnonzero(
+            (self.cents[start:end] <= self.budget - cents - self.min_cents[remaining - 1])
+            & (self.minutes[start:end] <= self.max_minutes - minutes - self.min_minutes[remaining - 1])
+            & (self.usage[start:end] <= 2 + 1e-9 - usage - self.min_usage[remaining - 1])
+        )
+        bounds = cost + self.cost_prefix[candidates + remaining] - self.cost_prefix[candidates]
+        for i, bound in zip(candidates.tolist(), bounds.tolist()):
+            if bound >= self.worst_kept():
+                break  # Later recipes cost more, so their bounds are no better
+            self.search(
+                i + 1, remaining - 1, cost + self.cost[i], cents + int(self.cents[i]),
+                minutes + int(self.minutes[i]), usage + self.usage[i], chosen + (i,),
+            )
+
+
+def plan_meals(ids, cents, minutes, count, budget_cents, max_minutes, **options):
+    """Solve and describe the best plans as recipe ids with their totals."""
+    solver = Solver(ids, cents, minutes, count, budget_cents, max_minutes, **options)
+    plans, optimal = solver.solve()
+    return {
+        'optimal': optimal,
+        'plans': [
+            {
+                'recipes': [int(solver.ids[position]) for position in plan],
+                'total_price': f'{int(solver.cents[list(plan)].sum()) / 100:.2f}',
+                'total_minutes': int(solver.minutes[list(plan)].sum()),
+                'cost': round(float(cost), 6),
+            }
+            for cost, plan in plans
+        ],
+    }
@@ -3,7 +3,7 @@ Serializers for recipe APIs
 """
 from rest_framework import serializers  # Importing the serializers module from Django REST Framework
 
-from core.models import Recipe  # Importing the Recipe model from the core app
+from core.models import Recipe, RecipeRevision  # Importing the Recipe and RecipeRevision models from the core app
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -19,4 +19,13 @@ class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description']  # Extends the fields from RecipeSerializer to include the 'description' field
\ No newline at end of file
+        fields = RecipeSerializer.Meta.fields + ['description']  # Extends the fields from RecipeSerializer to include the 'description' field
+
+
+class RecipeRevisionSerializer(serializers.ModelSerializer):
+    """Serializer for recipe history entries."""
+
+    class Meta:
+        model = RecipeRevision
+        fields = ['number', 'changes', 'is_checkpoint', 'user', 'created_at']
+        read_only_fields = fields
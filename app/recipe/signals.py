@@ -0,0 +1,28 @@
+"""
+Signal handlers keeping caches of recipe data in step with the database.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Recipe
+from recipe import versions
+
+
+# Covers the API, admin edits, soft deletes, purge_deleted and rebalance_recipes
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_versions(sender, instance, **kwargs):
+    # After the commit, or another request could cache the old data under the new version
+    transaction.on_commit(
+        lambda: versions.bump(instance.user_id, versions.CATALOG),
+        using=instance._state.db,
+    )
+
+
+# Catalog stats leave out the recipes of soft-deleted users
+@receiver(post_save, sender=get_user_model())
+def bump_catalog_version(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'deleted_at' in update_fields:
+        transaction.on_commit(lambda: versions.bump(versions.CATALOG), using=instance._state.db)
@@ -0,0 +1,218 @@
+"""
+Similar-recipe search over hashed text embeddings.
+
+Each recipe's title and description are hashed into a fixed-size,
+L2-normalised float32 vector when the recipe is written (see
+`store_vector`). For queries, a user's vectors are laid out as one
+matrix file that is memory-mapped and scored with a single
+matrix-vector product, so no text is scanned at query time. The file is
+rebuilt from the stored vectors whenever the user's recipe data version
+(`versions.data_version`) moves on.
+"""
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from core.models import Recipe, RecipeVector
+from recipe import versions
+
+DIMENSIONS = 256
+TITLE_WEIGHT = 2  # Title words say more about a recipe than its description
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+logger = logging.getLogger(__name__)
+
+# Seconds a superseded index file is kept for processes still about to open it
+INDEX_GRACE_PERIOD = 10 * 60
+
+# Open indexes per process, most recently used last
+MAX_OPEN_INDEXES = 64
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def embed(title, description=''):
+    """Return the hashed bag-of-words vector for a recipe's text."""
+    counts = Counter()
+    for token in TOKEN_RE.findall(title.lower()):
+        counts[token] += TITLE_WEIGHT
+    counts.update(TOKEN_RE.findall(description.lower()))
+
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    if not counts:
+        return vector
+    hashes = np.array([zlib.crc32(token.encode()) for token in counts], dtype=np.uint32)
+    # Sublinear term frequency, with a hash bit choosing the sign so that
+    # collisions cancel out on average instead of piling up
+    weights = np.array([1 + math.log(count) for count in counts.values()], dtype=np.float32)
+    signs = np.where(hashes & 0x80000000, -1, 1).astype(np.float32)
+    np.add.at(vector, hashes % DIMENSIONS, signs * weights)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def store_vector(recipe):
+    """Compute and save the vector for a recipe after it was written."""
+    RecipeVector.objects.update_or_create(
+        recipe=recipe,
+        defaults={
+            'user_id': recipe.user_id,
+            'vector': embed(recipe.title, recipe.description).tobytes(),
+        },
+    )
+
+
+def backfill_vectors(user_id):
+    """Create vectors for any of the user's recipes that lack one."""
+    missing = Recipe.objects.filter(user_id=user_id, vector__isnull=True)
+    RecipeVector.objects.bulk_create([
+        RecipeVector(
+            recipe_id=recipe_id,
+            user_id=user_id,
+            vector=embed(title, description).tobytes(),
+        )
+        for recipe_id, title, description in missing.values_list('id', 'title', 'description')
+    ])
+
+
+class VectorIndex:
+    """A user's recipe ids (sorted) and the memory-mapped vector matrix."""
+
+    def __init__(self, version, ids, matrix):
+        self.version = version
+        self.ids = ids
+        self.matrix = matrix
+
+    def position(self, recipe_id):
+        index = int(np.searchsorted(self.ids, recipe_id))
+        if index < len(self.ids) and self.ids[index] == recipe_id:
+            return index
+        return None
+
+
+def index_paths(user_id, version):
+    directory = Path(settings.RECIPE_VECTOR_DIR)
+    stem = f'user-{user_id}-{version}'
+    return directory / f'{stem}.ids.npy', directory / f'{stem}.f32'
+
+
+def load_vectors(user_id):
+    """Return the user's recipe ids (sorted) and their vectors as one bytes object."""
+    vectors = RecipeVector.objects.filter(
+        user_id=user_id,
+        recipe__deleted_at__isnull=True,
+    ).order_by('recipe_id').values_list('recipe_id', 'vector')
+    ids, blobs = [], []
+    for recipe_id, vector in vectors.iterator():
+        ids.append(recipe_id)
+        blobs.append(bytes(vector))
+    return np.array(ids, dtype=np.int64), b''.join(blobs)
+
+
+def build_index(user_id, version):
+    """Write the user's vectors to index files for `version`."""
+    backfill_vectors(user_id)
+    ids_path, matrix_path = index_paths(user_id, version)
+    matrix_path.parent.mkdir(parents=True, exist_ok=True)
+
+    ids, matrix = load_vectors(user_id)
+    # Written under a temporary name and renamed so readers never see a partial file
+    tmp_suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(str(matrix_path) + tmp_suffix, 'wb') as matrix_file:
+        matrix_file.write(matrix)
+    with open(str(ids_path) + tmp_suffix, 'wb') as ids_file:
+        np.save(ids_file, ids)
+    os.replace(str(ids_path) + tmp_suffix, ids_path)
+    os.replace(str(matrix_path) + tmp_suffix, matrix_path)
+
+    # Other processes may still be about to open older versions, so only
+    # files that have been superseded for a while are removed. Maps that
+    # are already open stay valid after the unlink
+    cutoff = time.time() - INDEX_GRACE_PERIOD
+    for path in matrix_path.parent.glob(f'user-{user_id}-*'):
+        if path in (ids_path, matrix_path):
+            continue
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:  # Removed by another process meanwhile
+            pass
+
+
+def map_index(version, ids_path, matrix_path):
+    """Load the ids and memory-map the matrix of an index."""
+    ids = np.load(ids_path)
+    if len(ids):
+        matrix = np.memmap(matrix_path, dtype=np.float32, mode='r', shape=(len(ids), DIMENSIONS))
+    else:
+        matrix = np.empty((0, DIMENSIONS), dtype=np.float32)
+    return VectorIndex(version, ids, matrix)
+
+
+def open_index(user_id, version):
+    """Memory-map the index files for `version`, building them if needed."""
+    ids_path, matrix_path = index_paths(user_id, version)
+    try:
+        if not matrix_path.exists():
+            build_index(user_id, version)
+        try:
+            return map_index(version, ids_path, matrix_path)
+        except FileNotFoundError:
+            # Cleaned up by another process since the check; build it again
+            build_index(user_id, version)
+            return map_index(version, ids_path, matrix_path)
+    except OSError:
+        # e.g. RECIPE_VECTOR_DIR is not writable; search still works from memory
+        logger.warning('Cannot use a similarity index in %s', ids_path.parent, exc_info=True)
+        backfill_vectors(user_id)
+        ids, matrix = load_vectors(user_id)
+        return VectorIndex(version, ids, np.frombuffer(matrix, dtype=np.float32).reshape(-1, DIMENSIONS))
+
+
+def get_index(user_id):
+    """Return the current index for a user, reusing open maps."""
+    version = versions.data_version(user_id)
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(user_id)
+            return index
+    index = open_index(user_id, version)
+    with _indexes_lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_OPEN_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def similar(recipe, k=10):
+    """Return up to k (recipe_id, score) pairs most similar to `recipe`."""
+    index = get_index(recipe.user_id)
+    position = index.position(recipe.id)
+    if position is not None:
+        query = np.asarray(index.matrix[position])
+    else:
+        query = embed(recipe.title, recipe.description)
+
+    # Vectors are unit length, so the dot product is the cosine similarity
+    scores = index.matrix @ query
+    if position is not None:
+        scores[position] = -np.inf  # Not similar to itself
+    k = min(k, len(scores) - (position is not None))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(index.ids[i]), float(scores[i])) for i in top]
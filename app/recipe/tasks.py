@@ -0,0 +1,19 @@
+"""
+Background jobs for recipes, run by `manage.py run_jobs`.
+"""
+from core import jobs, sharding
+from core.models import Recipe
+from recipe import dedupe, similarity, versions
+
+
+@jobs.task('recipe.index')
+def index_recipe(recipe_id, user_id):
+    """Store the search vector and MinHash signature of a written recipe."""
+    with sharding.for_user(user_id):
+        recipe = Recipe.objects.filter(pk=recipe_id).first()
+        if recipe is None:  # Deleted before the job ran
+            return
+        similarity.store_vector(recipe)
+        dedupe.store_signature(recipe)
+    # An index built since the recipe was saved holds its old vector
+    versions.bump(user_id)
@@ -0,0 +1,154 @@
+"""
+Tests for the recipe stats endpoint.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.management.commands.benchmark_stats import numpy_stats, python_stats
+
+STATS_URL = reverse('recipe:recipe-stats')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_recipe(user, price, time_minutes):
+    return Recipe.objects.create(
+        user=user,
+        title='Sample recipe title',
+        time_minutes=time_minutes,
+        price=Decimal(price),
+    )
+
+
+class StatsComputationTests(SimpleTestCase):
+    """Test the NumPy stats against the pure-Python reference."""
+
+    def test_matches_python_reference(self):
+        """Test both implementations agree."""
+        rows = [(Decimal('1.50'), 10), (Decimal('7.25'), 45), (Decimal('3.00'), 20),
+                (Decimal('12.00'), 90), (Decimal('3.00'), 15)]
+
+        expected = python_stats(rows, bins=4)
+        actual = numpy_stats(rows, bins=4)
+
+        self.assertEqual(actual['count'], expected['count'])
+        self.assertAlmostEqual(actual['correlation'], expected['correlation'])
+        for column in ('price', 'time_minutes'):
+            for field in ('min', 'max', 'mean', 'std'):
+                self.assertAlmostEqual(actual[column][field], expected[column][field])
+            for q, value in expected[column]['percentiles'].items():
+                self.assertAlmostEqual(actual[column]['percentiles'][q], value)
+            self.assertEqual(actual[column]['histogram']['counts'], expected[column]['counts'])
+
+    def test_empty(self):
+        """Test stats over no recipes."""
+        stats = numpy_stats([])
+
+        self.assertEqual(stats['count'], 0)
+        self.assertIsNone(stats['price'])
+        self.assertIsNone(stats['correlation'])
+
+
+class StatsApiTests(TestCase):
+    """Test the stats endpoint."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_stats_limited_to_user(self):
+        """Test stats cover only the user's recipes."""
+        create_recipe(self.user, '2.00', 10)
+        create_recipe(self.user, '4.00', 30)
+        create_recipe(self.other, '50.00', 300)
+
+        res = self.client.get(STATS_URL, {'bins': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(res.data['price']['max'], 4.0)
+        self.assertEqual(res.data['price']['histogram']['counts'], [1, 1])
+        self.assertAlmostEqual(res.data['correlation'], 1.0)
+
+    def test_stats_refreshed_after_create(self):
+        """Test cached stats are invalidated when a recipe is added."""
+        create_recipe(self.user, '2.00', 10)
+        self.assertEqual(self.client.get(STATS_URL).data['count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(RECIPES_URL, {'title': 'New', 'time_minutes': 5, 'price': '1.00'})
+
+        self.assertEqual(self.client.get(STATS_URL).data['count'], 2)
+
+    def test_stats_refreshed_after_write_outside_api(self):
+        """Test writes from the admin or commands also invalidate cached stats."""
+        recipe = create_recipe(self.user, '2.00', 10)
+        self.assertEqual(self.client.get(STATS_URL).data['count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+
+        self.assertEqual(self.client.get(STATS_URL).data['count'], 0)
+
+    @patch('core.activity.buffer.record')  # Keep last_login writes out of the count
+    def test_stats_cached(self, patched_record):
+        """Test repeated requests don't reload the columns."""
+        create_recipe(self.user, '2.00', 10)
+        self.client.get(STATS_URL)
+
+        with self.assertNumQueries(0):
+            self.client.get(STATS_URL)
+
+    def test_catalog_stats_require_staff(self):
+        """Test only staff can see stats across all users."""
+        res = self.client.get(STATS_URL, {'scope': 'all'})
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_catalog_stats_for_staff(self):
+        """Test staff see stats across all users."""
+        create_recipe(self.user, '2.00', 10)
+        create_recipe(self.other, '50.00', 300)
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(STATS_URL, {'scope': 'all'})
+
+        self.assertEqual(res.data['count'], 2)
+
+    def test_catalog_stats_skip_deleted_users(self):
+        """Test recipes of soft-deleted users are left out of catalog stats."""
+        create_recipe(self.user, '2.00', 10)
+        create_recipe(self.other, '50.00', 300)
+        create_recipe(self.other, '40.00', 200)
+        self.other.soft_delete()
+        self.user.is_staff = True
+        self.user.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(STATS_URL, {'scope': 'all'})
+
+        self.assertEqual(res.data['count'], 1)
+        self.assertEqual(res.data['price']['max'], 2.0)
+        recipe_queries = [query['sql'] for query in queries if 'core_recipe' in query['sql']]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('user_id" IN', recipe_queries[0])
+
+    def test_invalid_bins(self):
+        """Test an out of range bin count is rejected."""
+        res = self.client.get(STATS_URL, {'bins': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
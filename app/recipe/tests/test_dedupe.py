@@ -0,0 +1,138 @@
+"""
+Tests for near-duplicate recipe detection.
+"""
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Recipe, RecipeSignature
+from recipe import dedupe, feed
+
+DUPLICATES_URL = reverse('recipe:recipe-duplicates')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+SOUP = 'Simmer ripe tomatoes with basil, garlic and a splash of cream for twenty minutes.'
+
+
+def create_recipe(user, title, description=''):
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        description=description,
+        time_minutes=10,
+        price=Decimal('2.00'),
+    )
+
+
+class SignatureTests(SimpleTestCase):
+    """Test MinHash signatures and LSH banding."""
+
+    def test_similar_text_similar_signature(self):
+        """Test near-identical text agrees on most signature values."""
+        first = dedupe.signature('Tomato soup', SOUP)
+        second = dedupe.signature('Tomato Soup!', SOUP.replace('twenty', 'thirty'))
+        other = dedupe.signature('Chocolate cake', 'Bake flour, cocoa and sugar.')
+
+        self.assertEqual(first.dtype, np.uint32)
+        self.assertEqual(first.shape, (dedupe.NUM_PERM,))
+        self.assertGreater((first == second).mean(), 0.7)
+        self.assertLess((first == other).mean(), 0.1)
+
+    def test_candidate_pairs_share_a_band(self):
+        """Test only rows agreeing on a whole band become candidates."""
+        rng = np.random.RandomState(0)
+        signatures = rng.randint(0, 2 ** 32, size=(5, dedupe.NUM_PERM), dtype=np.uint64).astype(np.uint32)
+        signatures[3, :dedupe.ROWS] = signatures[1, :dedupe.ROWS]
+
+        self.assertEqual(dedupe.candidate_pairs(signatures), {(1, 3)})
+
+    def test_candidate_pairs_linear_in_bucket_size(self):
+        """Test a bucket of identical signatures links each row to its first."""
+        signatures = np.zeros((1000, dedupe.NUM_PERM), dtype=np.uint32)
+
+        pairs = dedupe.candidate_pairs(signatures)
+
+        self.assertEqual(pairs, {(0, i) for i in range(1, 1000)})
+
+
+class DuplicatesApiTests(TestCase):
+    """Test the duplicates action and command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_signature_stored_on_create(self):
+        """Test creating a recipe queues a job storing its signature."""
+        res = self.client.post(RECIPES_URL, {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'})
+        jobs.autodiscover()
+        jobs.run_pending()
+
+        self.assertTrue(RecipeSignature.objects.filter(recipe_id=res.data['id']).exists())
+
+    def test_duplicates_clustered(self):
+        """Test near-duplicates are grouped and distinct recipes left out."""
+        first = create_recipe(self.user, 'Tomato soup', SOUP)
+        second = create_recipe(self.user, 'Tomato Soup', SOUP + ' Serve hot.')
+        third = create_recipe(self.user, 'tomato soup!', SOUP)
+        create_recipe(self.user, 'Chocolate cake', 'Bake flour, cocoa and sugar.')
+        other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+        create_recipe(other, 'Tomato soup', SOUP)
+
+        res = self.client.get(DUPLICATES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data[0]['recipes']],
+            [first.id, second.id, third.id],
+        )
+
+    def test_duplicates_read_only(self):
+        """Test listing duplicates signs missing recipes in memory without storing them."""
+        create_recipe(self.user, 'Tomato soup', SOUP)
+        create_recipe(self.user, 'Tomato soup', SOUP)
+
+        res = self.client.get(DUPLICATES_URL)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertFalse(RecipeSignature.objects.exists())
+
+    def test_invalid_threshold(self):
+        """Test thresholds outside (0, 1] are rejected."""
+        res = self.client.get(DUPLICATES_URL, {'threshold': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command_merges_duplicates(self):
+        """Test --merge keeps the oldest recipe of each cluster."""
+        first = create_recipe(self.user, 'Tomato soup', SOUP)
+        create_recipe(self.user, 'Tomato Soup', SOUP)
+        out = StringIO()
+
+        call_command('find_duplicate_recipes', user=self.user.email, merge=True, stdout=out)
+
+        self.assertEqual(list(Recipe.objects.all()), [first])
+        self.assertEqual(Recipe.all_objects.filter(deleted_at__isnull=False).count(), 1)
+        self.assertIn('Found 1 clusters', out.getvalue())
+
+    def test_merge_publishes_deletes(self):
+        """Test merged recipes are announced on the owner's change feed."""
+        create_recipe(self.user, 'Tomato soup', SOUP)
+        extra = create_recipe(self.user, 'Tomato Soup', SOUP)
+
+        with patch('recipe.feed.publish_change') as publish_change:
+            call_command('find_duplicate_recipes', user=self.user.email, merge=True, stdout=StringIO())
+
+        publish_change.assert_called_once_with(extra, feed.DELETED)
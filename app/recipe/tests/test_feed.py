@@ -0,0 +1,331 @@
+"""
+Tests for the recipe change feed.
+"""
+import asyncio
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import events
+from core.models import Recipe
+from recipe import feed
+
+
+def parse(body):
+    """Return the events in a chunk of an SSE stream as dicts."""
+    parsed = []
+    for block in body.decode().strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith(':'))
+        if 'event' in fields:
+            parsed.append(fields)
+    return parsed
+
+
+@override_settings(EVENTS_REPLAY_SIZE=3, EVENTS_QUEUE_SIZE=2, EVENTS_REPLAY_CHANNELS=2)
+class BrokerTests(SimpleTestCase):
+    """Test publishing, replay and backpressure."""
+
+    def setUp(self):
+        self.broker = events.LocalBroker()
+
+    def test_delivers_to_channel_subscribers(self):
+        """Test subscribers get their channel's events in order."""
+        async def run():
+            subscription = self.broker.subscribe('a')
+            other = self.broker.subscribe('b')
+            self.broker.publish('a', 'created', {'id': 1})
+            self.broker.publish('a', 'deleted', {'id': 1})
+            first = await subscription.get(1)
+            second = await subscription.get(1)
+            missing = await other.get(0.01)
+            return first, second, missing
+
+        first, second, missing = asyncio.run(run())
+
+        self.assertEqual((first.type, json.loads(first.data)), ('created', {'id': 1}))
+        self.assertEqual(second.type, 'deleted')
+        self.assertIsNone(missing)
+
+    def test_replays_after_last_event_id(self):
+        """Test a reconnecting subscriber gets only what it missed."""
+        seen = self.broker.publish('a', 'created', {'id': 1})
+        self.broker.publish('a', 'updated', {'id': 1})
+        self.broker.publish('b', 'created', {'id': 2})
+
+        async def run():
+            subscription = self.broker.subscribe('a', seen)
+            return await subscription.get(1), await subscription.get(0.01)
+
+        replayed, rest = asyncio.run(run())
+
+        self.assertEqual(replayed.type, 'updated')
+        self.assertIsNone(rest)
+
+    def test_reset_when_replay_incomplete(self):
+        """Test a reset is sent when missed events have left the buffer."""
+        seen = self.broker.publish('a', 'created', {'id': 1})
+        for _ in range(4):  # One more than the buffer holds
+            self.broker.publish('a', 'updated', {'id': 1})
+
+        async def run(last_event_id):
+            return await self.broker.subscribe('a', last_event_id).get(1)
+
+        self.assertEqual(asyncio.run(run(seen)).type, events.RESET)
+        self.assertEqual(asyncio.run(run('1-1')).type, events.RESET)  # From another process
+
+    def test_reset_after_channel_evicted(self):
+        """Test dropping a channel's buffer doesn't lose events silently."""
+        seen = self.broker.publish('a', 'created', {'id': 1})
+        self.broker.publish('a', 'updated', {'id': 1})
+        self.broker.publish('b', 'created', {'id': 2})
+        self.broker.publish('c', 'created', {'id': 3})  # Evicts 'a'
+
+        async def run():
+            return await self.broker.subscribe('a', seen).get(1)
+
+        self.assertEqual(asyncio.run(run()).type, events.RESET)
+
+    def test_slow_subscriber_dropped(self):
+        """Test a subscriber whose queue is full is closed."""
+        async def run():
+            subscription = self.broker.subscribe('a')
+            for i in range(3):
+                self.broker.publish('a', 'created', {'id': i})
+            await asyncio.sleep(0)  # Let the deliveries run
+            return subscription, [await subscription.get(0.01) for _ in range(3)]
+
+        subscription, received = asyncio.run(run())
+
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual([event is not None for event in received], [True, True, False])
+        self.assertNotIn('a', self.broker._subscribers)
+
+    def test_publish_from_another_thread(self):
+        """Test events published from a worker thread reach the loop."""
+        async def run():
+            subscription = self.broker.subscribe('a')
+            await sync_to_async(self.broker.publish, thread_sensitive=False)('a', 'created', {})
+            return await subscription.get(1)
+
+        self.assertEqual(asyncio.run(run()).type, 'created')
+
+
+@override_settings(EVENTS_REPLAY_SIZE=3, EVENTS_POLL_INTERVAL=0.01)
+class CacheBrokerTests(SimpleTestCase):
+    """Test events passed between processes through the cache."""
+
+    def setUp(self):
+        cache.clear()
+        # Brokers of two processes sharing the cache
+        self.publisher = events.CacheBroker()
+        self.broker = events.CacheBroker()
+
+    def test_delivers_events_published_elsewhere(self):
+        """Test a subscriber gets events another process published, in order."""
+        async def run():
+            subscription = self.broker.subscribe('a')
+            self.publisher.publish('a', 'created', {'id': 1})
+            self.publisher.publish('b', 'created', {'id': 2})
+            self.publisher.publish('a', 'deleted', {'id': 1})
+            received = [await subscription.get(1), await subscription.get(1), await subscription.get(0.05)]
+            subscription.close()
+            return received
+
+        first, second, missing = asyncio.run(run())
+
+        self.assertEqual((first.type, json.loads(first.data)), ('created', {'id': 1}))
+        self.assertEqual(second.type, 'deleted')
+        self.assertIsNone(missing)
+
+    def test_replays_after_last_event_id(self):
+        """Test a subscriber reconnecting to another process gets what it missed."""
+        seen = self.publisher.publish('a', 'created', {'id': 1})
+        self.publisher.publish('a', 'updated', {'id': 1})
+
+        async def run():
+            subscription = self.broker.subscribe('a', seen)
+            received = await subscription.get(1), await subscription.get(0.05)
+            subscription.close()
+            return received
+
+        replayed, rest = asyncio.run(run())
+
+        self.assertEqual(replayed.type, 'updated')
+        self.assertIsNone(rest)
+
+    def test_reset_when_replay_incomplete(self):
+        """Test a reset is sent when missed events are no longer in the cache."""
+        seen = self.publisher.publish('a', 'created', {'id': 1})
+        for _ in range(4):  # One more than the cache keeps
+            self.publisher.publish('a', 'updated', {'id': 1})
+
+        async def run(last_event_id):
+            subscription = self.broker.subscribe('a', last_event_id)
+            subscription.close()
+            return await subscription.get(1)
+
+        self.assertEqual(asyncio.run(run(seen)).type, events.RESET)
+        self.assertEqual(asyncio.run(run('1-1')).type, events.RESET)  # From a LocalBroker
+
+    def test_reset_when_event_lost(self):
+        """Test a subscriber is reset when an event it is waiting for is evicted."""
+        async def run():
+            subscription = self.broker.subscribe('a')
+            subscription.close()  # Polled by hand below
+            lost = self.publisher.publish('a', 'created', {'id': 1})
+            cache.delete(f'events:a:{lost}')
+            self.broker.poll_once({'a': [subscription]})  # Maybe not stored yet
+            self.broker.poll_once({'a': [subscription]})
+            await asyncio.sleep(0)  # Let the delivery run
+            return await subscription.get(0.05)
+
+        self.assertEqual(asyncio.run(run()).type, events.RESET)
+
+    @override_settings(EVENTS_BROKER='')
+    def test_default_broker(self):
+        """Test events go through the cache when it is shared between processes."""
+        with patch('core.caching.is_shared', return_value=True):
+            self.assertIs(events.broker_class(), events.CacheBroker)
+        with patch('core.caching.is_shared', return_value=False):
+            self.assertIs(events.broker_class(), events.LocalBroker)
+
+
+@override_settings(EVENTS_HEARTBEAT=0.05)
+class FeedTests(TestCase):
+    """Test the SSE endpoint."""
+
+    def setUp(self):
+        cache.clear()
+        self.broker = events.LocalBroker()
+        patcher = patch('core.events._broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.token = Token.objects.create(user=self.user)
+
+    def connect(self, headers=(), query=b''):
+        return ApplicationCommunicator(feed.RecipeFeed(), {
+            'type': 'http',
+            'method': 'GET',
+            'path': feed.PATH,
+            'query_string': query,
+            'headers': list(headers),
+        })
+
+    def auth(self):
+        return (b'authorization', f'Token {self.token.key}'.encode())
+
+    async def read_events(self, communicator, count):
+        found = []
+        while len(found) < count:
+            message = await communicator.receive_output(1)
+            found.extend(parse(message.get('body', b'')))
+        return found
+
+    async def test_requires_token(self):
+        """Test the feed rejects requests without a valid token."""
+        for headers in ([], [(b'authorization', b'Token wrong')]):
+            communicator = self.connect(headers)
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output(1)
+            self.assertEqual(start['status'], 401)
+
+    async def test_streams_changes(self):
+        """Test changes to the user's recipes are pushed to the stream."""
+        communicator = self.connect([self.auth()])
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        await communicator.receive_output(1)  # retry
+
+        recipe = await sync_to_async(Recipe.objects.create)(
+            user=self.user, title='Soup', time_minutes=10, price=Decimal('2.50'),
+        )
+        await sync_to_async(feed.publish_change)(recipe, feed.CREATED)
+        await sync_to_async(feed.publish_change)(recipe, feed.DELETED)
+
+        created, deleted = await self.read_events(communicator, 2)
+        self.assertEqual(created['event'], 'created')
+        self.assertEqual(json.loads(created['data'])['title'], 'Soup')
+        self.assertEqual(json.loads(deleted['data']), {'id': recipe.pk})
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+        self.assertEqual(self.broker._subscribers, {})
+
+    async def test_heartbeat(self):
+        """Test an idle stream gets keep-alive comments."""
+        communicator = self.connect([self.auth()])
+        await communicator.send_input({'type': 'http.request'})
+        await communicator.receive_output(1)  # start
+        await communicator.receive_output(1)  # retry
+
+        heartbeat = await communicator.receive_output(1)
+
+        self.assertEqual(heartbeat['body'], b': heartbeat\n\n')
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+
+    async def test_resume_with_last_event_id(self):
+        """Test a reconnecting client gets the events it missed."""
+        seen = self.broker.publish(feed.channel(self.user.pk), 'created', {'id': 1})
+        self.broker.publish(feed.channel(self.user.pk), 'updated', {'id': 1})
+        self.broker.publish(feed.channel(self.user.pk + 1), 'created', {'id': 2})
+
+        communicator = self.connect(query=f'token={self.token.key}&last_event_id={seen}'.encode())
+        await communicator.send_input({'type': 'http.request'})
+        await communicator.receive_output(1)  # start
+
+        (replayed,) = await self.read_events(communicator, 1)
+
+        self.assertEqual(replayed['event'], 'updated')
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+
+
+class WsgiFeedTests(TestCase):
+    """Test the feed's path when Django serves it."""
+
+    def test_unavailable_over_wsgi(self):
+        """Test the path explains the feed needs ASGI instead of a bare 404."""
+        res = APIClient().get(feed.PATH)
+
+        self.assertEqual(res.status_code, 501)
+        self.assertIn('ASGI', res.json()['detail'])
+
+
+class PublishTests(TestCase):
+    """Test the recipe API publishes its changes."""
+
+    def setUp(self):
+        self.broker = events.LocalBroker()
+        patcher = patch('core.events._broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def published(self):
+        return [event.type for _sequence, event in self.broker._buffers[feed.channel(self.user.pk)][1]]
+
+    def test_create_update_delete(self):
+        """Test each write to a recipe is published to its owner's channel."""
+        res = self.client.post(reverse('recipe:recipe-list'), {
+            'title': 'Soup', 'time_minutes': 10, 'price': '2.50',
+        })
+        url = reverse('recipe:recipe-detail', args=[res.data['id']])
+        self.client.patch(url, {'title': 'Stew'})
+        self.client.delete(url)
+
+        self.assertEqual(self.published(), [feed.CREATED, feed.UPDATED, feed.DELETED])
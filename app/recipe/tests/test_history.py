@@ -0,0 +1,137 @@
+"""
+Tests for recipe change history.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeRevision
+from recipe import history
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def history_url(recipe_id):
+    return reverse('recipe:recipe-history', args=[recipe_id])
+
+
+def version_url(recipe_id):
+    return reverse('recipe:recipe-version', args=[recipe_id])
+
+
+class RecipeHistoryApiTests(TestCase):
+    """Test revisions are recorded and rebuilt through the API."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Soup', 'time_minutes': 10, 'price': '2.50', 'description': 'Hot',
+        })
+        self.recipe_id = res.data['id']
+
+    def test_update_stores_only_changed_fields(self):
+        """Test each update appends a delta of the fields that changed."""
+        self.client.patch(detail_url(self.recipe_id), {'title': 'Tomato soup'})
+        self.client.patch(detail_url(self.recipe_id), {'price': '3.00'})
+        self.client.patch(detail_url(self.recipe_id), {'price': '3.00'})  # No change
+
+        res = self.client.get(history_url(self.recipe_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([revision['number'] for revision in res.data], [1, 2, 3])
+        self.assertTrue(res.data[0]['is_checkpoint'])
+        self.assertEqual(res.data[0]['changes']['title'], 'Soup')
+        self.assertEqual(res.data[1]['changes'], {'title': 'Tomato soup'})
+        self.assertEqual(res.data[2]['changes'], {'price': '3.00'})
+
+    def test_rebuild_past_version(self):
+        """Test a past version is rebuilt by folding deltas."""
+        self.client.patch(detail_url(self.recipe_id), {'title': 'Tomato soup'})
+        self.client.patch(detail_url(self.recipe_id), {'price': '3.00'})
+
+        res = self.client.get(version_url(self.recipe_id), {'number': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Tomato soup')
+        self.assertEqual(res.data['price'], '2.50')
+        self.assertEqual(res.data['description'], 'Hot')
+
+    def test_missing_revision(self):
+        """Test an unknown revision number returns 404."""
+        res = self.client.get(version_url(self.recipe_id), {'number': 9})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_other_users_history_hidden(self):
+        """Test a user cannot read another user's recipe history."""
+        other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+        self.client.force_authenticate(other)
+
+        res = self.client.get(history_url(self.recipe_id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_recipe_without_history_gets_base(self):
+        """Test updating a recipe created before history keeps its old state."""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Old', time_minutes=5, price=Decimal('1.00'),
+        )
+
+        self.client.patch(detail_url(recipe.id), {'title': 'New'})
+
+        self.assertEqual(history.rebuild(recipe.id, 1)['title'], 'Old')
+        self.assertEqual(history.rebuild(recipe.id, 2)['title'], 'New')
+
+
+class CompactHistoryTests(TestCase):
+    """Test collapsing old deltas into checkpoints."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='v1', time_minutes=5, price=Decimal('1.00'),
+        )
+        history.record_revision(self.recipe, self.user)
+        for version in range(2, 13):
+            previous = history.snapshot(self.recipe)
+            self.recipe.title = f'v{version}'
+            self.recipe.save()
+            history.record_revision(self.recipe, self.user, previous)
+
+    def test_compact_keeps_periodic_checkpoints(self):
+        """Test old deltas collapse while versions stay rebuildable."""
+        RecipeRevision.objects.filter(number__lte=10).update(
+            created_at=timezone.now() - timedelta(days=100),
+        )
+        out = StringIO()
+
+        call_command('compact_recipe_history', every=5, stdout=out)
+
+        revisions = RecipeRevision.objects.filter(recipe=self.recipe)
+        self.assertEqual(list(revisions.values_list('number', flat=True)), [5, 10, 11, 12])
+        self.assertTrue(revisions.get(number=5).is_checkpoint)
+        self.assertEqual(history.rebuild(self.recipe.id, 5)['title'], 'v5')
+        self.assertEqual(history.rebuild(self.recipe.id, 12)['title'], 'v12')
+        self.assertIsNone(history.rebuild(self.recipe.id, 3))
+        self.assertIn('Removed 8 revisions', out.getvalue())
+
+    def test_compact_recent_untouched(self):
+        """Test revisions newer than the cutoff are left alone."""
+        call_command('compact_recipe_history', stdout=StringIO())
+
+        self.assertEqual(RecipeRevision.objects.filter(recipe=self.recipe).count(), 12)
@@ -0,0 +1,165 @@
+"""
+Tests for the meal-plan optimizer.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import mealplan
+from recipe.management.commands.benchmark_mealplan import brute_force
+
+MEAL_PLAN_URL = reverse('recipe:recipe-meal-plan')
+
+
+class SolverTests(SimpleTestCase):
+    """Test the solver against exhaustive search."""
+
+    def test_matches_brute_force(self):
+        """Test the best plans and their order match every-combination search."""
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            n = int(rng.integers(4, 11))
+            count = int(rng.integers(1, 5))
+            cents = rng.integers(100, 2000, n)
+            minutes = rng.integers(5, 120, n)
+            budget, max_minutes = int(rng.integers(500, 5000)), int(rng.integers(30, 300))
+            weight = float(rng.random())
+
+            result = mealplan.plan_meals(
+                np.arange(n), cents, minutes, count, budget, max_minutes,
+                weight=weight, alternatives=3, time_limit=10,
+            )
+
+            expected = brute_force(cents, minutes, count, budget, max_minutes, weight=weight, alternatives=3)
+            self.assertTrue(result['optimal'])
+            self.assertEqual(len(result['plans']), len(expected))
+            for plan, (cost, _positions) in zip(result['plans'], expected):
+                self.assertAlmostEqual(plan['cost'], cost, places=5)
+
+    def test_totals(self):
+        """Test a plan reports its recipes, price and time."""
+        result = mealplan.plan_meals(
+            np.array([10, 20, 30]), np.array([500, 250, 900]), np.array([30, 60, 10]), 2, 1000, 90,
+        )
+
+        best = result['plans'][0]
+        self.assertEqual(sorted(best['recipes']), [10, 20])
+        self.assertEqual(best['total_price'], '7.50')
+        self.assertEqual(best['total_minutes'], 90)
+
+    def test_infeasible(self):
+        """Test no plans are returned when nothing fits."""
+        result = mealplan.plan_meals(np.array([1, 2]), np.array([500, 600]), np.array([10, 10]), 2, 1000, 60)
+
+        self.assertEqual(result, {'optimal': True, 'plans': []})
+
+    def test_budgets_beyond_int64(self):
+        """Test budgets too large for int64 fit every plan instead of overflowing."""
+        result = mealplan.plan_meals(
+            np.array([10, 20, 30]), np.array([500, 250, 900]), np.array([30, 60, 10]), 2, 10 ** 22, 10 ** 40,
+        )
+
+        self.assertEqual(len(result['plans']), 3)
+        self.assertEqual(sorted(result['plans'][0]['recipes']), [10, 20])
+
+    def test_time_limit(self):
+        """Test a search cut short keeps its plans but isn't marked optimal."""
+        rng = np.random.default_rng(0)
+        n = 5000
+        cents = rng.integers(100, 3000, n)
+        minutes = (3200 - cents) // 15 + rng.integers(0, 20, n)
+
+        result = mealplan.plan_meals(np.arange(n), cents, minutes, 7, 6000, 1100, time_limit=0.001)
+
+        self.assertFalse(result['optimal'])
+        for plan in result['plans']:
+            self.assertLessEqual(Decimal(plan['total_price']), 60)
+            self.assertLessEqual(plan['total_minutes'], 1100)
+
+
+class MealPlanApiTests(TestCase):
+    """Test the meal-plan endpoint."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, title, price, time_minutes, user=None):
+        return Recipe.objects.create(
+            user=user or self.user, title=title, price=Decimal(price), time_minutes=time_minutes,
+        )
+
+    def test_best_plan_and_runners_up(self):
+        """Test the best plan comes first and every plan fits the budget."""
+        quick = self.create_recipe('Quick', '8.00', 10)
+        cheap = self.create_recipe('Cheap', '2.00', 50)
+        self.create_recipe('Pricey', '15.00', 20)
+        self.create_recipe('Slow', '3.00', 120)
+        other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+        self.create_recipe('Free', '0.00', 0, user=other)
+
+        res = self.client.get(MEAL_PLAN_URL, {'count': 2, 'budget': '20', 'max_minutes': 150})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['optimal'])
+        best = res.data['plans'][0]
+        self.assertEqual({recipe['id'] for recipe in best['recipes']}, {quick.id, cheap.id})
+        self.assertEqual(best['total_price'], '10.00')
+        costs = [plan['cost'] for plan in res.data['plans']]
+        self.assertEqual(costs, sorted(costs))
+        for plan in res.data['plans']:
+            self.assertLessEqual(Decimal(plan['total_price']), 20)
+            self.assertLessEqual(plan['total_minutes'], 150)
+            self.assertNotIn('Free', [recipe['title'] for recipe in plan['recipes']])
+
+    def test_new_recipe_included(self):
+        """Test cached columns are refreshed when a recipe is added."""
+        self.create_recipe('Slow', '3.00', 120)
+        self.client.get(MEAL_PLAN_URL, {'count': 1, 'budget': '5', 'max_minutes': 60})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('recipe:recipe-list'), {'title': 'Quick', 'price': '4.00', 'time_minutes': 5})
+        res = self.client.get(MEAL_PLAN_URL, {'count': 1, 'budget': '5', 'max_minutes': 60})
+
+        self.assertEqual(res.data['plans'][0]['recipes'][0]['title'], 'Quick')
+
+    def test_stale_columns_solved_again(self):
+        """Test a recipe deleted behind the cached columns' back isn't planned."""
+        quick = self.create_recipe('Quick', '4.00', 5)
+        slow = self.create_recipe('Slow', '3.00', 40)
+        self.client.get(MEAL_PLAN_URL, {'count': 1, 'budget': '5', 'max_minutes': 60})
+        # Like a delete in another process whose version bump this one hasn't seen
+        Recipe.objects.filter(pk=quick.pk).update(deleted_at=timezone.now())
+
+        res = self.client.get(MEAL_PLAN_URL, {'count': 1, 'budget': '5', 'max_minutes': 60})
+
+        self.assertEqual([plan['recipes'][0]['id'] for plan in res.data['plans']], [slow.id])
+        self.assertEqual(res.data['plans'][0]['total_price'], '3.00')
+
+    def test_huge_budget(self):
+        """Test a budget far above every recipe's price is accepted."""
+        self.create_recipe('Quick', '8.00', 10)
+        self.create_recipe('Cheap', '2.00', 50)
+
+        res = self.client.get(MEAL_PLAN_URL, {'count': 2, 'budget': '1e20', 'max_minutes': 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['plans'][0]['total_price'], '10.00')
+
+    def test_invalid_params(self):
+        """Test missing or out-of-range parameters are rejected."""
+        res = self.client.get(MEAL_PLAN_URL, {'count': 0, 'budget': 'abc', 'weight': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(res.data), {'count', 'budget', 'max_minutes', 'weight'})
@@ -60,13 +60,17 @@ class PublicRecipeAPITests(TestCase):
 class PrivateRecipeApiTests(TestCase):
     """Test authenticated API requests."""
 
-    def setUp(self):
-        # Set up an API client and a user to authenticate the client
-        self.client = APIClient()
-        self.user = get_user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        # Create the user once for the class; Django restores it for each test
+        cls.user = get_user_model().objects.create_user(
             'user@example.com',
             'testpass123',
         )
+
+    def setUp(self):
+        # Set up an API client and authenticate it as the user
+        self.client = APIClient()
         # Force authentication for the API client with the created user
         self.client.force_authenticate(self.user)
 
@@ -151,4 +155,16 @@ class PrivateRecipeApiTests(TestCase):
             self.assertEqual(getattr(recipe, k), v)
 
         # Assert that the user associated with the recipe is the same as the authenticated user who created it
-        self.assertEqual(recipe.user, self.user)
\ No newline at end of file
+        self.assertEqual(recipe.user, self.user)
+
+    def test_delete_recipe(self):
+        """Test deleting a recipe hides it without removing the row."""
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.delete(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
+        self.assertTrue(Recipe.all_objects.filter(id=recipe.id).exists())
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
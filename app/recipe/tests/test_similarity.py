@@ -0,0 +1,166 @@
+"""
+Tests for similar-recipe search.
+"""
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Recipe, RecipeVector
+from recipe import similarity
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def similar_url(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+class EmbedTests(SimpleTestCase):
+    """Test the hashed text embedding."""
+
+    def test_embedding_normalised(self):
+        """Test vectors are float32 with unit length."""
+        vector = similarity.embed('Tomato soup', 'Blend tomatoes and basil.')
+
+        self.assertEqual(vector.dtype, np.float32)
+        self.assertEqual(vector.shape, (similarity.DIMENSIONS,))
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=5)
+
+    def test_embedding_deterministic(self):
+        """Test the same text always gives the same vector."""
+        np.testing.assert_array_equal(
+            similarity.embed('Tomato soup'), similarity.embed('TOMATO  soup!'),
+        )
+
+    def test_empty_text(self):
+        """Test text without words embeds to zeros."""
+        self.assertFalse(similarity.embed('', '').any())
+
+
+class SimilarApiTests(TestCase):
+    """Test the similar recipes action."""
+
+    def setUp(self):
+        cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(RECIPE_VECTOR_DIR=self.tmpdir.name)
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def create(self, title, description=''):
+        res = self.client.post(RECIPES_URL, {
+            'title': title,
+            'description': description,
+            'time_minutes': 10,
+            'price': Decimal('2.00'),
+        })
+        return res.data['id']
+
+    def test_vector_stored_on_create(self):
+        """Test creating a recipe queues a job storing its vector."""
+        recipe_id = self.create('Tomato soup')
+        self.assertFalse(RecipeVector.objects.filter(recipe_id=recipe_id).exists())
+
+        jobs.autodiscover()
+        jobs.run_pending()
+
+        vector = RecipeVector.objects.get(recipe_id=recipe_id)
+        np.testing.assert_array_equal(
+            np.frombuffer(vector.vector, dtype=np.float32), similarity.embed('Tomato soup'),
+        )
+
+    def test_similar_recipes_ranked(self):
+        """Test the closest recipes come first and the recipe itself is left out."""
+        soup = self.create('Tomato soup', 'Simmer tomatoes with basil')
+        close = self.create('Roast tomato soup', 'Roast tomatoes then simmer with basil')
+        self.create('Chocolate cake', 'Bake flour, sugar and cocoa')
+        other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+        Recipe.objects.create(user=other, title='Tomato soup', time_minutes=5, price=Decimal('1.00'))
+
+        res = self.client.get(similar_url(soup), {'k': 5})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data]
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(ids[0], close)
+        self.assertGreater(res.data[0]['score'], res.data[1]['score'])
+
+    def test_index_follows_updates(self):
+        """Test edits are reflected in later searches."""
+        soup = self.create('Tomato soup')
+        cake = self.create('Chocolate cake')
+        self.create('Lemon tart')
+        self.client.get(similar_url(soup))
+
+        self.client.patch(reverse('recipe:recipe-detail', args=[cake]), {'title': 'Tomato soup'})
+        jobs.autodiscover()
+        jobs.run_pending()
+        res = self.client.get(similar_url(soup))
+
+        self.assertEqual(res.data[0]['id'], cake)
+        self.assertAlmostEqual(res.data[0]['score'], 1.0, places=3)
+
+    def test_recipes_without_vectors_backfilled(self):
+        """Test recipes created outside the API are still indexed."""
+        soup = Recipe.objects.create(user=self.user, title='Tomato soup', time_minutes=5, price=Decimal('1.00'))
+        stew = Recipe.objects.create(user=self.user, title='Tomato stew', time_minutes=5, price=Decimal('1.00'))
+
+        res = self.client.get(similar_url(soup.id))
+
+        self.assertEqual([recipe['id'] for recipe in res.data], [stew.id])
+
+    def test_recent_index_files_kept(self):
+        """Test a rebuild leaves files other processes may still open."""
+        soup = Recipe.objects.create(user=self.user, title='Tomato soup', time_minutes=5, price=Decimal('1.00'))
+        similarity.build_index(self.user.id, 1)
+        old_ids, old_matrix = similarity.index_paths(self.user.id, 1)
+        similarity.build_index(self.user.id, 2)
+        self.assertTrue(old_matrix.exists())
+
+        stale = time.time() - similarity.INDEX_GRACE_PERIOD - 1
+        for path in (old_ids, old_matrix):
+            os.utime(path, (stale, stale))
+        similarity.build_index(self.user.id, 3)
+
+        self.assertFalse(old_matrix.exists())
+        self.assertEqual(list(similarity.open_index(self.user.id, 3).ids), [soup.id])
+
+    def test_index_removed_before_load_rebuilt(self):
+        """Test a file cleaned up by another process is built again."""
+        soup = Recipe.objects.create(user=self.user, title='Tomato soup', time_minutes=5, price=Decimal('1.00'))
+        similarity.build_index(self.user.id, 1)
+        ids_path, _matrix_path = similarity.index_paths(self.user.id, 1)
+        ids_path.unlink()
+
+        self.assertEqual(list(similarity.open_index(self.user.id, 1).ids), [soup.id])
+
+    def test_unwritable_vector_dir(self):
+        """Test search still works when the index can't be written."""
+        soup = Recipe.objects.create(user=self.user, title='Tomato soup', time_minutes=5, price=Decimal('1.00'))
+        stew = Recipe.objects.create(user=self.user, title='Tomato stew', time_minutes=5, price=Decimal('1.00'))
+        blocker = os.path.join(self.tmpdir.name, 'file')
+        open(blocker, 'w').close()
+
+        with override_settings(RECIPE_VECTOR_DIR=os.path.join(blocker, 'vectors')), \
+                self.assertLogs('recipe.similarity', 'WARNING'):
+            res = self.client.get(similar_url(soup.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in res.data], [stew.id])
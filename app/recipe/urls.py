@@ -8,6 +8,7 @@ from django.urls import (
 
 from rest_framework.routers import DefaultRouter  # Importing DefaultRouter to automatically generate URL patterns for the ViewSet
 
+from recipe import feed  # Importing the change feed for its WSGI fallback
 from recipe import views  # Importing the views module from the recipe app
 
 
@@ -28,4 +29,5 @@ app_name = 'recipe'
 # The include function includes the URLs generated by the router
 urlpatterns = [
     path('', include(router.urls)),  # Include all URLs provided by the router under the root path
+    path('events/', feed.unavailable, name='events'),  # Served by app.asgi; only reached over WSGI
 ]
\ No newline at end of file
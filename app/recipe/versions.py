@@ -0,0 +1,44 @@
+"""
+Versions of users' recipe data, for caches derived from it.
+
+Stats, meal-plan columns and similarity indexes are cached under the
+data version of their scope: a user's id, or CATALOG for every user's
+recipes. recipe.signals bumps the versions whenever a recipe is saved
+or deleted, whether by the API, the admin or a management command.
+
+Versions live in the default cache. When that cache is per process
+(LocMem), other processes never see a bump, so versions there expire
+after LOCAL_TIMEOUT seconds and whatever is keyed on them is rebuilt at
+least that often.
+"""
+import time
+
+from django.core.cache import cache
+
+from core import caching
+
+# Scope covering every user's recipes, used for the staff-only catalog stats
+CATALOG = 'all'
+
+LOCAL_TIMEOUT = 10  # Seconds
+
+
+def version_key(scope):
+    return f'recipe-data-version:{scope}'
+
+
+def data_version(scope):
+    """Return the current version of a scope's recipe data."""
+    # Versions start from the clock so an evicted counter can't come back
+    # to a value that older cached data was stored under
+    timeout = None if caching.is_shared() else LOCAL_TIMEOUT
+    return cache.get_or_set(version_key(scope), time.time_ns, timeout)
+
+
+def bump(*scopes):
+    """Make data cached under the current versions of `scopes` stale."""
+    for scope in scopes:
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:  # Not cached; the next read starts a new version
+            pass
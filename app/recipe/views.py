@@ -1,12 +1,32 @@
 """
 Views for the recipe APIs
 """
+import functools  # Importing functools to defer loading the deleted users for catalog stats
+from decimal import Decimal  # Importing Decimal to read meal-plan budgets exactly
+
+from django.conf import settings  # Importing settings for the list of recipe shards
+from django.contrib.auth import get_user_model  # Importing get_user_model to find soft-deleted users
+from django.http import Http404  # Importing Http404 for revisions that do not exist
+
 from rest_framework import viewsets  # Importing viewsets from Django REST Framework, which provide CRUD operations
-from rest_framework.authentication import TokenAuthentication  # Importing TokenAuthentication for securing API endpoints
+from rest_framework.decorators import action  # Importing action to add extra endpoints to the viewset
+from rest_framework.exceptions import PermissionDenied, ValidationError  # Importing errors for invalid stats requests
+from rest_framework.response import Response  # Importing Response to return the stats
 from rest_framework.permissions import IsAuthenticated  # Importing IsAuthenticated to restrict access to authenticated users
 
+from core import jobs  # Importing the job queue for work done after the response
+from core import sharding  # Importing the placement of recipes on shards, and shard transactions
 from core.models import Recipe  # Importing the Recipe model from the core app
+from recipe import feed  # Importing the change feed to notify the user's other clients
+from recipe import history  # Importing the recipe change history
 from recipe import serializers  # Importing the serializers module from the recipe app
+from user.authentication import (  # Importing authentication served from the user cache
+    CachedTokenAuthentication,  # Opaque DRF tokens
+    SignedTokenAuthentication,  # Signed access tokens
+)
+
+# analytics, dedupe, mealplan and similarity load NumPy, so they are imported
+# by the methods that use them rather than when a worker starts
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -19,11 +39,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
 
     # Specify the authentication classes that will be used to authenticate users
-    authentication_classes = [TokenAuthentication]
+    # Both resolve the user through user.cache, which reads the primary on a miss,
+    # so a token created moments ago works even while the replicas lag
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
 
     # Specify the permission classes that will be used to restrict access to authenticated users only
     permission_classes = [IsAuthenticated]
 
+    def initial(self, request, *args, **kwargs):
+        """Route this request's recipe queries to the user's shard."""
+        super().initial(request, *args, **kwargs)  # Authenticates the user
+        self.shard_context = sharding.for_user(request.user.pk)
+        self.shard_context.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Leave the user's shard once the response is ready."""
+        shard_context = getattr(self, 'shard_context', None)
+        if shard_context is not None:
+            self.shard_context = None
+            shard_context.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
     def get_queryset(self):
         """Retrieve recipes for the authenticated user."""
         # Override the default queryset to filter recipes by the authenticated user
@@ -44,4 +80,184 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer): # This is a function that is called when we create an object
         
         """Create a new recipe."""
-        serializer.save(user=self.request.user) # Assign the authenticated user to the recipe being created
\ No newline at end of file
+        with sharding.atomic():
+            recipe = serializer.save(user=self.request.user) # Assign the authenticated user to the recipe being created
+            history.record_revision(recipe, self.request.user)
+        # recipe.tasks computes the search vector and MinHash signature in a job worker
+        jobs.enqueue('recipe.index', recipe_id=recipe.pk, user_id=recipe.user_id)
+        feed.publish_change(recipe, feed.CREATED)
+
+    def perform_update(self, serializer):
+        """Update a recipe and append the changed fields to its history."""
+        with sharding.atomic():
+            previous = history.lock_state(serializer.instance.pk)
+            recipe = serializer.save()
+            history.record_revision(recipe, self.request.user, previous)
+        # recipe.tasks computes the search vector and MinHash signature in a job worker
+        jobs.enqueue('recipe.index', recipe_id=recipe.pk, user_id=recipe.user_id)
+        feed.publish_change(recipe, feed.UPDATED)
+
+    def perform_destroy(self, instance):
+        """Soft-delete the recipe; purge_deleted removes it later."""
+        instance.soft_delete()
+        feed.publish_change(instance, feed.DELETED)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Price and time histograms, percentiles and correlation."""
+        from recipe import analytics
+
+        try:
+            bins = int(request.query_params.get('bins', analytics.DEFAULT_BINS))
+        except ValueError:
+            raise ValidationError({'bins': 'Must be an integer.'})
+        if not 1 <= bins <= analytics.MAX_BINS:
+            raise ValidationError({'bins': f'Must be between 1 and {analytics.MAX_BINS}.'})
+
+        # ?scope=all covers every user's recipes and is limited to staff
+        if request.query_params.get('scope') == analytics.CATALOG:
+            if not request.user.is_staff:
+                raise PermissionDenied()
+            scope = analytics.CATALOG
+            # Users live on the primary only, so recipes of deleted users are
+            # dropped while the shards' rows are read
+            querysets = [Recipe.objects.using(alias) for alias in settings.RECIPE_SHARDS]
+            exclude_users = functools.partial(analytics.deleted_user_ids, get_user_model().all_objects)
+        else:
+            scope = request.user.pk
+            querysets = [self.get_queryset()]
+            exclude_users = None
+
+        return Response(analytics.get_stats(querysets, scope, bins=bins, exclude_users=exclude_users))
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """List the user's recipes most similar to this one."""
+        from recipe import similarity
+
+        recipe = self.get_object()
+        try:
+            k = min(int(request.query_params.get('k', 10)), 100)
+        except ValueError:
+            raise ValidationError({'k': 'Must be an integer.'})
+
+        matches = similarity.similar(recipe, k=k)
+        recipes = self.get_queryset().in_bulk([recipe_id for recipe_id, _score in matches])
+        results = []
+        for recipe_id, score in matches:
+            if recipe_id in recipes:  # Skips recipes deleted since the index was built
+                data = serializers.RecipeSerializer(recipes[recipe_id]).data
+                data['score'] = round(score, 4)
+                results.append(data)
+        return Response(results)
+
+    @action(detail=False, methods=['get'])
+    def duplicates(self, request):
+        """Group the user's near-duplicate recipes for review."""
+        from recipe import dedupe
+
+        try:
+            threshold = float(request.query_params.get('threshold', dedupe.DEFAULT_THRESHOLD))
+        except ValueError:
+            raise ValidationError({'threshold': 'Must be a number.'})
+        if not 0 < threshold <= 1:
+            raise ValidationError({'threshold': 'Must be between 0 and 1.'})
+
+        clusters = dedupe.find_clusters(request.user.pk, threshold=threshold)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for cluster in clusters for recipe_id in cluster['recipes']]
+        )
+        return Response([
+            {
+                'similarity': cluster['similarity'],
+                'recipes': serializers.RecipeSerializer(
+                    [recipes[recipe_id] for recipe_id in cluster['recipes'] if recipe_id in recipes],
+                    many=True,
+                ).data,
+            }
+            for cluster in clusters
+        ])
+
+    @action(detail=False, methods=['get'], url_path='meal-plan')
+    def meal_plan(self, request):
+        """Pick ?count= recipes within ?budget= and ?max_minutes=, with runners-up."""
+        from recipe import mealplan
+
+        params = request.query_params
+        errors = {}
+        try:
+            count = int(params.get('count', ''))
+            if not 1 <= count <= mealplan.MAX_COUNT:
+                raise ValueError
+        except ValueError:
+            errors['count'] = f'Must be an integer between 1 and {mealplan.MAX_COUNT}.'
+        try:
+            budget = Decimal(params.get('budget', ''))
+            if not budget.is_finite() or budget < 0:
+                raise ValueError
+        except (ArithmeticError, ValueError):
+            errors['budget'] = 'Must be a non-negative amount.'
+        try:
+            max_minutes = int(params.get('max_minutes', ''))
+            if max_minutes < 0:
+                raise ValueError
+        except ValueError:
+            errors['max_minutes'] = 'Must be a non-negative integer.'
+        try:
+            weight = float(params.get('weight', 0.5))
+            if not 0 <= weight <= 1:
+                raise ValueError
+        except ValueError:
+            errors['weight'] = 'Must be between 0 and 1.'
+        try:
+            alternatives = int(params.get('alternatives', mealplan.DEFAULT_ALTERNATIVES))
+            if not 1 <= alternatives <= mealplan.MAX_ALTERNATIVES:
+                raise ValueError
+        except ValueError:
+            errors['alternatives'] = f'Must be an integer between 1 and {mealplan.MAX_ALTERNATIVES}.'
+        if errors:
+            raise ValidationError(errors)
+
+        # Cached columns can lag behind a delete made by another process, so
+        # plans naming a missing recipe are solved again from the database
+        for refresh in (False, True):
+            ids, cents, minutes = mealplan.get_columns(self.get_queryset(), request.user.pk, refresh=refresh)
+            result = mealplan.plan_meals(
+                ids, cents, minutes, count, int(budget * 100), max_minutes,
+                weight=weight, alternatives=alternatives,
+            )
+            planned = {recipe_id for plan in result['plans'] for recipe_id in plan['recipes']}
+            recipes = self.get_queryset().in_bulk(planned)
+            if len(recipes) == len(planned):
+                break
+        # A recipe deleted while the plans were solved again leaves its plans out
+        result['plans'] = [
+            plan for plan in result['plans']
+            if all(recipe_id in recipes for recipe_id in plan['recipes'])
+        ]
+        for plan in result['plans']:
+            plan['recipes'] = serializers.RecipeSerializer(
+                [recipes[recipe_id] for recipe_id in plan['recipes']], many=True,
+            ).data
+        return Response(result)
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """List the recipe's revisions, oldest first."""
+        recipe = self.get_object()
+        return Response(
+            serializers.RecipeRevisionSerializer(recipe.revisions.order_by('number'), many=True).data
+        )
+
+    @action(detail=True, methods=['get'])
+    def version(self, request, pk=None):
+        """Rebuild the recipe as it was at revision ?number=."""
+        recipe = self.get_object()
+        try:
+            number = int(request.query_params['number'])
+        except (KeyError, ValueError):
+            raise ValidationError({'number': 'A revision number is required.'})
+        state = history.rebuild(recipe.pk, number)
+        if state is None:
+            raise Http404
+        return Response({'id': recipe.pk, 'number': number, **state})
@@ -1,6 +1,11 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
 
 
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user'
+
+    def ready(self):
+        from user import signals  # noqa: F401 - connects the cache invalidation handlers
+        if apps.is_installed('drf_spectacular'):
+            from user import schema  # noqa: F401 - registers the signed token scheme
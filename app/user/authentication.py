@@ -0,0 +1,82 @@
+"""
+Authentication backed by the user cache.
+"""
+from django.contrib.auth import SESSION_KEY
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+
+from user import cache, tokens
+
+
+class CachedTokenAuthentication(authentication.TokenAuthentication):
+    """Token authentication that resolves tokens and users from user.cache."""
+
+    def authenticate_credentials(self, key):
+        user_id = cache.user_id_for_token(key)
+        entry = user_id and cache.get_entry(user_id)
+        if not entry:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        user = cache.build_user(entry['fields'])
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, key)
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """Authentication with a signed access token from user.tokens.
+
+    Clients send `Authorization: Bearer <token>`. The token is checked
+    without any query; the user and their current token version come
+    from user.cache, so a revocation in another process is seen within
+    PROFILE_CACHE_L1_TTL seconds.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        return self.authenticate_credentials(token)
+
+    def authenticate_credentials(self, token):
+        claims = tokens.verify(token, tokens.ACCESS)
+        entry = claims and cache.get_entry(claims[0])
+        # A bumped version means the token was revoked. Entries cached before
+        # the field existed lack it, and every user was still at version 0
+        if not entry or entry['fields'].get('token_version', 0) != claims[1]:
+            raise exceptions.AuthenticationFailed(_('Invalid or expired token.'))
+
+        user = cache.build_user(entry['fields'])
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, token)
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+def credential_user_id(request):
+    """Return the id of the user whose credential a request carries, or None.
+
+    Used to route the request's reads before authentication runs; the
+    credential is not checked for revocation or an inactive user here.
+    """
+    auth = authentication.get_authorization_header(request).split()
+    if len(auth) == 2:
+        keyword, credential = auth[0].lower(), auth[1].decode('latin-1')
+        if keyword == SignedTokenAuthentication.keyword.lower().encode():
+            claims = tokens.verify(credential, tokens.ACCESS)
+            return claims and claims[0]
+        if keyword == CachedTokenAuthentication.keyword.lower().encode():
+            return cache.user_id_for_token(credential)
+        return None
+    session = getattr(request, 'session', None)
+    return session.get(SESSION_KEY) if session is not None else None
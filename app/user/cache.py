@@ -0,0 +1,185 @@
+"""
+Two-tier cache of authenticated users and their /me profile.
+
+Each process keeps a small LRU (L1) of entries for PROFILE_CACHE_L1_TTL
+seconds in front of Django's default cache (L2). An entry holds the
+fields needed to authenticate the user and the serialized profile, and
+is stamped with the user's version. Saving a user bumps the version
+key in the shared cache, which makes every process's L2 entry stale at
+once; L1 entries are dropped in the process that saved and expire
+elsewhere within the TTL. The bump is repeated once the save commits,
+since another process could read the old row before then and store it
+under the new version.
+
+This relies on L2 being shared. A per-process cache (LocMem) never sees
+another process's bump, so it would keep a deactivated user or a
+deleted token working for PROFILE_CACHE_TIMEOUT. Nothing is stored in
+L2 then, and the L1 TTL bounds the staleness on its own.
+
+API tokens map to user ids through the same two tiers, so a request
+from a cached user makes no database queries at all. Misses are read
+from the primary: a replica that hasn't caught up would reject a token
+or user created moments ago.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+from core import caching, metrics
+from core.routers import PRIMARY_DATABASE
+
+# Loaded into the cached User instances; anything else (e.g. the password)
+# is deferred and fetched from the database if a caller touches it
+AUTH_FIELDS = ('id', 'email', 'name', 'is_active', 'is_staff', 'is_superuser', 'token_version')
+
+
+class LRUCache:
+    """Thread-safe, size-bounded, per-process cache with a fixed TTL."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local = LRUCache(settings.PROFILE_CACHE_L1_SIZE, settings.PROFILE_CACHE_L1_TTL)
+
+
+def version_key(user_id):
+    return f'user-profile-version:{user_id}'
+
+
+def entry_key(user_id):
+    return f'user-profile:{user_id}'
+
+
+def token_key(key):
+    # Raw tokens are credentials; keep them out of cache keys
+    return f'user-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def l2_timeout():
+    """Return the seconds entries are kept in L2; 0 (not kept) if it isn't shared."""
+    return settings.PROFILE_CACHE_TIMEOUT if caching.is_shared() else 0
+
+
+def _load(user_id, version):
+    """Build a cache entry from the database, or None if the user is gone."""
+    from user.serializers import UserSerializer
+
+    values = get_user_model().objects.using(PRIMARY_DATABASE).filter(pk=user_id).values_list(*AUTH_FIELDS).first()
+    if values is None:
+        return None
+    fields = dict(zip(AUTH_FIELDS, values))
+    return {
+        'version': version,
+        'fields': fields,
+        'profile': UserSerializer(build_user(fields)).data,
+    }
+
+
+def get_entry(user_id):
+    """Return the cached entry for a user, loading it on a miss."""
+    entry = local.get(('user', user_id))
+    metrics.record_cache('user-l1', entry is not None)
+    if entry is not None:
+        return entry
+
+    found = cache.get_many([entry_key(user_id), version_key(user_id)])
+    version = found.get(version_key(user_id))
+    if version is None:
+        # Versions start from the clock so an evicted key can't come back
+        # to a value that a stale entry was stored under
+        version = cache.get_or_set(version_key(user_id), time.time_ns, None)
+    entry = found.get(entry_key(user_id))
+    hit = entry is not None and entry['version'] == version
+    metrics.record_cache('user-l2', hit)
+    if not hit:
+        entry = _load(user_id, version)
+        if entry is None:
+            return None
+        cache.set(entry_key(user_id), entry, l2_timeout())
+    local.set(('user', user_id), entry)
+    return entry
+
+
+def get_profile(user_id):
+    """Return the serialized /me profile of a user."""
+    entry = get_entry(user_id)
+    return entry and entry['profile']
+
+
+def build_user(fields):
+    """Return a User instance with only the cached fields loaded."""
+    User = get_user_model()
+    # from_db expects the loaded values in model field order
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in fields]
+    # No database alias, so the router picks one if a deferred field is loaded
+    return User.from_db(None, names, [fields[name] for name in names])
+
+
+def user_id_for_token(key):
+    """Return the id of the user owning an API token, or None."""
+    user_id = local.get(('token', key))
+    if user_id is not None:
+        return user_id
+
+    user_id = cache.get(token_key(key))
+    if user_id is None:
+        user_id = Token.objects.using(PRIMARY_DATABASE).filter(key=key).values_list('user_id', flat=True).first()
+        if user_id is None:
+            return None
+        cache.set(token_key(key), user_id, l2_timeout())
+    local.set(('token', key), user_id)
+    return user_id
+
+
+def invalidate(user_id):
+    """Make every cached copy of a user stale."""
+    local.delete(('user', user_id))
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:  # Not cached; the next read starts a new version
+        pass
+
+
+def forget_token(key):
+    """Drop a deleted token's mapping to its user."""
+    local.delete(('token', key))
+    cache.delete(token_key(key))
@@ -0,0 +1,72 @@
+"""
+Django command to create user accounts in bulk from CSV or NDJSON
+"""
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user import provisioning
+
+
+class Command(BaseCommand):
+    """Django command to provision users from a file"""
+
+    help = (
+        'Create users from a CSV (email,password,name) or NDJSON file, '
+        'hashing passwords on every core and inserting in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read users from.')
+        parser.add_argument(
+            '--format',
+            choices=provisioning.FORMATS,
+            help='Record format (default: from the file extension).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Users inserted per transaction.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Password hashing processes (default: one per core).',
+        )
+        parser.add_argument(
+            '--tokens',
+            metavar='PATH',
+            help='Issue auth tokens and write them to this CSV file.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        path = options['path']
+        fmt = options['format'] or provisioning.detect_format(path)
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                result = provisioning.provision(
+                    stream,
+                    fmt,
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    tokens=bool(options['tokens']),
+                )
+        except OSError as error:
+            raise CommandError(error)
+
+        for email in result['existing']:
+            self.stdout.write(f'Skipped existing user {email}')
+        for invalid in result['invalid']:
+            self.stderr.write(f"Line {invalid['line']}: {invalid['error']}")
+
+        if options['tokens']:
+            with open(options['tokens'], 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['email', 'token'])
+                writer.writerows(result['tokens'].items())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} users, skipped {len(result['existing'])} "
+            f"existing, {len(result['invalid'])} invalid"
+        ))
@@ -0,0 +1,183 @@
+"""
+Bulk creation of user accounts.
+
+Records are read from CSV (with an `email,password,name` header) or
+NDJSON (one JSON object per line). Passwords are hashed in a process
+pool, since a hash is seconds of CPU per core by design and the GIL
+would keep threads on one core. Users are then inserted with
+`bulk_create`, one batch per transaction. Emails that already belong
+to an account, soft-deleted ones included, are skipped and reported,
+as are ones a signup takes while the batch is being hashed.
+
+The API stores uploads as a ProvisioningBatch and leaves the work to
+the `user.provision` background job, since hashing even a few hundred
+passwords takes longer than a request may.
+"""
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from rest_framework.authtoken.models import Token
+
+FORMATS = ('csv', 'ndjson')
+MIN_PASSWORD_LENGTH = 5  # Matches UserSerializer
+
+
+def detect_format(filename):
+    """Guess the record format from a file name."""
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def read_records(stream, fmt):
+    """Yield (line number, record dict) pairs from a text stream."""
+    if fmt == 'csv':
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):  # After the header
+            yield line_number, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else {'_error': 'Not a JSON object.'}
+    else:
+        raise ValueError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}')
+
+
+def clean_record(record):
+    """Return (email, password, name) for a record, or raise ValidationError."""
+    if '_error' in record:
+        raise ValidationError(record['_error'])
+    email = get_user_model().objects.normalize_email((record.get('email') or '').strip())
+    validate_email(email)
+    password = record.get('password') or None  # No password: unusable until reset
+    if password is not None and len(password) < MIN_PASSWORD_LENGTH:
+        raise ValidationError(f'Password must be at least {MIN_PASSWORD_LENGTH} characters.')
+    return email, password, (record.get('name') or '').strip()
+
+
+def _init_worker():
+    # Spawned (not forked) workers start without Django configured
+    if not apps.ready:
+        django.setup()
+
+
+class Provisioner:
+    """Create users batch by batch, hashing passwords across processes."""
+
+    def __init__(self, batch_size=None, workers=None, tokens=False):
+        self.batch_size = batch_size or settings.PROVISION_BATCH_SIZE
+        self.workers = workers or settings.PROVISION_WORKERS or os.cpu_count() or 1
+        self.tokens = tokens
+        self.result = {'created': 0, 'existing': [], 'invalid': [], 'tokens': {}}
+
+    def run(self, records):
+        """Provision (line number, record) pairs and return the result."""
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        try:
+            batch, seen = [], set()
+            for line_number, record in records:
+                try:
+                    email, password, name = clean_record(record)
+                except ValidationError as error:
+                    self.result['invalid'].append({'line': line_number, 'error': ' '.join(error.messages)})
+                    continue
+                if email.lower() in seen:
+                    self.result['invalid'].append({'line': line_number, 'error': 'Duplicate email in input.'})
+                    continue
+                seen.add(email.lower())
+                batch.append((email, password, name))
+                if len(batch) >= self.batch_size:
+                    self.insert(batch, executor)
+                    batch = []
+            if batch:
+                self.insert(batch, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return self.result
+
+    def hash_passwords(self, passwords, executor):
+        """Hash passwords, in the process pool when there is one."""
+        if executor is None:
+            return [make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+    def existing_emails(self, emails):
+        """Return which of `emails` already belong to an account."""
+        # The unique index on email answers this without scanning the table
+        return set(
+            get_user_model().all_objects.filter(email__in=emails)
+            .values_list('email', flat=True)
+        )
+
+    def insert(self, batch, executor):
+        """Insert one batch, skipping emails that already have an account."""
+        User = get_user_model()
+        existing = self.existing_emails([email for email, _, _ in batch])
+        batch = [record for record in batch if record[0] not in existing]
+        self.result['existing'].extend(sorted(existing))
+        if not batch:
+            return
+
+        hashes = self.hash_passwords([password for _, password, _ in batch], executor)
+        users = [
+            User(email=email, name=name, password=hashed)
+            for (email, _, name), hashed in zip(batch, hashes)
+        ]
+        while users:
+            try:
+                with transaction.atomic():
+                    users = User.objects.bulk_create(users)
+                    if self.tokens:
+                        self.create_tokens(users)
+            except IntegrityError:
+                # A signup took one of the emails after the check above
+                taken = self.existing_emails([user.email for user in users])
+                if not taken:
+                    raise
+                self.result['existing'].extend(sorted(taken))
+                users = [user for user in users if user.email not in taken]
+                continue
+            self.result['created'] += len(users)
+            return
+
+    def create_tokens(self, users):
+        """Issue an auth token for each newly created user."""
+        if any(user.pk is None for user in users):  # Backends that don't return ids
+            ids = dict(
+                get_user_model().objects.filter(email__in=[user.email for user in users])
+                .values_list('email', 'pk')
+            )
+            for user in users:
+                user.pk = ids[user.email]
+        tokens = [Token(user_id=user.pk, key=Token.generate_key()) for user in users]
+        Token.objects.bulk_create(tokens)
+        self.result['tokens'].update(
+            (user.email, token.key) for user, token in zip(users, tokens)
+        )
+
+
+def provision(stream, fmt, **options):
+    """Provision users from a text stream; see Provisioner for options."""
+    return Provisioner(**options).run(read_records(stream, fmt))
+
+
+def text_stream(file):
+    """Wrap a binary upload for read_records."""
+    return io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
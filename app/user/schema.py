@@ -0,0 +1,20 @@
+"""
+OpenAPI descriptions for the user API, loaded when drf_spectacular is installed.
+"""
+from drf_spectacular.extensions import OpenApiAuthenticationExtension, OpenApiViewExtension
+from drf_spectacular.utils import extend_schema
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    target_class = 'user.authentication.SignedTokenAuthentication'
+    name = 'signedTokenAuth'
+
+    def get_security_definition(self, auto_schema):
+        return {'type': 'http', 'scheme': 'bearer', 'description': 'Signed access token from /api/user/token/signed/'}
+
+
+class RevokeTokensSchema(OpenApiViewExtension):
+    target_class = 'user.views.RevokeTokensView'
+
+    def view_replacement(self):
+        return extend_schema(request=None, responses={204: None})(self.target_class)
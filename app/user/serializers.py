@@ -7,6 +7,11 @@ from django.contrib.auth import (  # Importing the authentication functions from
 )
 from django.utils.translation import gettext as _  # Importing the gettext function for handling translations
 from rest_framework import serializers  # Importing the serializers module from Django REST Framework
+from rest_framework.validators import UniqueValidator  # Importing the validator enforcing unique emails
+
+from core.models import ProvisioningBatch  # Importing the model storing provisioning requests
+from user import provisioning  # Importing the supported provisioning formats
+from user import tokens  # Importing signed token verification for the refresh flow
 
 # Define a serializer for the User model, which will handle serialization and deserialization of user data
 class UserSerializer(serializers.ModelSerializer):
@@ -16,7 +21,11 @@ class UserSerializer(serializers.ModelSerializer):
         """Meta class to define the serializer behavior and fields."""
         model = get_user_model()  # Specifies that this serializer should use the current user model
         fields = ['email', 'password', 'name']  # Specifies the fields that will be included in the serialization
-        extra_kwargs = {'password': {'write_only': True, 'min_length': 5}}
+        extra_kwargs = {
+            'password': {'write_only': True, 'min_length': 5},
+            # Soft-deleted users keep their email until purged, so check against all rows
+            'email': {'validators': [UniqueValidator(queryset=get_user_model().all_objects.all())]},
+        }
         # extra_kwargs:
         # - 'password': {'write_only': True} ensures the password field is only used for input and not output,
         #               so it won't be exposed in API responses.
@@ -42,6 +51,7 @@ class UserSerializer(serializers.ModelSerializer):
         if password:
             user.set_password(password)  # Hash the password
             user.save()  # Save the user with the updated password
+            user.revoke_tokens()  # Signed tokens issued with the old password stop working
 
         # Return the updated user object
         return user
@@ -81,4 +91,49 @@ class AuthTokenSerializer(serializers.Serializer):
 
         # If authentication is successful, add the user to the validated data and set user to the view
         attrs['user'] = user
-        return attrs  # Return the validated data with the authenticated user
\ No newline at end of file
+        return attrs  # Return the validated data with the authenticated user
+
+
+# Define a serializer for exchanging a refresh token for a new token pair
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for a signed refresh token."""
+
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        """Check the token and that it hasn't been revoked."""
+        claims = tokens.verify(attrs['refresh'], tokens.REFRESH)
+        # Refreshing is rare, so the version is checked against the database
+        user = claims and get_user_model().objects.filter(pk=claims[0], is_active=True).first()
+        if not user or user.token_version != claims[1]:
+            msg = _('Invalid or expired refresh token.')
+            raise serializers.ValidationError(msg, code='authorization')
+        attrs['user'] = user
+        return attrs
+
+
+# Define a serializer for bulk provisioning requests
+class ProvisionUsersSerializer(serializers.Serializer):
+    """Serializer for a bulk user provisioning request."""
+
+    file = serializers.FileField(required=False)  # CSV (email,password,name) or NDJSON upload
+    format = serializers.ChoiceField(choices=provisioning.FORMATS, required=False)  # Defaults to the file extension
+    users = serializers.ListField(child=serializers.DictField(), required=False)  # Alternative to uploading a file
+    tokens = serializers.BooleanField(default=False)  # Issue an auth token for each created user
+
+    def validate(self, attrs):
+        """Require exactly one source of users."""
+        if ('file' in attrs) == ('users' in attrs):
+            raise serializers.ValidationError(_('Upload a file or send a list of users.'))
+        return attrs
+
+
+class ProvisioningBatchSerializer(serializers.ModelSerializer):
+    """Serializer for the status of a bulk provisioning request."""
+
+    url = serializers.HyperlinkedIdentityField(view_name='user:provision-batch')  # Where to poll for the result
+
+    class Meta:
+        model = ProvisioningBatch
+        fields = ['id', 'url', 'status', 'result', 'created_at', 'finished_at']
+        read_only_fields = fields
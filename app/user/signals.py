@@ -0,0 +1,26 @@
+"""
+Signal handlers keeping the user cache in step with the database.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user import cache
+
+
+# Covers UserSerializer.update, password changes, admin edits and soft deletes
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user(sender, instance, **kwargs):
+    cache.invalidate(instance.pk)
+    # Again after the commit: another process may read the old row before then
+    # and store it under the new version, e.g. keeping a revoked token working
+    transaction.on_commit(lambda: cache.invalidate(instance.pk), using=instance._state.db)
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    cache.forget_token(instance.key)
+    transaction.on_commit(lambda: cache.forget_token(instance.key), using=instance._state.db)
@@ -0,0 +1,28 @@
+"""
+Background jobs for users, run by `manage.py run_jobs`.
+"""
+from django.utils import timezone
+
+from core import jobs
+from core.models import ProvisioningBatch
+from user import provisioning
+
+
+@jobs.task('user.provision')
+def provision_batch(batch_id):
+    """Create the users of a batch uploaded through the provisioning API."""
+    batch = ProvisioningBatch.objects.filter(
+        pk=batch_id, status=ProvisioningBatch.STATUS_QUEUED,
+    ).first()
+    if batch is None:  # Already done by an earlier attempt
+        return
+    # Users created by an attempt that failed part way are reported as
+    # existing when the job is retried
+    result = provisioning.Provisioner(tokens=batch.tokens).run(batch.records)
+    if not batch.tokens:
+        del result['tokens']
+    batch.status = ProvisioningBatch.STATUS_DONE
+    batch.records = []
+    batch.result = result
+    batch.finished_at = timezone.now()
+    batch.save(update_fields=['status', 'records', 'result', 'finished_at'])
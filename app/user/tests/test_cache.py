@@ -0,0 +1,158 @@
+"""
+Tests for the two-tier user cache.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user import cache as user_cache
+from user.cache import LRUCache
+
+ME_URL = reverse('user:me')
+
+
+@patch('core.activity.buffer.record')  # last_login writes are not part of this
+class CachedProfileTests(TestCase):
+    """Test /me is served from the cache and invalidated on change."""
+
+    def setUp(self):
+        # The tests run in one process, so LocMem can stand in for a shared cache
+        shared = patch('core.caching.is_shared', return_value=True)
+        shared.start()
+        self.addCleanup(shared.stop)
+        cache.clear()
+        user_cache.local.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123', name='Test Name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_me_makes_no_queries(self, _record):
+        """Test a cached user is authenticated and served without the DB."""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data, {'email': 'test@example.com', 'name': 'Test Name'})
+
+    def test_shared_cache_used_after_local_expires(self, _record):
+        """Test an empty L1 is refilled from the shared cache."""
+        self.client.get(ME_URL)
+        user_cache.local.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_invalidates(self, _record):
+        """Test a PATCH is visible on the next read."""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'New Name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New Name')
+
+    def test_version_bump_reaches_other_processes(self, _record):
+        """Test a save elsewhere makes the shared entry stale."""
+        self.client.get(ME_URL)
+        user_cache.local.clear()  # Another process has nothing local
+
+        get_user_model().objects.filter(pk=self.user.pk).update(name='Changed')
+        user_cache.invalidate(self.user.pk)
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Changed')
+
+    def test_invalidated_again_on_commit(self, _record):
+        """Test a save bumps the version when it commits, not only before."""
+        with patch('user.cache.invalidate') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.user.revoke_tokens()
+            self.assertEqual(invalidate.call_count, 1)
+
+        self.assertEqual(invalidate.call_count, 2)
+
+    def test_password_change_invalidates(self, _record):
+        """Test changing the password bumps the user's version."""
+        version = user_cache.get_entry(self.user.pk)['version']
+
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        self.assertNotEqual(user_cache.get_entry(self.user.pk)['version'], version)
+
+    def test_deleted_user_rejected(self, _record):
+        """Test a soft-deleted user's cached token stops working."""
+        self.client.get(ME_URL)
+
+        self.user.soft_delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self, _record):
+        """Test a deleted token is forgotten by the cache."""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@patch('core.activity.buffer.record')
+class LocalCacheTests(TestCase):
+    """Test a per-process default cache is not used as L2."""
+
+    def setUp(self):
+        cache.clear()
+        user_cache.local.clear()
+        self.user = get_user_model().objects.create_user('test@example.com', 'testpass123')
+        self.token = Token.objects.create(user=self.user)
+
+    def test_nothing_stored_in_l2(self, _record):
+        """Test only the L1 TTL bounds how long other processes see a stale user."""
+        user_cache.get_entry(self.user.pk)
+        user_cache.user_id_for_token(self.token.key)
+
+        self.assertIsNone(cache.get(user_cache.entry_key(self.user.pk)))
+        self.assertIsNone(cache.get(user_cache.token_key(self.token.key)))
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Test the per-process LRU."""
+
+    def test_evicts_least_recently_used(self):
+        """Test the least recently read entry is dropped when full."""
+        lru = LRUCache(max_size=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+    @patch('user.cache.time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Test entries are not returned after the TTL."""
+        monotonic.return_value = 100
+        lru = LRUCache(max_size=2, ttl=5)
+        lru.set('a', 1)
+
+        monotonic.return_value = 106
+
+        self.assertIsNone(lru.get('a'))
@@ -0,0 +1,171 @@
+"""
+Tests for bulk user provisioning.
+"""
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import ProvisioningBatch
+from user import provisioning
+
+PROVISION_URL = reverse('user:provision')
+
+CSV = (
+    'email,password,name\n'
+    'one@EXAMPLE.com,pass12345,One\n'
+    'two@example.com,pass12345,Two\n'
+    'not-an-email,pass12345,Bad\n'
+    'three@example.com,,Three\n'
+    'taken@example.com,pass12345,Taken\n'
+)
+
+
+class ProvisionerTests(TestCase):
+    """Test creating users from records."""
+
+    def setUp(self):
+        get_user_model().objects.create_user('taken@example.com', 'testpass123')
+
+    def test_provision_csv(self):
+        """Test users are created and existing or invalid rows reported."""
+        result = provisioning.provision(io.StringIO(CSV), 'csv', batch_size=2, workers=1)
+
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(result['existing'], ['taken@example.com'])
+        self.assertEqual([invalid['line'] for invalid in result['invalid']], [4])
+        user = get_user_model().objects.get(email='one@example.com')
+        self.assertEqual(user.name, 'One')
+        self.assertTrue(user.check_password('pass12345'))
+        self.assertFalse(get_user_model().objects.get(email='three@example.com').has_usable_password())
+
+    def test_provision_ndjson_with_tokens(self):
+        """Test NDJSON input and bulk token creation."""
+        lines = [
+            json.dumps({'email': 'a@example.com', 'password': 'pass12345'}),
+            json.dumps({'email': 'A@example.com', 'password': 'pass12345'}),
+            '[1, 2]',
+            json.dumps({'email': 'b@example.com', 'password': 'abc'}),
+        ]
+
+        result = provisioning.provision(io.StringIO('\n'.join(lines)), 'ndjson', workers=1, tokens=True)
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(len(result['invalid']), 3)
+        token = Token.objects.get(user__email='a@example.com')
+        self.assertEqual(result['tokens'], {'a@example.com': token.key})
+
+    def test_hashing_in_process_pool(self):
+        """Test passwords hashed by worker processes are usable."""
+        result = provisioning.provision(io.StringIO(CSV), 'csv', workers=2)
+
+        self.assertEqual(result['created'], 3)
+        self.assertTrue(get_user_model().objects.get(email='two@example.com').check_password('pass12345'))
+
+    def test_email_taken_during_insert(self):
+        """Test a signup racing the existence check is reported, not raised."""
+        existing_emails = provisioning.Provisioner.existing_emails
+        calls = []
+
+        def check_before_signup(provisioner, emails):
+            calls.append(emails)
+            if len(calls) == 1:  # The signup lands after the first check
+                return set()
+            return existing_emails(provisioner, emails)
+
+        with patch.object(provisioning.Provisioner, 'existing_emails', check_before_signup):
+            result = provisioning.provision(io.StringIO(CSV), 'csv', workers=1)
+
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(result['existing'], ['taken@example.com'])
+        self.assertEqual(len(calls), 2)
+
+    def test_command(self):
+        """Test the command reads a file and writes issued tokens."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.csv')
+            tokens_path = os.path.join(tmp, 'tokens.csv')
+            with open(path, 'w') as f:
+                f.write(CSV)
+            out, err = StringIO(), StringIO()
+
+            call_command('provision_users', path, workers=1, tokens=tokens_path, stdout=out, stderr=err)
+
+            with open(tokens_path) as f:
+                self.assertEqual(len(f.read().splitlines()), 4)
+        self.assertIn('Created 3 users, skipped 1 existing, 1 invalid', out.getvalue())
+        self.assertIn('Line 4', err.getvalue())
+
+
+class ProvisionApiTests(TestCase):
+    """Test the staff-only provisioning endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser('admin@example.com', 'testpass123')
+
+    def test_staff_required(self):
+        """Test regular users cannot provision accounts."""
+        user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client.force_authenticate(user)
+
+        res = self.client.post(PROVISION_URL, {'users': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def provision(self, data, format):
+        """Post a provisioning request and run the job it queued."""
+        self.client.force_authenticate(self.staff)
+        res = self.client.post(PROVISION_URL, data, format=format)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], ProvisioningBatch.STATUS_QUEUED)
+        self.assertEqual(res['Location'], res.data['url'])
+        jobs.autodiscover()
+        jobs.run_pending()
+        return self.client.get(res['Location'])
+
+    def test_provision_upload(self):
+        """Test provisioning from an uploaded CSV file."""
+        upload = SimpleUploadedFile('users.csv', CSV.encode(), content_type='text/csv')
+
+        res = self.provision({'file': upload, 'tokens': 'true'}, 'multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], ProvisioningBatch.STATUS_DONE)
+        self.assertEqual(res.data['result']['created'], 4)
+        self.assertEqual(len(res.data['result']['tokens']), 4)
+
+    def test_provision_json(self):
+        """Test provisioning from a JSON list."""
+        payload = {'users': [{'email': 'new@example.com', 'password': 'pass12345', 'name': 'New'}]}
+
+        res = self.provision(payload, 'json')
+
+        self.assertEqual(res.data['result']['created'], 1)
+        self.assertNotIn('tokens', res.data['result'])
+        self.assertTrue(get_user_model().objects.filter(email='new@example.com').exists())
+        self.assertEqual(ProvisioningBatch.objects.get().records, [])
+
+    def test_too_many_users(self):
+        """Test requests over the limit are rejected without queueing a job."""
+        self.client.force_authenticate(self.staff)
+        payload = {'users': [{'email': 'new@example.com'}] * 3}
+
+        with self.settings(PROVISION_MAX_UPLOAD_USERS=2):
+            res = self.client.post(PROVISION_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ProvisioningBatch.objects.exists())
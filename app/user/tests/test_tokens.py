@@ -0,0 +1,182 @@
+"""
+Tests for signed access and refresh tokens.
+"""
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user import cache as user_cache
+from user import tokens
+
+SIGNED_TOKEN_URL = reverse('user:token-signed')
+REFRESH_URL = reverse('user:token-refresh')
+REVOKE_URL = reverse('user:token-revoke')
+ME_URL = reverse('user:me')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class TokenSigningTests(SimpleTestCase):
+    """Test issuing and verifying tokens."""
+
+    def setUp(self):
+        self.user = get_user_model()(pk=7, token_version=3)
+
+    def test_round_trip(self):
+        """Test a token verifies to its user and version."""
+        token = tokens.issue(self.user, tokens.ACCESS)
+
+        self.assertEqual(tokens.verify(token, tokens.ACCESS), (7, 3))
+
+    def test_tampered(self):
+        """Test changing any part of a token invalidates it."""
+        token = tokens.issue(self.user, tokens.ACCESS)
+        user_id, version, expires, signature = token.split('.')
+
+        for forged in (
+            f'8.{version}.{expires}.{signature}',
+            f'{user_id}.4.{expires}.{signature}',
+            f'{user_id}.{version}.{int(expires) + 3600}.{signature}',
+            f'{user_id}.{version}.{expires}.{signature[:-1]}',
+            'garbage',
+        ):
+            self.assertIsNone(tokens.verify(forged, tokens.ACCESS))
+
+    def test_kinds_not_interchangeable(self):
+        """Test a refresh token is not accepted as an access token."""
+        token = tokens.issue(self.user, tokens.REFRESH)
+
+        self.assertIsNone(tokens.verify(token, tokens.ACCESS))
+
+    @override_settings(ACCESS_TOKEN_LIFETIME=60)
+    def test_expired(self):
+        """Test a token stops verifying after its lifetime."""
+        token = tokens.issue(self.user, tokens.ACCESS, now=time.time() - 61)
+
+        self.assertIsNone(tokens.verify(token, tokens.ACCESS))
+
+
+class SignedTokenApiTests(TestCase):
+    """Test the signed token endpoints and authentication."""
+
+    def setUp(self):
+        cache.clear()
+        user_cache.local.clear()
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+
+    def obtain(self):
+        res = self.client.post(SIGNED_TOKEN_URL, {'email': 'user@example.com', 'password': 'testpass123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_bad_credentials(self):
+        """Test no tokens are issued for a wrong password."""
+        res = self.client.post(SIGNED_TOKEN_URL, {'email': 'user@example.com', 'password': 'wrong'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('access', res.data)
+
+    @patch('core.activity.buffer.record')  # last_login writes are not part of this
+    def test_access_token_without_queries(self, _record):
+        """Test a signed token authenticates from the cache with no queries."""
+        access = self.obtain()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.get(ME_URL)  # Warms the user cache
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], 'user@example.com')
+
+    def test_recipe_api(self):
+        """Test the recipe API accepts signed tokens."""
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.obtain()['access']}")
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_opaque_token_still_works(self):
+        """Test existing DRF tokens are accepted alongside signed ones."""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_refresh(self):
+        """Test a refresh token is exchanged for a working access token."""
+        refresh = self.obtain()['refresh']
+
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+    def test_refresh_rejects_access_token(self):
+        """Test an access token can't be used to refresh."""
+        res = self.client.post(REFRESH_URL, {'refresh': self.obtain()['access']})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_revoke(self):
+        """Test revoking invalidates issued access and refresh tokens."""
+        pair = self.obtain()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.client.get(ME_URL)
+
+        res = self.client.post(REVOKE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        res = self.client.post(REFRESH_URL, {'refresh': pair['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_revoke_seen_by_other_processes(self):
+        """Test a revocation elsewhere is seen once the local entry expires."""
+        for shared in (True, False):
+            with self.subTest(shared=shared), patch('core.caching.is_shared', return_value=shared):
+                user_cache.local.clear()
+                access = self.obtain()['access']
+                self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+                self.client.get(ME_URL)
+
+                # Another process revokes; its bump doesn't reach this one's L1
+                get_user_model().objects.filter(pk=self.user.pk).update(token_version=F('token_version') + 1)
+                try:
+                    cache.incr(user_cache.version_key(self.user.pk))
+                except ValueError:
+                    pass
+                self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+                user_cache.local.clear()  # PROFILE_CACHE_L1_TTL has passed
+
+                self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+                self.client.credentials()
+
+    def test_password_change_revokes(self):
+        """Test changing the password invalidates signed tokens."""
+        access = self.obtain()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        self.client.patch(ME_URL, {'password': 'newpass123'})
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user(self):
+        """Test tokens of soft-deleted users are rejected."""
+        access = self.obtain()['access']
+        self.user.soft_delete()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
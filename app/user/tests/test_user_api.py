@@ -51,6 +51,27 @@ class PublicUserApiTests(TestCase):#unautenthicated tests, like registering a ne
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST) # we get bad request from API if email already existed
 
+    def test_user_with_deleted_email_exists_error(self):
+        """Test a soft-deleted user's email can't be reused before purge."""
+        payload = {
+            'email': 'test@example.com',
+            'password': 'testpass123',
+            'name': 'Test Name',
+        }
+        create_user(**payload).soft_delete()
+        res = self.client.post(CREATE_USER_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_token_deleted_user(self):
+        """Test soft-deleted users can't get a token."""
+        create_user(email='test@example.com', password='goodpass').soft_delete()
+
+        res = self.client.post(TOKEN_URL, {'email': 'test@example.com', 'password': 'goodpass'})
+
+        self.assertNotIn('token', res.data)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_password_too_short_error(self):
         """Test an error is returned if password less than 5 chars."""
         payload = {
@@ -137,14 +158,18 @@ class PublicUserApiTests(TestCase):#unautenthicated tests, like registering a ne
 class PrivateUserApiTests(TestCase):
     """Test API requests that require authentication."""
 
-    def setUp(self):  # Set up a user and client for the tests, called before each test
-        """Set up a user and client for the tests."""
+    @classmethod
+    def setUpTestData(cls):  # Runs once per class; Django restores the user for each test
+        """Create the user for the tests."""
         # Create a user for authentication purposes
-        self.user = create_user(
+        cls.user = create_user(
             email='test@example.com',
             password='testpass123',
             name='Test Name',
         )
+
+    def setUp(self):  # Set up a client for the tests, called before each test
+        """Set up a client for the tests."""
         # Initialize the APIClient, which will be used to make API requests
         self.client = APIClient()
         # Force authentication for the client with the created user
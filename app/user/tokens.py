@@ -0,0 +1,69 @@
+"""
+Stateless HMAC-signed access and refresh tokens.
+
+A token is `<user id>.<token version>.<expiry>.<signature>`, where the
+signature is an HMAC-SHA256 of the rest keyed from SECRET_KEY and the
+token kind, so an access token can't be passed off as a refresh token.
+Checking the signature and expiry needs no database or cache.
+
+Access tokens live for ACCESS_TOKEN_LIFETIME seconds and are accepted
+only while their version matches the user's `token_version`, which
+authentication reads from user.cache like every other user field.
+Refresh tokens trade for a new pair and are checked against the
+database. `User.revoke_tokens` bumps the version, so every token issued
+before is rejected: at once in the process that revoked them, and in
+other processes within PROFILE_CACHE_L1_TTL seconds. That bound holds
+because a process only trusts a cached user for that long on its own;
+after that it reads the user from the shared cache, where the save
+made the old entry stale, or from the database when the cache isn't
+shared (see user.cache).
+
+The opaque DRF tokens from /api/user/token/ keep working alongside.
+"""
+import base64
+import time
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+def _sign(kind, body):
+    digest = salted_hmac(f'user.tokens.{kind}', body, algorithm='sha256').digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def lifetime(kind):
+    return settings.ACCESS_TOKEN_LIFETIME if kind == ACCESS else settings.REFRESH_TOKEN_LIFETIME
+
+
+def issue(user, kind, now=None):
+    """Return a signed token of `kind` for the user."""
+    expires = int(now if now is not None else time.time()) + lifetime(kind)
+    body = f'{user.pk}.{user.token_version}.{expires}'
+    return f'{body}.{_sign(kind, body)}'
+
+
+def issue_pair(user):
+    """Return the response body of the token and refresh endpoints."""
+    return {
+        'access': issue(user, ACCESS),
+        'refresh': issue(user, REFRESH),
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def verify(token, kind, now=None):
+    """Return (user id, token version) from a valid, unexpired token, or None."""
+    body, _, signature = token.rpartition('.')
+    parts = body.split('.')
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    if not constant_time_compare(signature, _sign(kind, body)):
+        return None
+    user_id, version, expires = map(int, parts)
+    if expires < (now if now is not None else time.time()):
+        return None
+    return user_id, version
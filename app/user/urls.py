@@ -14,5 +14,10 @@ urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     # The .as_view() method is used to convert the class-based view into a Django-view that can be called when the URL is requested
     path('token/', views.CreateTokenView.as_view(), name='token'),  # Map the 'token/' URL to the CreateTokenView
+    path('token/signed/', views.CreateSignedTokenView.as_view(), name='token-signed'),  # Signed access and refresh tokens
+    path('token/refresh/', views.RefreshTokenView.as_view(), name='token-refresh'),
+    path('token/revoke/', views.RevokeTokensView.as_view(), name='token-revoke'),  # Invalidates all signed tokens
     path('me/', views.ManageUserView.as_view(), name='me'), # Map the 'me/' URL to the ManageUserView
+    path('provision/', views.ProvisionUsersView.as_view(), name='provision'),  # Staff-only bulk user creation
+    path('provision/<int:pk>/', views.ProvisioningBatchView.as_view(), name='provision-batch'),  # Status of a provisioning request
 ]
\ No newline at end of file
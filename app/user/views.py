@@ -1,13 +1,33 @@
 """
 Views for the user API.
 """
-from rest_framework import generics, authentication, permissions  # Importing necessary modules from Django REST Framework (DRF)
+from django.conf import settings  # Importing settings for the provisioning request limit
+from django.contrib.auth import get_user_model  # Importing get_user_model to load the user being updated
+from django.db import transaction  # Importing transaction to queue a provisioning job with its batch
+
+from rest_framework import authentication, generics, permissions, status  # Importing necessary modules from Django REST Framework (DRF)
 from rest_framework.authtoken.views import ObtainAuthToken  # Importing the ObtainAuthToken view for handling token authentication
+from rest_framework.exceptions import ValidationError  # Importing ValidationError for malformed provisioning requests
+from rest_framework.parsers import JSONParser, MultiPartParser  # Importing parsers for JSON bodies and file uploads
+from rest_framework.response import Response  # Importing Response to return the cached profile
 from rest_framework.settings import api_settings  # Importing API settings to customize view behavior, such as rendering
 
+from core import jobs  # Importing the background job queue
+from core.models import ProvisioningBatch  # Importing the model storing provisioning requests
+from user import cache  # Importing the two-tier user cache
+from user import provisioning  # Importing bulk user creation
+from user import tokens  # Importing signed access and refresh tokens
+from user.authentication import (  # Importing authentication served from the user cache
+    CachedTokenAuthentication,  # Opaque DRF tokens
+    SignedTokenAuthentication,  # Signed access tokens
+)
+
 from user.serializers import (  # Importing the serializers that handle data validation and serialization
     UserSerializer,  # Serializer for creating and managing user data
     AuthTokenSerializer,  # Serializer for handling user authentication and token generation
+    RefreshTokenSerializer,  # Serializer for exchanging a refresh token
+    ProvisionUsersSerializer,  # Serializer for bulk provisioning requests
+    ProvisioningBatchSerializer,  # Serializer for the status of a provisioning request
 )
 
 # Define a view to handle the creation of new users
@@ -33,6 +53,46 @@ class CreateTokenView(ObtainAuthToken):
     # This allows the view to use the default renderer classes specified in the API settings,
     # enabling the browsable API feature, which provides a user-friendly interface for testing the API.
 
+
+# Define a view issuing signed access and refresh tokens
+class CreateSignedTokenView(generics.GenericAPIView):
+    """Create a short-lived signed access token and a refresh token."""
+
+    serializer_class = AuthTokenSerializer  # Same email and password check as CreateTokenView
+    authentication_classes = []
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(tokens.issue_pair(serializer.validated_data['user']))
+
+
+# Define a view trading a refresh token for a new token pair
+class RefreshTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for new access and refresh tokens."""
+
+    serializer_class = RefreshTokenSerializer
+    authentication_classes = []
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(tokens.issue_pair(serializer.validated_data['user']))
+
+
+# Define a view revoking the authenticated user's signed tokens
+class RevokeTokensView(generics.GenericAPIView):
+    """Invalidate every signed token issued to the authenticated user."""
+
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        get_user_model().objects.get(pk=request.user.pk).revoke_tokens()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 # Define a view to handle retrieval and updating of the authenticated user's data
 class ManageUserView(generics.RetrieveUpdateAPIView): #Retreive is HTTP get, Update is HTTP put, patch
     # Must be authenticated to use this API
@@ -43,8 +103,10 @@ class ManageUserView(generics.RetrieveUpdateAPIView): #Retreive is HTTP get, Upd
     # This serializer will handle the serialization and deserialization of user data for this view.
 
     # Specify the authentication classes to be used for this view
-    authentication_classes = [authentication.TokenAuthentication]
-    # TokenAuthentication ensures that the user is authenticated via token before they can access this view.
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    # CachedTokenAuthentication ensures that the user is authenticated via token before they can access this view,
+    # looking the token and user up in user.cache so repeated requests skip the database.
+    # SignedTokenAuthentication accepts signed access tokens, which need no lookup at all.
 
     # Specify the permission classes to be used for this view
     permission_classes = [permissions.IsAuthenticated]
@@ -53,6 +115,57 @@ class ManageUserView(generics.RetrieveUpdateAPIView): #Retreive is HTTP get, Upd
     def get_object(self):
         """Retrieve and return the authenticated user."""
         # Override the get_object method to return the current authenticated user
-        return self.request.user
-        # This method is called when the view is accessed to retrieve the user's data
-        # Since this view is for managing the authenticated user's profile, we return self.request.user.
\ No newline at end of file
+        # The cached user can be a few seconds stale, so updates work on a fresh row
+        return get_user_model().objects.get(pk=self.request.user.pk)
+        # This method is called when the view is accessed to update the user's data
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return the authenticated user's profile from the cache."""
+        return Response(cache.get_profile(request.user.pk))
+
+
+# Define a staff-only view to create many users at once
+class ProvisionUsersView(generics.GenericAPIView):
+    """Queue users from an uploaded CSV/NDJSON file or a JSON list for creation."""
+
+    serializer_class = ProvisionUsersSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [JSONParser, MultiPartParser]
+
+    def post(self, request):
+        """Store the records for the provisioning job and return the batch to poll."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if 'file' in data:
+            fmt = data.get('format') or provisioning.detect_format(data['file'].name)
+            records = list(provisioning.read_records(provisioning.text_stream(data['file']), fmt))
+        else:
+            records = list(enumerate(data['users'], start=1))
+
+        # Checked up front so a request is never left half applied
+        if len(records) > settings.PROVISION_MAX_UPLOAD_USERS:
+            raise ValidationError(
+                f'At most {settings.PROVISION_MAX_UPLOAD_USERS} users per request; '
+                'use the provision_users command for more.'
+            )
+
+        # Hashing the passwords takes longer than a request may, so a job does it
+        with transaction.atomic():
+            batch = ProvisioningBatch.objects.create(
+                created_by=request.user, records=records, tokens=data['tokens'],
+            )
+            jobs.enqueue('user.provision', batch_id=batch.pk)
+        result = ProvisioningBatchSerializer(batch, context=self.get_serializer_context()).data
+        return Response(result, status=status.HTTP_202_ACCEPTED, headers={'Location': result['url']})
+
+
+class ProvisioningBatchView(generics.RetrieveAPIView):
+    """Report the progress and outcome of a provisioning request."""
+
+    queryset = ProvisioningBatch.objects.all()
+    serializer_class = ProvisioningBatchSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAdminUser]